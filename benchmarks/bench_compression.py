@@ -0,0 +1,125 @@
+"""
+Bytes on the wire and CPU per cache hit for a `GET /books?limit=100` page.
+
+Stores a synthetic 100-book page (English-like descriptions) as a list cache
+entry, then serves it repeatedly two ways:
+
+- per-hit: decode the entry, validate/dump it through PaginatedBooks, render
+  JSON and compress it, which is what a hit cost before bodies were stored
+  encoded (with compression middleware in front);
+- stored: helpers.conditional.serve_cached, which returns the pre-encoded
+  body from Redis.
+
+Needs the Redis from REDIS_URL/REDIS_*; leaves no keys behind.
+
+Usage:
+    python benchmarks/bench_compression.py --runs 500 --description-words 120
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from starlette.requests import Request  # noqa: E402
+
+from cache import (  # noqa: E402
+    cache_list_with_params,
+    close_redis,
+    get_list_entry_with_params,
+    init_raw_redis,
+)
+from helpers.conditional import serve_cached  # noqa: E402
+from helpers.encoding import CODINGS, compress  # noqa: E402
+from schemas.book import PaginatedBooks  # noqa: E402
+
+WORDS = (
+    "the a of and to in his her their young old city war love story world "
+    "family secret journey life death house night river king queen empire "
+    "first last new novel between after before through across under dark "
+    "light years must discover finds becomes lost friend enemy stranger "
+    "village mountain sea island letters memory history future past power "
+    "truth lies mother father daughter son brother sister small great"
+).split()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Pre-encoded cache bodies")
+    parser.add_argument("--runs", type=int, default=500, help="Timed hits per mode")
+    parser.add_argument("--limit", type=int, default=100, help="Books per page")
+    parser.add_argument(
+        "--description-words", type=int, default=120, help="Words per description"
+    )
+    return parser.parse_args()
+
+
+def page(limit: int, words: int) -> dict:
+    rng = random.Random(7)
+    items = [
+        {
+            "id": i,
+            "title": " ".join(rng.choices(WORDS, k=4)).title(),
+            "year": rng.randint(1900, 2024),
+            "book_isbn": f"{9780000000000 + i}",
+            "genre_name": rng.choice(["fiction", "history", "fantasy", "poetry"]),
+            "description": " ".join(rng.choices(WORDS, k=words)).capitalize() + ".",
+            "authors": [{"id": i % 97, "name": "Author Name", "email": None}],
+        }
+        for i in range(1, limit + 1)
+    ]
+    return PaginatedBooks(items=items, next_cursor=None).model_dump()
+
+
+def request(coding: str) -> Request:
+    headers = [(b"accept-encoding", coding.encode())]
+    return Request({"type": "http", "method": "GET", "headers": headers})
+
+
+async def per_hit(key: str, params: str, coding: str) -> bytes:
+    data, _ = await get_list_entry_with_params(key, params)
+    data = PaginatedBooks.model_validate(data).model_dump()
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+    return body if coding == "identity" else compress(body, coding)
+
+
+async def stored(key: str, params: str, coding: str) -> bytes:
+    return (await serve_cached(request(coding), key, params)).body
+
+
+async def measure(fn, runs: int) -> tuple[float, float, int]:
+    body = await fn()  # warm: fills the stored variant
+    wall, cpu = [], []
+    for _ in range(runs):
+        w, c = time.perf_counter(), time.process_time()
+        await fn()
+        cpu.append((time.process_time() - c) * 1000)
+        wall.append((time.perf_counter() - w) * 1000)
+    return statistics.median(wall), statistics.mean(cpu), len(body)
+
+
+async def main() -> None:
+    args = parse_args()
+    key, params = "bench:compression:list", json.dumps({"limit": args.limit})
+    await cache_list_with_params(key, page(args.limit, args.description_words), params)
+    print(f"{'coding':<9} {'mode':<8} {'bytes':>8} {'p50 ms':>8} {'cpu ms':>8}")
+    try:
+        for coding in ("identity", *CODINGS):
+            for mode, fn in (("per-hit", per_hit), ("stored", stored)):
+                wall, cpu, size = await measure(
+                    lambda: fn(key, params, coding), args.runs
+                )
+                print(f"{coding:<9} {mode:<8} {size:>8} {wall:>8.2f} {cpu:>8.3f}")
+    finally:
+        raw = await init_raw_redis()
+        await raw.delete(key, *[k async for k in raw.scan_iter(f"{key}:*")])
+        await close_redis()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
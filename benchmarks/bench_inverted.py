@@ -0,0 +1,95 @@
+"""
+In-process inverted index vs the SQL search path.
+
+Seeds the same synthetic corpus as bench_search.py inside a rolled-back
+transaction, builds the index from it (reporting build time and postings
+size), then times the similarity-sorted first page for rare, medium and
+common terms on both backends.
+
+Usage:
+    python benchmarks/bench_inverted.py --sizes 50000,500000 --runs 50
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.ext.asyncio import AsyncSession  # noqa: E402
+
+from bench_search import SORT, VOCAB, grow, timed, word  # noqa: E402
+from database import get_async_engine  # noqa: E402
+from routers.book import _books_search_stmt  # noqa: E402
+from search.inverted import build_index  # noqa: E402
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Inverted index vs SQL search")
+    parser.add_argument(
+        "--sizes",
+        default="50000,500000",
+        help="Comma-separated corpus sizes (default: %(default)s)",
+    )
+    parser.add_argument("--runs", type=int, default=50, help="Timed runs per query")
+    parser.add_argument("--limit", type=int, default=20, help="Page size")
+    return parser.parse_args()
+
+
+def _postings_mb(index) -> float:
+    total = sum(
+        docs.nbytes + tf.nbytes
+        for segment in index.segments
+        for docs, tf in segment.values()
+    )
+    return total / 1e6
+
+
+async def main() -> None:
+    args = parse_args()
+    sizes = sorted(int(s) for s in args.sizes.split(","))
+    engine = get_async_engine()
+    async with engine.connect() as conn:
+        trans = await conn.begin()
+        db = AsyncSession(bind=conn)
+        try:
+            seeded = 0
+            for size in sizes:
+                await grow(conn, seeded, size)
+                seeded = size
+                start = time.perf_counter()
+                index = await build_index(db)
+                print(
+                    f"{size} books: index built in {time.perf_counter() - start:.1f}s, "
+                    f"{len(index.df)} terms, postings {_postings_mb(index):.1f} MB"
+                )
+                print(f"{'term':<7} {'backend':<7} {'p50 ms':>8} {'p95 ms':>8}")
+                for kind in VOCAB:
+                    q = word(kind, 7)
+                    stmt = _books_search_stmt(q=q, sort=SORT)[0].limit(args.limit + 1)
+
+                    async def sql():
+                        (await db.execute(stmt)).all()
+
+                    async def memory():
+                        ids, _ = index.search(q)
+                        index.get_items(ids[: args.limit].tolist())
+
+                    for backend, fn in (("sql", sql), ("memory", memory)):
+                        samples = sorted(await timed(fn, args.runs))
+                        p95 = samples[int(0.95 * (len(samples) - 1))]
+                        print(
+                            f"{kind:<7} {backend:<7} "
+                            f"{statistics.median(samples):>8.2f} {p95:>8.2f}"
+                        )
+        finally:
+            await db.close()
+            await trans.rollback()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
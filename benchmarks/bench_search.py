@@ -0,0 +1,133 @@
+"""
+Search latency by corpus size, single-query ("sql") vs two-phase ranking.
+
+Seeds books with a synthetic vocabulary inside one transaction (rolled back at
+the end), growing the corpus through each size, and times the similarity-sorted
+first page for rare, medium and common terms in both modes.
+
+Usage:
+    python benchmarks/bench_search.py --sizes 50000,500000,5000000 --runs 20
+
+Point DATABASE_ASYNC_URL at a scratch database: the 5M step needs a few GB.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession  # noqa: E402
+
+from database import get_async_engine  # noqa: E402
+from routers.book import _books_search_stmt, _two_phase_search  # noqa: E402
+from schemas.book import BookSortControl, SortDirection, SortField  # noqa: E402
+
+# title = rare word (of 50000) + medium word (of 5000) + common word (of 500)
+VOCAB = {"rare": 50000, "medium": 5000, "common": 500}
+NO_FILTERS = {
+    "title": None,
+    "isbn": None,
+    "author_id": None,
+    "before": None,
+    "after": None,
+}
+SORT = [
+    BookSortControl(
+        sort_field=SortField.by_similarity, sort_direction=SortDirection.desc
+    )
+]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Book search latency benchmark")
+    parser.add_argument(
+        "--sizes",
+        default="50000,500000,5000000",
+        help="Comma-separated corpus sizes (default: %(default)s)",
+    )
+    parser.add_argument("--runs", type=int, default=20, help="Timed runs per query")
+    parser.add_argument("--limit", type=int, default=20, help="Page size")
+    return parser.parse_args()
+
+
+def word(kind: str, n: int) -> str:
+    return kind[0] + hashlib.md5(f"{kind}{n}".encode()).hexdigest()[:6]
+
+
+async def grow(conn, start: int, stop: int) -> None:
+    await conn.execute(
+        text(
+            "INSERT INTO books (title, year, book_isbn, genre_name, description) "
+            "SELECT 'r' || substr(md5('rare' || (i % :rare)), 1, 6) || ' ' || "
+            "'m' || substr(md5('medium' || (i % :medium)), 1, 6) || ' ' || "
+            "'c' || substr(md5('common' || (i % :common)), 1, 6), "
+            "1900 + i % 120, lpad(i::text, 13, '5'), 'genre ' || i % 20, 'synthetic' "
+            "FROM generate_series(:start, :stop - 1) AS i"
+        ),
+        {"start": start, "stop": stop, **VOCAB},
+    )
+    await conn.execute(text("ANALYZE books"))
+
+
+async def timed(fn, runs: int) -> list[float]:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def main() -> None:
+    args = parse_args()
+    sizes = sorted(int(s) for s in args.sizes.split(","))
+    engine = get_async_engine()
+    print(f"{'size':>9} {'term':<7} {'mode':<9} {'p50 ms':>8} {'p95 ms':>8} overlap")
+    async with engine.connect() as conn:
+        trans = await conn.begin()
+        db = AsyncSession(bind=conn)
+        try:
+            seeded = 0
+            for size in sizes:
+                await grow(conn, seeded, size)
+                seeded = size
+                for kind in VOCAB:
+                    q = word(kind, 7)
+                    stmt = _books_search_stmt(q=q, sort=SORT)[0].limit(args.limit + 1)
+
+                    async def sql_mode():
+                        return [row[0].id for row in (await db.execute(stmt)).all()]
+
+                    async def two_phase():
+                        page = await _two_phase_search(
+                            db, q, False, NO_FILTERS, args.limit, None, None
+                        )
+                        if page is None:  # over SEARCH_CANDIDATES: ranked in SQL
+                            return (await sql_mode())[: args.limit]
+                        return [book.id for book in page[0]]
+
+                    top_sql = set((await sql_mode())[: args.limit])
+                    top_two = set(await two_phase())
+                    overlap = len(top_sql & top_two) / max(len(top_sql), 1)
+                    for mode, fn in (("sql", sql_mode), ("two_phase", two_phase)):
+                        samples = sorted(await timed(fn, args.runs))
+                        p95 = samples[int(0.95 * (len(samples) - 1))]
+                        print(
+                            f"{size:>9} {kind:<7} {mode:<9} "
+                            f"{statistics.median(samples):>8.1f} {p95:>8.1f} "
+                            f"{overlap:.2f}"
+                        )
+        finally:
+            await db.close()
+            await trans.rollback()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+"""
+Cold-start benchmark: time to `import main` in a fresh interpreter, and time
+from launching uvicorn to the first successful request against the database.
+
+Usage:
+    python benchmarks/bench_startup.py --runs 5 --path "/authors/?limit=1"
+
+Needs the Postgres/Redis configured in the environment for the request phase.
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Import and first-request timing")
+    parser.add_argument("--runs", type=int, default=5, help="Repetitions per phase")
+    parser.add_argument(
+        "--path",
+        default="/authors/?limit=1",
+        help="Request that must succeed (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=60.0, help="Seconds to wait per server start"
+    )
+    return parser.parse_args()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_import() -> float:
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def time_first_request(path: str, timeout: float) -> float:
+    port = _free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                resp = httpx.get(f"http://127.0.0.1:{port}{path}", timeout=5)
+                if resp.status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.TransportError:
+                pass
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with {proc.returncode}")
+            time.sleep(0.02)
+        raise TimeoutError(f"no successful response from {path} in {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def _report(label: str, samples: list[float]) -> None:
+    print(
+        f"{label:<16} median {statistics.median(samples) * 1000:8.1f} ms  "
+        f"min {min(samples) * 1000:8.1f} ms  max {max(samples) * 1000:8.1f} ms"
+    )
+
+
+def main() -> None:
+    args = parse_args()
+    _report("import main", [time_import() for _ in range(args.runs)])
+    _report(
+        "first request",
+        [time_first_request(args.path, args.timeout) for _ in range(args.runs)],
+    )
+
+
+if __name__ == "__main__":
+    main()
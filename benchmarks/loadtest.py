@@ -0,0 +1,506 @@
+"""
+Load test of a running API with a weighted mix of scenarios.
+
+Scenarios (weights with --mix, e.g. "detail=50,search=25,write_burst=10"):
+
+- detail: `GET /books/{id}` over a small hot set, answered from the cache;
+- search: `GET /books/?q=` with words from real titles, a random sort and
+  page size, and sometimes the next page through its cursor. The many
+  combinations keep most of them cold;
+- deep_cursor: walks --deep-pages pages of `GET /books/?q=` by cursor
+  (similarity sort, the only one with cursors), for the words most common in
+  the sampled titles. Walks that run out of matches first are counted and
+  reported;
+- deep_offset: one page at offset --deep-pages * limit, for comparison;
+- write_burst: --burst concurrent `POST /books/{id}/reviews` on one book,
+  then a `PATCH` of its title (unchanged value). The reviews invalidate the
+  book's entries and the PATCH bumps the `books:list` cache version, so
+  searches and pages that follow miss again.
+
+--concurrency workers each run one scenario after another (closed loop).
+With --rate, scenarios start at that total rate instead (open loop), and a
+scenario's first request is timed from when it was due to start. Latency is
+then not hidden by a slow server delaying the next request (coordinated
+omission). Latencies go into HDR-style log-linear histograms (2 significant
+digits, about 1% error). The test reports throughput, status codes, and
+p50/p90/p95/p99/p99.9 per scenario. It writes a JSON result with the run's
+settings, commit and histogram buckets, and can compare it with an earlier
+result file. Reviews created by the run are deleted at the end.
+
+Usage:
+    docker compose up -d
+    python benchmarks/loadtest.py --base-url http://localhost:8000 \
+        --duration 60 --concurrency 32 --output results/run.json
+    python benchmarks/loadtest.py --rate 200 --compare results/run.json
+
+Seed the catalog first (scripts/seed_file_async.py).
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dependencies import STOPWORDS  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASE_URL = os.getenv("LOADTEST_BASE_URL", "http://localhost:8000")
+DEFAULT_MIX = "detail=50,search=25,deep_cursor=10,deep_offset=5,write_burst=10"
+SORTS = ("similarity:desc", "title:asc", "title:desc", "year:desc", "year:asc")
+PERCENTILES = (50, 90, 95, 99, 99.9)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Weighted load test of the API")
+    parser.add_argument(
+        "--base-url",
+        default=DEFAULT_BASE_URL,
+        help="API base URL (default: %(default)s or LOADTEST_BASE_URL)",
+    )
+    parser.add_argument(
+        "--mix", default=DEFAULT_MIX, help="Scenario weights (default: %(default)s)"
+    )
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds")
+    parser.add_argument(
+        "--warmup", type=float, default=5.0, help="Unmeasured seconds before"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=32,
+        help="Workers, or max scenarios in flight with --rate",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=None,
+        help="Scenario starts per second (open loop)",
+    )
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    parser.add_argument(
+        "--books", type=int, default=1000, help="Books sampled for ids and terms"
+    )
+    parser.add_argument(
+        "--hot-books", type=int, default=50, help="Books read by the detail scenario"
+    )
+    parser.add_argument(
+        "--deep-pages", type=int, default=20, help="Pages walked by deep_cursor"
+    )
+    parser.add_argument("--burst", type=int, default=10, help="Reviews per write burst")
+    parser.add_argument("--output", help="Write the JSON result here")
+    parser.add_argument(
+        "--hgrm-dir", help="Write <scenario>.hgrm percentile files here"
+    )
+    parser.add_argument("--compare", help="Earlier JSON result to compare with")
+    return parser.parse_args()
+
+
+class Histogram:
+    """
+    Log-linear latency histogram in microseconds, like HdrHistogram with two
+    significant digits: exact below 128 µs, then 64 buckets per power of two.
+    """
+
+    SUB_BITS = 7
+
+    def __init__(self) -> None:
+        self.counts: Counter[int] = Counter()
+        self.total = 0
+        self.sum = 0
+        self.max = 0
+
+    def record(self, micros: int) -> None:
+        micros = max(int(micros), 0)
+        shift = max(micros.bit_length() - self.SUB_BITS, 0)
+        self.counts[(shift << self.SUB_BITS) | (micros >> shift)] += 1
+        self.total += 1
+        self.sum += micros
+        self.max = max(self.max, micros)
+
+    def _upper(self, index: int) -> int:
+        """Highest value that lands in bucket `index`."""
+        shift, mantissa = index >> self.SUB_BITS, index & ((1 << self.SUB_BITS) - 1)
+        return ((mantissa + 1) << shift) - 1
+
+    def buckets(self) -> list[tuple[int, int]]:
+        return [(self._upper(i), n) for i, n in sorted(self.counts.items())]
+
+    def value_at(self, percentile: float) -> int:
+        if not self.total:
+            return 0
+        rank = max(math.ceil(percentile / 100 * self.total), 1)
+        seen = 0
+        for upper, n in self.buckets():
+            seen += n
+            if seen >= rank:
+                return min(upper, self.max)
+        return self.max
+
+    def merge(self, other: "Histogram") -> None:
+        self.counts.update(other.counts)
+        self.total += other.total
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def hgrm(self) -> str:
+        """Percentile distribution in HdrHistogram's text format, values in ms."""
+        lines = [
+            f"{'Value':>12} {'Percentile':>14} {'TotalCount':>10} {'1/(1-Percentile)':>14}",
+            "",
+        ]
+        seen = 0
+        for upper, n in self.buckets():
+            seen += n
+            p = seen / self.total
+            value = min(upper, self.max) / 1000
+            if p < 1:
+                lines.append(f"{value:12.3f} {p:14.12f} {seen:10d} {1 / (1 - p):14.2f}")
+            else:
+                lines.append(f"{value:12.3f} {p:14.12f} {seen:10d}")
+        mean = self.sum / self.total / 1000 if self.total else 0
+        lines.append(f"#[Mean    = {mean:12.3f}, Max     = {self.max / 1000:12.3f}]")
+        lines.append(f"#[Total count    = {self.total:12d}]")
+        return "\n".join(lines) + "\n"
+
+
+@dataclass
+class Stats:
+    latency: Histogram = field(default_factory=Histogram)
+    statuses: Counter[str] = field(default_factory=Counter)
+    scenarios: int = 0
+
+    @property
+    def errors(self) -> int:
+        return sum(n for s, n in self.statuses.items() if not s.startswith(("2", "3")))
+
+    def summary(self, seconds: float) -> dict:
+        h = self.latency
+        return {
+            "scenarios": self.scenarios,
+            "requests": h.total,
+            "errors": self.errors,
+            "statuses": dict(sorted(self.statuses.items())),
+            "rps": round(h.total / seconds, 2),
+            "mean_ms": round(h.sum / h.total / 1000, 3) if h.total else 0,
+            **{_pkey(p): round(h.value_at(p) / 1000, 3) for p in PERCENTILES},
+            "max_ms": round(h.max / 1000, 3),
+            "histogram": {
+                "unit": "us",
+                "significant_bits": Histogram.SUB_BITS,
+                "buckets": h.buckets(),
+            },
+        }
+
+
+def _pkey(p: float) -> str:
+    return f"p{p:g}".replace(".", "_") + "_ms"
+
+
+class Run:
+    """Shared state of a run: sampled catalog data and per-scenario stats."""
+
+    def __init__(self, client: httpx.AsyncClient, args: argparse.Namespace):
+        self.client = client
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.books: list[dict] = []
+        self.terms: list[str] = []
+        self.broad_terms: list[str] = []
+        self.short_walks = 0
+        self.stats: dict[str, Stats] = {}
+        self.reviews: list[int] = []
+        self.recording = False
+        self.run_id = uuid.uuid4().hex[:8]
+
+    async def request(
+        self, scenario: str, method: str, url: str, due: float | None = None, **kwargs
+    ) -> httpx.Response | None:
+        start = time.perf_counter() if due is None else due
+        try:
+            resp = await self.client.request(method, url, **kwargs)
+            status = str(resp.status_code)
+        except httpx.HTTPError as exc:
+            resp, status = None, exc.__class__.__name__
+        if self.recording:
+            stats = self.stats.setdefault(scenario, Stats())
+            stats.latency.record((time.perf_counter() - start) * 1e6)
+            stats.statuses[status] += 1
+        return resp
+
+    async def sample_catalog(self) -> None:
+        # by offset: the plain list has no cursor (only similarity sort does)
+        limit = 100
+        while len(self.books) < self.args.books:
+            params = {"limit": limit, "offset": len(self.books)}
+            resp = await self.client.get("/books/", params=params)
+            resp.raise_for_status()
+            items = resp.json()["items"]
+            self.books += items[: self.args.books - len(self.books)]
+            if len(items) < limit:
+                break
+        if not self.books:
+            sys.exit("No books: seed the catalog first")
+        if len(self.books) < self.args.books:
+            print(f"warning: only {len(self.books)} books, asked for {self.args.books}")
+        words = Counter(
+            w
+            for b in self.books
+            for w in re.findall(r"[^\W\d_]{4,}", b["title"].lower())
+            if w not in STOPWORDS
+        )
+        self.terms = sorted(words) or ["book"]
+        self.broad_terms = [w for w, _ in words.most_common(5)] or ["book"]
+
+
+async def detail(run: Run, due: float | None) -> None:
+    book = run.rng.choice(run.books[: run.args.hot_books])
+    await run.request("detail", "GET", f"/books/{book['id']}", due)
+
+
+async def search(run: Run, due: float | None) -> None:
+    rng = run.rng
+    q = " ".join(rng.sample(run.terms, k=min(rng.choice((1, 1, 2)), len(run.terms))))
+    params = {"q": q, "sort": rng.choice(SORTS), "limit": rng.choice((10, 20, 50))}
+    resp = await run.request("search", "GET", "/books/", due, params=params)
+    cursor = resp.json().get("next_cursor") if resp and resp.is_success else None
+    if cursor and rng.random() < 0.3:
+        await run.request(
+            "search", "GET", "/books/", params={**params, "cursor": cursor}
+        )
+
+
+async def deep_cursor(run: Run, due: float | None) -> None:
+    q = run.rng.choice(run.broad_terms)
+    params = {"q": q, "limit": 50, "sort": "similarity:desc"}
+    for page in range(1, run.args.deep_pages + 1):
+        resp = await run.request("deep_cursor", "GET", "/books/", due, params=params)
+        due = None
+        cursor = resp.json().get("next_cursor") if resp and resp.is_success else None
+        if not cursor:
+            if page < run.args.deep_pages and run.recording:
+                run.short_walks += 1
+            return
+        params = {**params, "cursor": cursor}
+
+
+async def deep_offset(run: Run, due: float | None) -> None:
+    limit = 50
+    params = {
+        "limit": limit,
+        "offset": run.args.deep_pages * limit,
+        "sort": "year:desc",
+    }
+    await run.request("deep_offset", "GET", "/books/", due, params=params)
+
+
+async def write_burst(run: Run, due: float | None) -> None:
+    book = run.rng.choice(run.books)
+    tag = f"load-{run.run_id}-{uuid.uuid4().hex[:6]}"
+    responses = await asyncio.gather(
+        *(
+            run.request(
+                "write_burst",
+                "POST",
+                f"/books/{book['id']}/reviews",
+                due,
+                json={"reviewer_name": f"{tag}-{i}", "rating": run.rng.randint(1, 5)},
+            )
+            for i in range(run.args.burst)
+        )
+    )
+    run.reviews += [r.json()["id"] for r in responses if r is not None and r.is_success]
+    await run.request(
+        "write_burst", "PATCH", f"/books/{book['id']}", json={"title": book["title"]}
+    )
+
+
+SCENARIOS: dict[str, Callable[[Run, float | None], Awaitable[None]]] = {
+    "detail": detail,
+    "search": search,
+    "deep_cursor": deep_cursor,
+    "deep_offset": deep_offset,
+    "write_burst": write_burst,
+}
+
+
+def parse_mix(raw: str) -> dict[str, float]:
+    mix = {}
+    for item in filter(None, raw.split(",")):
+        name, _, weight = item.partition("=")
+        if name not in SCENARIOS:
+            sys.exit(f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def run_scenario(run: Run, name: str, due: float | None) -> None:
+    await SCENARIOS[name](run, due)
+    if run.recording:
+        run.stats.setdefault(name, Stats()).scenarios += 1
+
+
+async def closed_loop(run: Run, mix: dict[str, float], until: float) -> None:
+    names, weights = list(mix), list(mix.values())
+
+    async def worker() -> None:
+        while time.perf_counter() < until:
+            await run_scenario(run, run.rng.choices(names, weights)[0], None)
+
+    await asyncio.gather(*(worker() for _ in range(run.args.concurrency)))
+
+
+async def open_loop(run: Run, mix: dict[str, float], until: float) -> None:
+    names, weights = list(mix), list(mix.values())
+    slots = asyncio.Semaphore(run.args.concurrency)
+    interval = 1 / run.args.rate
+    tasks: set[asyncio.Task] = set()
+
+    async def scheduled(name: str, due: float) -> None:
+        async with slots:  # waiting for a slot counts as latency
+            await run_scenario(run, name, due)
+
+    due = time.perf_counter()
+    while due < until:
+        await asyncio.sleep(max(due - time.perf_counter(), 0))
+        task = asyncio.create_task(scheduled(run.rng.choices(names, weights)[0], due))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        due += interval
+    await asyncio.gather(*tasks)
+
+
+def _commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def print_table(result: dict) -> None:
+    header = f"{'scenario':<12} {'req':>7} {'err':>5} {'rps':>8}" + "".join(
+        f" {'p' + str(p):>8}" for p in PERCENTILES
+    )
+    print(header + f" {'max':>8}   (ms)")
+    rows = {**result["scenarios"], "total": result["total"]}
+    for name, s in rows.items():
+        print(
+            f"{name:<12} {s['requests']:>7} {s['errors']:>5} {s['rps']:>8.1f}"
+            + "".join(f" {s[_pkey(p)]:>8.2f}" for p in PERCENTILES)
+            + f" {s['max_ms']:>8.2f}"
+        )
+
+
+def print_comparison(result: dict, baseline: dict) -> None:
+    print(f"\nvs {baseline['meta'].get('commit')} ({baseline['meta']['started_at']}):")
+    print(f"{'scenario':<12} {'rps':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+    rows = {**result["scenarios"], "total": result["total"]}
+    before = {**baseline["scenarios"], "total": baseline["total"]}
+
+    def delta(new: float, old: float) -> str:
+        return f"{(new - old) / old * 100:+8.1f}%" if old else f"{'n/a':>9}"
+
+    for name, s in rows.items():
+        if name not in before:
+            continue
+        b = before[name]
+        print(
+            f"{name:<12} {delta(s['rps'], b['rps'])}"
+            + "".join(f" {delta(s[k], b[k])}" for k in ("p50_ms", "p95_ms", "p99_ms"))
+        )
+
+
+async def main() -> None:
+    args = parse_args()
+    mix = parse_mix(args.mix)
+    limits = httpx.Limits(max_connections=args.concurrency * max(args.burst, 1))
+    async with httpx.AsyncClient(
+        base_url=args.base_url, timeout=30.0, limits=limits
+    ) as client:
+        run = Run(client, args)
+        await run.sample_catalog()
+        print(
+            f"{len(run.books)} books, {len(run.terms)} search words; "
+            f"warmup {args.warmup:g}s, measuring {args.duration:g}s"
+        )
+        loop = open_loop if args.rate else closed_loop
+        started_at = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        try:
+            await loop(run, mix, time.perf_counter() + args.warmup)
+            run.recording = True
+            start = time.perf_counter()
+            await loop(run, mix, start + args.duration)
+            elapsed = time.perf_counter() - start
+            run.recording = False
+        finally:
+            await asyncio.gather(
+                *(client.delete(f"/reviews/{rid}") for rid in run.reviews),
+                return_exceptions=True,
+            )
+
+    total = Stats()
+    for stats in run.stats.values():
+        total.latency.merge(stats.latency)
+        total.statuses.update(stats.statuses)
+        total.scenarios += stats.scenarios
+    result = {
+        "meta": {
+            "base_url": args.base_url,
+            "started_at": started_at,
+            "commit": _commit(),
+            "duration_s": round(elapsed, 3),
+            "mode": f"open, {args.rate:g}/s" if args.rate else "closed",
+            "concurrency": args.concurrency,
+            "mix": mix,
+            "seed": args.seed,
+            "books": len(run.books),
+            "deep_cursor_short_walks": run.short_walks,
+        },
+        "scenarios": {
+            name: run.stats[name].summary(elapsed) for name in mix if name in run.stats
+        },
+        "total": total.summary(elapsed),
+    }
+    print_table(result)
+    walks = result["scenarios"].get("deep_cursor", {}).get("scenarios", 0)
+    if run.short_walks:
+        print(
+            f"warning: {run.short_walks} of {walks} deep_cursor walks ended before "
+            f"{args.deep_pages} pages: their search terms match too few books"
+        )
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(result, json.load(f))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    if args.hgrm_dir:
+        os.makedirs(args.hgrm_dir, exist_ok=True)
+        for name, stats in {**run.stats, "total": total}.items():
+            with open(os.path.join(args.hgrm_dir, f"{name}.hgrm"), "w") as f:
+                f.write(stats.latency.hgrm())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,3 +1,4 @@
+import asyncio
 import hashlib
 import json
 import os
@@ -5,16 +6,22 @@ from typing import Any, Iterable
 
 from dotenv import load_dotenv
 from fastapi import Request
+from pydantic_core import to_json
 from redis import asyncio as aioredis
 
+from helpers.timing import TimedRedis
+
 Redis = aioredis.Redis
-from_url = aioredis.from_url
+from_url = TimedRedis.from_url
 
 load_dotenv()
 
 _redis: Redis | None = None
+_raw_redis: Redis | None = None
 DEFAULT_TTL = 300
+ETAG_LENGTH = 16
 VERSION_KEY_PREFIX = "cache:version:"
+STATS_KEY = "stats:catalog"
 
 
 async def get_cache_version(name: str, r: Redis | None = None) -> int:
@@ -52,11 +59,28 @@ async def init_redis() -> Redis:
     return _redis
 
 
+async def init_raw_redis() -> Redis:
+    """A second client that returns bytes, for binary values (encoded bodies)."""
+    global _raw_redis
+    if _raw_redis is None:
+        _raw_redis = from_url(REDIS_URL)
+    return _raw_redis
+
+
+async def prewarm_redis(r: Redis, connections: int) -> None:
+    """Fill the client's pool with `connections` live connections via concurrent PINGs."""
+    if connections > 0:
+        await asyncio.gather(*(r.ping() for _ in range(connections)))
+
+
 async def close_redis():
-    global _redis
+    global _redis, _raw_redis
     if _redis is not None:
         await _redis.close()
         _redis = None
+    if _raw_redis is not None:
+        await _raw_redis.close()
+        _raw_redis = None
 
 
 async def get_redis(request: Request) -> Redis:
@@ -68,6 +92,70 @@ async def get_redis(request: Request) -> Redis:
     return redis_client
 
 
+def _params_prefix(params_payload: str) -> bytes:
+    return b'{"_params":' + to_json(params_payload) + b',"data":'
+
+
+def _encode(data: Any, params_payload: str | None = None) -> tuple[str, bytes]:
+    """
+    JSON prefixed by its content hash, which doubles as the entry's ETag.
+    `data` is a body already rendered for the response, or a value to render.
+    With `params_payload` the body is wrapped with that params guard; the hash
+    is of the body alone, so equal responses share an ETag whatever their key.
+    """
+    body = data if isinstance(data, bytes) else to_json(data)
+    etag = hashlib.sha1(body).hexdigest()[:ETAG_LENGTH]
+    if params_payload is not None:
+        body = _params_prefix(params_payload) + body + b"}"
+    return etag, etag.encode() + b"\n" + body
+
+
+def _decode(raw: str | None) -> tuple[Any, str | None] | None:
+    if not raw:
+        return None
+    if raw[ETAG_LENGTH : ETAG_LENGTH + 1] != "\n":  # written before ETags
+        return json.loads(raw), None
+    return json.loads(raw[ETAG_LENGTH + 1 :]), raw[:ETAG_LENGTH]
+
+
+def entry_body(
+    raw: bytes | None, params_payload: str | None = None
+) -> tuple[str, bytes] | None:
+    """
+    (ETag, response body) sliced from a raw entry, without parsing it; for a
+    list entry only when its params match. None when there is nothing to serve.
+    """
+    if not raw or raw[ETAG_LENGTH : ETAG_LENGTH + 1] != b"\n":
+        return None
+    etag, body = raw[:ETAG_LENGTH].decode(), raw[ETAG_LENGTH + 1 :]
+    if params_payload is None:
+        return etag, body
+    prefix = _params_prefix(params_payload)
+    if not body.startswith(prefix):
+        return None
+    return etag, body[len(prefix) : -1]
+
+
+async def set_entry(
+    key: str,
+    data: Any,
+    r: Redis | None = None,
+    ttl: int = DEFAULT_TTL,
+    params_payload: str | None = None,
+) -> str:
+    """Cache `data` (rendered JSON bytes or a value) under `key`; returns its ETag."""
+    r = r or await init_redis()
+    etag, raw = _encode(data, params_payload)
+    await r.set(key, raw, ex=ttl)
+    return etag
+
+
+async def get_entry(key: str, r: Redis | None = None) -> tuple[Any, str | None] | None:
+    """Cached (data, ETag), or None on a miss."""
+    r = r or await init_redis()
+    return _decode(await r.get(key))
+
+
 def normalize_params(params: dict) -> tuple[dict, str]:
     clean = {k: v for k, v in params.items() if v is not None}
     payload = json.dumps(clean, sort_keys=True, separators=(",", ":"))
@@ -120,43 +208,65 @@ def make_reviews_key(book_id: int) -> str:
     return f"book:{book_id}:reviews"
 
 
+def make_book_authors_key(book_id: int) -> str:
+    return f"book:{book_id}:authors"
+
+
+def make_similar_key(book_id: int) -> str:
+    return f"book:{book_id}:similar"
+
+
+def make_search_estimate_key(q: str) -> str:
+    digest = hashlib.sha256(q.lower().encode()).hexdigest()
+    return f"search:estimate:{digest}"
+
+
 async def cache_book(
     book_id: int, book_data: dict, r: Redis | None = None, ttl: int = DEFAULT_TTL
-):
-    r = r or await init_redis()
-    await r.set(make_book_key(book_id), json.dumps(book_data), ex=ttl)
+) -> str:
+    return await set_entry(make_book_key(book_id), book_data, r=r, ttl=ttl)
 
 
 async def get_book(book_id: int, r: Redis | None = None) -> dict | None:
+    entry = await get_entry(make_book_key(book_id), r)
+    return entry[0] if entry else None
+
+
+async def get_similar(book_id: int, r: Redis | None = None) -> list | None:
+    """Precomputed [[book id, score], ...] neighbours (see tasks.recommend)."""
     r = r or await init_redis()
-    raw = await r.get(make_book_key(book_id))
+    raw = await r.get(make_similar_key(book_id))
     return json.loads(raw) if raw else None
 
 
+async def get_stats_body() -> bytes | None:
+    """
+    Catalog statistics published by tasks.analytics.compute_stats, as stored:
+    already the JSON response body.
+    """
+    return await (await init_raw_redis()).get(STATS_KEY)
+
+
 async def cache_author(
     author_id: int, author_data: dict, r: Redis | None = None, ttl: int = DEFAULT_TTL
-):
-    r = r or await init_redis()
-    await r.set(make_author_key(author_id), json.dumps(author_data), ex=ttl)
+) -> str:
+    return await set_entry(make_author_key(author_id), author_data, r=r, ttl=ttl)
 
 
 async def get_author(author_id: int, r: Redis | None = None) -> dict | None:
-    r = r or await init_redis()
-    raw = await r.get(make_author_key(author_id))
-    return json.loads(raw) if raw else None
+    entry = await get_entry(make_author_key(author_id), r)
+    return entry[0] if entry else None
 
 
 async def cache_list(
     key: str, data: Any, r: Redis | None = None, ttl: int = DEFAULT_TTL
-):
-    r = r or await init_redis()
-    await r.set(key, json.dumps(data), ex=ttl)
+) -> str:
+    return await set_entry(key, data, r=r, ttl=ttl)
 
 
 async def get_list(key: str, r: Redis | None = None) -> Any | None:
-    r = r or await init_redis()
-    raw = await r.get(key)
-    return json.loads(raw) if raw else None
+    entry = await get_entry(key, r)
+    return entry[0] if entry else None
 
 
 async def cache_list_with_params(
@@ -165,19 +275,33 @@ async def cache_list_with_params(
     params_payload: str,
     r: Redis | None = None,
     ttl: int = DEFAULT_TTL,
-):
-    """Store list data alongside normalized params to guard against collisions."""
-    await cache_list(key, {"data": data, "_params": params_payload}, r=r, ttl=ttl)
+) -> str:
+    """
+    Store list data alongside normalized params to guard against collisions.
+    The params go first so the body can be sliced back out (entry_body).
+    """
+    return await set_entry(key, data, r, ttl, params_payload)
+
+
+async def get_list_entry_with_params(
+    key: str, expected_params_payload: str, r: Redis | None = None
+) -> tuple[Any, str | None] | None:
+    """Cached (list, ETag) only if params match; otherwise treat as miss."""
+    entry = await get_entry(key, r=r)
+    if entry is None:
+        return None
+    cached, etag = entry
+    if isinstance(cached, dict) and cached.get("_params") == expected_params_payload:
+        return cached.get("data"), etag
+    return None
 
 
 async def get_list_with_params(
     key: str, expected_params_payload: str, r: Redis | None = None
 ) -> Any | None:
     """Return cached list only if params match; otherwise treat as miss."""
-    cached = await get_list(key, r=r)
-    if isinstance(cached, dict) and cached.get("_params") == expected_params_payload:
-        return cached.get("data")
-    return None
+    entry = await get_list_entry_with_params(key, expected_params_payload, r)
+    return entry[0] if entry else None
 
 
 async def link_book_to_authors(
@@ -188,24 +312,46 @@ async def link_book_to_authors(
         await r.sadd(make_author_books_key(aid), book_id)
 
 
+async def cache_book_author_ids(
+    book_id: int,
+    author_ids: Iterable[int],
+    r: Redis | None = None,
+    ttl: int = DEFAULT_TTL,
+):
+    # JSON list rather than a set so "no authors" is cacheable too.
+    r = r or await init_redis()
+    await r.set(make_book_authors_key(book_id), json.dumps(sorted(author_ids)), ex=ttl)
+
+
+async def get_book_author_ids(book_id: int, r: Redis | None = None) -> list[int] | None:
+    r = r or await init_redis()
+    raw = await r.get(make_book_authors_key(book_id))
+    return json.loads(raw) if raw is not None else None
+
+
 async def get_books_for_author(author_id: int, r: Redis | None = None) -> set[int]:
     r = r or await init_redis()
     return {int(bid) for bid in await r.smembers(make_author_books_key(author_id))}
 
 
-async def invalidate_book(book_id: int, r: Redis | None = None):
+async def invalidate_book(
+    book_id: int, r: Redis | None = None, keep_author_link: bool = False
+):
+    """Drop cached reads for a book; keep_author_link for review-only changes."""
     r = r or await init_redis()
+    keys = [make_book_key(book_id), make_reviews_key(book_id)]
+    if not keep_author_link:
+        keys.append(make_book_authors_key(book_id))
     # In cluster mode, delete keys individually to avoid CROSSSLOT on multi-key DEL.
-    for key in (
-        make_book_key(book_id),
-        make_reviews_key(book_id),
-        f"book:{book_id}:authors",
-    ):
+    for key in keys:
         await r.delete(key)
 
 
 async def invalidate_author(
-    author_id: int, r: Redis | None = None, book_ids: Iterable[int] | None = None
+    author_id: int,
+    r: Redis | None = None,
+    book_ids: Iterable[int] | None = None,
+    keep_author_link: bool = False,
 ):
     r = r or await init_redis()
     await r.delete(make_author_key(author_id))
@@ -219,6 +365,8 @@ async def invalidate_author(
         for bid in related_book_ids:
             keys_to_delete.append(make_book_key(bid))
             keys_to_delete.append(make_reviews_key(bid))
+            if not keep_author_link:
+                keys_to_delete.append(make_book_authors_key(bid))
         # Delete keys one by one to avoid Redis cluster cross-slot errors.
         for key in keys_to_delete:
             await r.delete(key)
@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.schedules import crontab
 
 broker_url = (
     os.getenv("CELERY_BROKER_URL")
@@ -11,7 +12,12 @@ backend_url = (
     or "redis://localhost:6379/1"    # safer than same DB as broker
 )
 
-app = Celery("library_app", broker=broker_url, backend=backend_url)
+app = Celery(
+    "library_app",
+    broker=broker_url,
+    backend=backend_url,
+    include=["tasks.analytics", "tasks.email", "tasks.media", "tasks.recommend"],
+)
 
 app.conf.update(
     task_default_queue="default",
@@ -30,6 +36,27 @@ app.conf.update(
         "tasks.media.*": {"queue": "media"},
         "tasks.email.*": {"queue": "email"},
         "tasks.analytics.*": {"queue": "analytics"},
+        "tasks.recommend.*": {"queue": "analytics"},
+    },
+
+    beat_schedule={
+        "compute-similar-books": {
+            "task": "tasks.recommend.compute_similar_books",
+            "schedule": crontab(hour=3, minute=0),
+        },
+        "compute-stats": {
+            "task": "tasks.analytics.compute_stats",
+            "schedule": crontab(minute="*/15"),
+        },
+        "compute-stats-full": {
+            "task": "tasks.analytics.compute_stats",
+            "schedule": crontab(hour=4, minute=30),
+            "kwargs": {"full": True},
+        },
+        "expire-leaderboards": {
+            "task": "tasks.analytics.expire_leaderboards",
+            "schedule": crontab(minute=0),
+        },
     },
 )
 
@@ -1,3 +1,5 @@
+import os
+import re
 from fastapi import Query, HTTPException, status
 from typing import List
 from schemas.book import BookSortControl, SortField, SortDirection
@@ -38,3 +40,52 @@ def parse_sort(
         result.append(BookSortControl(sort_field=field, sort_direction=direction))
 
     return result
+
+
+SEARCH_MIN_LENGTH = int(os.getenv("SEARCH_MIN_LENGTH", "3"))
+SEARCH_MAX_LENGTH = int(os.getenv("SEARCH_MAX_LENGTH", "200"))
+SEARCH_MAX_TERMS = int(os.getenv("SEARCH_MAX_TERMS", "8"))
+
+# Postgres' english FTS stopwords (most common ones): a query made only of
+# these has an empty tsquery and matches nearly every title by trigram
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have he her his i if in into is "
+    "it its me my no not of on or our she so than that the their them then there "
+    "these they this to was we were what when which who will with you your".split()
+)
+_WORD = re.compile(r"\w+")
+
+
+def search_term(
+    q: str | None = Query(None, description="Full-text query"),
+) -> str | None:
+    """Reject search terms that cannot be answered selectively before they reach the DB."""
+    if q is None:
+        return None
+    q = " ".join(q.split())
+    if not q:
+        return None
+
+    if len(q) < SEARCH_MIN_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Search term must be at least {SEARCH_MIN_LENGTH} characters",
+        )
+    if len(q) > SEARCH_MAX_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Search term must be at most {SEARCH_MAX_LENGTH} characters",
+        )
+
+    words = _WORD.findall(q.lower())
+    if len(words) > SEARCH_MAX_TERMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Search term must have at most {SEARCH_MAX_TERMS} words",
+        )
+    if all(w in STOPWORDS for w in words):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Search term only contains common words",
+        )
+    return q
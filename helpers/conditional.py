@@ -0,0 +1,120 @@
+"""
+Serving cached reads: conditional GET and pre-encoded bodies.
+
+The ETag is the content hash stored at the start of every cache entry (see
+cache.set_entry), and the rest of the entry is the uncompressed body exactly
+as the handler rendered it. Beside the entry, `{key}:{coding}` holds that body
+compressed for gzip/br as `{etag}{flag}{body}`, where flag is 1 when the body
+is compressed. The variant is valid only while its etag matches the entry's,
+so invalidating the entry retires it too. A compressed body is a different
+representation, so it is sent with its own ETag, `"{etag}-{coding}"` (the
+tag GZipMiddleware gives a compressed miss, too). If-None-Match accepts any
+of an entry's tags: every representation revalidates while the entry lives.
+
+A hit costs one round trip (the entry itself, or the entry's hash plus the
+variant, pipelined) and no JSON work; a 304 also skips the body.
+"""
+
+import hashlib
+
+from fastapi import Request, Response
+
+from cache import DEFAULT_TTL, ETAG_LENGTH, entry_body, init_raw_redis
+from helpers.encoding import COMPRESS_MIN_BYTES, coded_etag, compress, negotiate
+from helpers.timing import timed
+
+# request state: the key the response cache middleware already missed on
+MISS_STATE = "response_cache_miss"
+# codings an ETag may name, whether or not this process can produce them
+ETAG_CODINGS = ("gzip", "br")
+
+
+def quote_etag(etag: str) -> str:
+    return f'"{etag}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    If-None-Match comparison (weak, as RFC 9110 requires for GET) against
+    every representation's tag of the entry with ETag `etag`.
+    """
+    if if_none_match.strip() == "*":
+        return True
+    tag = quote_etag(etag)
+    tags = {tag, *(coded_etag(tag, coding) for coding in ETAG_CODINGS)}
+    candidates = (c.strip().removeprefix("W/") for c in if_none_match.split(","))
+    return any(c in tags for c in candidates)
+
+
+def set_etag(response: Response, etag: str | None) -> None:
+    if etag:
+        response.headers["ETag"] = quote_etag(etag)
+
+
+def _variant_key(key: str, coding: str, params_payload: str | None) -> str:
+    if params_payload is None:
+        return f"{key}:{coding}"
+    # list keys hash their params; a second, independent hash keeps a key
+    # collision from serving another query's body
+    guard = hashlib.sha256(params_payload.encode()).hexdigest()[:16]
+    return f"{key}:{coding}:{guard}"
+
+
+def _response(request: Request, body: bytes, etag: str, coding: str | None) -> Response:
+    """200 with `body` encoded as `coding`, or 304 when If-None-Match matches."""
+    headers = {"ETag": coded_etag(quote_etag(etag), coding), "Vary": "Accept-Encoding"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    if coding:
+        headers["Content-Encoding"] = coding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def serve_cached(
+    request: Request, key: str, params_payload: str | None = None
+) -> Response | None:
+    """
+    Answer from the cache entry at `key` (a list entry when `params_payload`
+    is given): 304 when If-None-Match matches, else the encoded body the
+    client negotiated. None on a miss.
+    """
+    if request.scope.get("state", {}).get(MISS_STATE) == key:
+        return None
+    coding = negotiate(request.headers.get("accept-encoding"))
+    raw = await init_raw_redis()
+    if coding is None:
+        entry = entry_body(await raw.get(key), params_payload)
+        if entry is None:
+            return None
+        etag, body = entry
+        return _response(request, body, etag, None)
+
+    variant_key = _variant_key(key, coding, params_payload)
+    async with raw.pipeline(transaction=False) as pipe:
+        pipe.getrange(key, 0, ETAG_LENGTH)
+        pipe.get(variant_key)
+        head, variant = await pipe.execute()
+    if head[ETAG_LENGTH:] != b"\n":
+        return None
+    etag = head[:ETAG_LENGTH].decode()
+
+    if variant and variant[:ETAG_LENGTH] == etag.encode():
+        compressed = variant[ETAG_LENGTH : ETAG_LENGTH + 1] == b"1"
+        body = variant[ETAG_LENGTH + 1 :]
+        return _response(request, body, etag, coding if compressed else None)
+
+    entry = entry_body(await raw.get(key), params_payload)
+    if entry is None or entry[0] != etag:
+        return None  # gone or replaced meanwhile: let the handler answer
+    body = entry[1]
+    compressed = len(body) >= COMPRESS_MIN_BYTES
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        # a 304 needs only the tag: skip compressing
+        return _response(request, b"", etag, coding if compressed else None)
+    if compressed:
+        with timed("compress"):
+            body = compress(body, coding)
+    flag = b"1" if compressed else b"0"
+    await raw.set(variant_key, etag.encode() + flag + body, ex=DEFAULT_TTL)
+    return _response(request, body, etag, coding if compressed else None)
@@ -0,0 +1,52 @@
+"""Derive SQLAlchemy loader options from pydantic response models."""
+
+import typing
+from functools import lru_cache
+
+from pydantic import BaseModel
+from sqlalchemy import Select, inspect
+from sqlalchemy.orm import load_only, raiseload, selectinload
+
+
+def _nested_model(annotation) -> type[BaseModel] | None:
+    """Return the pydantic model inside `X`, `List[X]` or `X | None`."""
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    for arg in typing.get_args(annotation):
+        found = _nested_model(arg)
+        if found is not None:
+            return found
+    return None
+
+
+@lru_cache(maxsize=None)
+def plan_loads(model: type[BaseModel], entity: type) -> tuple:
+    """
+    Loader options fetching exactly the columns and relationships `model` reads
+    from `entity`. Anything else is deferred with raiseload, so a response that
+    starts reading an unplanned attribute fails loudly instead of lazy loading.
+    """
+    mapper = inspect(entity)
+    columns = []
+    relationships = []
+    for name, field in model.model_fields.items():
+        if name in mapper.column_attrs:
+            columns.append(getattr(entity, name))
+        elif name in mapper.relationships:
+            target = _nested_model(field.annotation)
+            if target is None:
+                raise TypeError(f"{model.__name__}.{name} is not a pydantic model")
+            sub_options = plan_loads(target, mapper.relationships[name].mapper.class_)
+            relationships.append(
+                selectinload(getattr(entity, name)).options(*sub_options)
+            )
+    return (load_only(*columns, raiseload=True), *relationships, raiseload("*"))
+
+
+def apply_response_shape(
+    stmt: Select, model: type[BaseModel], entity: type | None = None
+) -> Select:
+    """Restrict `stmt` to what `model` serializes; entity defaults to the first one selected."""
+    if entity is None:
+        entity = stmt.column_descriptions[0]["entity"]
+    return stmt.options(*plan_loads(model, entity))
@@ -0,0 +1,79 @@
+"""Response compression: Accept-Encoding negotiation and codecs."""
+
+import gzip
+import os
+
+from starlette.datastructures import MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware as _GZipMiddleware
+from starlette.types import Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+# in order of preference when the client accepts several equally
+CODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding: str | None) -> str | None:
+    """The supported coding the client prefers, or None for identity."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip().lower()] = q
+    wildcard = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    for coding in CODINGS:
+        q = weights.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(body: bytes, coding: str) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # mtime=0: identical input gives identical bytes
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def coded_etag(tag: str, coding: str | None) -> str:
+    """
+    The quoted ETag `tag` of a body, for that body encoded with `coding`:
+    each encoding is a different representation and needs a tag of its own.
+    """
+    if not coding or tag.endswith(f'-{coding}"'):
+        return tag
+    return f'{tag[:-1]}-{coding}"'
+
+
+class GZipMiddleware(_GZipMiddleware):
+    """Starlette's, with the ETag of a response it compressed made gzip's own."""
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def tag_coding(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                etag = headers.get("etag")
+                coding = headers.get("content-encoding")
+                if etag and coding:
+                    headers["ETag"] = coded_etag(etag, coding)
+            await send(message)
+
+        await super().__call__(scope, receive, tag_coding)
@@ -0,0 +1,208 @@
+"""
+Adaptive concurrency limits and load shedding.
+
+Requests are split into budgets (search, export, read, write), each with its own
+AIMD limit on requests in flight. A request that finishes within the
+budget's target latency raises the limit by 1/limit, about one slot per
+round of requests at the limit. A slower one, or a 503 such as a statement
+timeout, multiplies it by LIMIT_BACKOFF, at most once per observed latency
+so that one burst of slow completions counts once. When the database slows
+down, queries and pool checkouts take longer and each budget's limit falls
+to what the database is still serving in time.
+
+Over its limit, a request waits up to the budget's queue timeout for a slot
+and is otherwise rejected at once with 503 and Retry-After, instead of
+queueing on the connection pool until it times out. Search queues for no
+time by default, so expensive searches are shed first while detail reads
+and writes keep their own slots. An export holds its slot until the last
+byte of its streamed body is sent, so exports have a small budget of their
+own rather than taking search slots for minutes. Cache hits never get here:
+the response cache middleware sits in front of this one.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+import metrics
+
+LIMIT_BACKOFF = float(os.getenv("LIMIT_BACKOFF", "0.9"))
+RETRY_AFTER_SECONDS = os.getenv("LIMIT_RETRY_AFTER", "1")
+# list routes run the ranked/filtered queries
+SEARCH_PATHS = ("/books/", "/authors/")
+# streamed for as long as the client reads
+EXPORT_PATHS = ("/books/export",)
+UNLIMITED_PATHS = ("/metrics", "/docs", "/redoc", "/openapi.json")
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+@dataclass(frozen=True)
+class Budget:
+    name: str
+    initial: int
+    min_limit: int
+    max_limit: int
+    target_ms: int
+    queue_ms: int
+
+    @classmethod
+    def from_env(cls, name: str, **defaults: int) -> "Budget":
+        """Defaults overridden by LIMIT_<NAME>_<FIELD>, e.g. LIMIT_SEARCH_MAX_LIMIT."""
+        values = {
+            field: int(os.getenv(f"LIMIT_{name.upper()}_{field.upper()}", default))
+            for field, default in defaults.items()
+        }
+        return cls(name=name, **values)
+
+
+DEFAULT_BUDGETS = (
+    Budget.from_env(
+        "search", initial=4, min_limit=1, max_limit=8, target_ms=500, queue_ms=0
+    ),
+    Budget.from_env(
+        "export", initial=2, min_limit=1, max_limit=2, target_ms=1000, queue_ms=0
+    ),
+    Budget.from_env(
+        "read", initial=10, min_limit=2, max_limit=40, target_ms=100, queue_ms=500
+    ),
+    Budget.from_env(
+        "write", initial=5, min_limit=1, max_limit=15, target_ms=250, queue_ms=1000
+    ),
+)
+
+
+class AIMDLimiter:
+    """Concurrency limit for one budget; single event loop, so no locking."""
+
+    def __init__(self, budget: Budget):
+        self.budget = budget
+        self.limit = float(budget.initial)
+        self.inflight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._hold_until = 0.0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _has_slot(self) -> bool:
+        return self.inflight < int(self.limit)
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting up to the budget's queue timeout; False if shed."""
+        if self._has_slot() and not self._waiters:
+            self.inflight += 1
+            return True
+        if self.budget.queue_ms <= 0:
+            return False
+        slot = asyncio.get_running_loop().create_future()
+        self._waiters.append(slot)
+        try:
+            await asyncio.wait({slot}, timeout=self.budget.queue_ms / 1000)
+        except asyncio.CancelledError:
+            if slot.done():
+                self._release()  # handed a slot we can no longer use
+            else:
+                self._abandon(slot)
+            raise
+        if slot.done():
+            return True  # _wake counted us in
+        self._abandon(slot)
+        return False
+
+    def _abandon(self, slot: asyncio.Future) -> None:
+        slot.cancel()
+        self._waiters.remove(slot)
+
+    def _wake(self) -> None:
+        while self._waiters and self._has_slot():
+            slot = self._waiters.popleft()
+            if not slot.done():
+                self.inflight += 1
+                slot.set_result(None)
+
+    def _release(self) -> None:
+        self.inflight -= 1
+        self._wake()
+
+    def release(self, latency: float, overloaded: bool = False) -> None:
+        """Return a slot and adjust the limit from how the request went."""
+        now = time.monotonic()
+        budget = self.budget
+        if overloaded or latency * 1000 > budget.target_ms:
+            if now >= self._hold_until:
+                self.limit = max(budget.min_limit, self.limit * LIMIT_BACKOFF)
+                self._hold_until = now + latency
+        elif self.inflight >= int(self.limit):
+            # only grow a limit that is actually being used
+            self.limit = min(budget.max_limit, self.limit + 1 / self.limit)
+        self._release()
+
+
+def classify(scope: Scope) -> str | None:
+    """Budget name for a request, or None when it is never limited."""
+    path = scope["path"]
+    if path in UNLIMITED_PATHS:
+        return None
+    if scope["method"] not in SAFE_METHODS:
+        return "write"
+    if path in EXPORT_PATHS:
+        return "export"
+    return "search" if path in SEARCH_PATHS else "read"
+
+
+class ConcurrencyLimitMiddleware:
+    def __init__(self, app: ASGIApp, budgets: tuple[Budget, ...] = DEFAULT_BUDGETS):
+        self.app = app
+        self.limiters = {b.name: AIMDLimiter(b) for b in budgets}
+        metrics.register(self._gauges)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        name = classify(scope) if scope["type"] == "http" else None
+        limiter = self.limiters.get(name) if name else None
+        if limiter is None:
+            return await self.app(scope, receive, send)
+        if not await limiter.acquire():
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": f"Too many {name} requests; try again shortly"},
+                headers={"Retry-After": RETRY_AFTER_SECONDS},
+            )
+            return await response(scope, receive, send)
+
+        start = time.perf_counter()
+        # time to the response head: a long download is not a slow request
+        latency, status = None, 500
+
+        async def record_start(message: Message) -> None:
+            nonlocal latency, status
+            if message["type"] == "http.response.start":
+                latency, status = time.perf_counter() - start, message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, record_start)
+        finally:
+            if latency is None:
+                latency = time.perf_counter() - start
+            limiter.release(latency, overloaded=status == 503)
+
+    def _gauges(self) -> list[str]:
+        samples = {
+            "concurrency_limit": lambda limiter: limiter.limit,
+            "concurrency_inflight": lambda limiter: limiter.inflight,
+            "concurrency_queued": lambda limiter: limiter.queued,
+        }
+        lines: list[str] = []
+        for gauge, value in samples.items():
+            lines += metrics.gauge_lines(
+                gauge,
+                gauge.replace("_", " "),
+                [({"budget": n}, value(lim)) for n, lim in self.limiters.items()],
+            )
+        return lines
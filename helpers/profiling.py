@@ -0,0 +1,202 @@
+"""
+On-demand sampling profiles of single requests.
+
+Installed only when PROFILE_SECRET is set. A request is profiled when it
+carries `X-Profile: <secret>` (or `?_profile=<secret>`, stripped before
+routing), or at random with probability PROFILE_SAMPLE_RATE when its route
+is one of PROFILE_ROUTES (route names, i.e. endpoint function names such as
+get_books_router; empty means any). The route is matched before sampling
+starts, so other routes never pay for it.
+
+While a profiled request runs, a sampler thread reads the event loop
+thread's stack every PROFILE_INTERVAL_MS and keeps the samples taken while
+that request's task is the one running. The result is on-CPU time of that
+request only, even with others in flight; time waiting on Postgres or Redis
+is not in it (see Server-Timing for that). Output is collapsed stacks
+(`frame;frame;frame count` per line), which flamegraph.pl and speedscope
+read directly. It goes to a file in PROFILE_DIR when set, otherwise onto
+the Redis list PROFILE_REDIS_KEY (newest first, PROFILE_REDIS_KEEP kept) as
+JSON with the request's method, path, status and duration.
+"""
+
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from asyncio import current_task
+from collections import Counter
+from pathlib import Path
+from types import CodeType
+from urllib.parse import parse_qsl, urlencode
+
+from redis.exceptions import RedisError
+from starlette.datastructures import MutableHeaders
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from cache import init_redis
+
+PROFILE_SECRET = os.getenv("PROFILE_SECRET", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_ROUTES = frozenset(filter(None, os.getenv("PROFILE_ROUTES", "").split(",")))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "")
+PROFILE_REDIS_KEY = "profiles"
+PROFILE_REDIS_KEEP = int(os.getenv("PROFILE_REDIS_KEEP", "100"))
+PROFILE_QUERY_FLAG = "_profile"
+
+logger = logging.getLogger(__name__)
+
+_labels: dict[CodeType, str] = {}
+
+
+def _label(code: CodeType) -> str:
+    label = _labels.get(code)
+    if label is None:
+        path = Path(code.co_filename)
+        where = "/".join(path.parts[-2:])
+        label = _labels[code] = f"{code.co_name} ({where}:{code.co_firstlineno})"
+    return label
+
+
+class StackSampler(threading.Thread):
+    """Samples the calling thread's stack while the calling task is running."""
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.task = current_task()
+        self.loop = self.task.get_loop()
+        self.thread_id = threading.get_ident()
+        self.interval = interval_ms / 1000
+        self.stacks: Counter[str] = Counter()
+        self._done = threading.Event()
+
+    def run(self) -> None:
+        while not self._done.wait(self.interval):
+            if current_task(self.loop) is not self.task:
+                continue  # another request's turn, or the loop is idle
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self) -> Counter[str]:
+        self._done.set()
+        self.join()
+        return self.stacks
+
+
+def collapsed(stacks: Counter[str]) -> str:
+    return "".join(f"{stack} {n}\n" for stack, n in stacks.most_common())
+
+
+class ProfilingMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        secret: str = PROFILE_SECRET,
+        sample_rate: float = PROFILE_SAMPLE_RATE,
+        routes: frozenset[str] = PROFILE_ROUTES,
+        directory: str = PROFILE_DIR,
+        app_routes: list[BaseRoute] | None = None,
+    ):
+        """`app_routes` is the app's route list (app.routes), to match `routes`."""
+        self.app = app
+        self.secret = secret.encode()
+        self.sample_rate = sample_rate
+        self.routes = routes
+        self.app_routes = app_routes if app_routes is not None else []
+        self.directory = Path(directory) if directory else None
+
+    def _requested(self, scope: Scope) -> bool:
+        """Whether the request asks for a profile; strips the query flag."""
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                return hmac.compare_digest(value, self.secret)
+        if PROFILE_QUERY_FLAG.encode() not in scope["query_string"]:
+            return False
+        params = parse_qsl(scope["query_string"].decode("latin-1"), True)
+        flags = [v for k, v in params if k == PROFILE_QUERY_FLAG]
+        scope["query_string"] = urlencode(
+            [(k, v) for k, v in params if k != PROFILE_QUERY_FLAG]
+        ).encode("latin-1")
+        return any(hmac.compare_digest(f.encode(), self.secret) for f in flags)
+
+    def _sampled(self, scope: Scope) -> bool:
+        if random.random() >= self.sample_rate:
+            return False
+        if not self.routes:
+            return True
+        return any(
+            route.matches(scope)[0] is Match.FULL
+            for route in self.app_routes
+            if getattr(route, "name", None) in self.routes
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        requested = self._requested(scope)
+        if not (requested or self._sampled(scope)):
+            return await self.app(scope, receive, send)
+
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        status = 500
+
+        async def send_with_id(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if requested:
+                    MutableHeaders(scope=message)["X-Profile-Id"] = profile_id
+            await send(message)
+
+        sampler = StackSampler()
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            stacks = sampler.stop()
+            await self._save(
+                profile_id,
+                scope,
+                status,
+                time.perf_counter() - start,
+                collapsed(stacks),
+            )
+
+    async def _save(
+        self, profile_id: str, scope: Scope, status: int, seconds: float, text: str
+    ) -> None:
+        if self.directory is not None:
+            slug = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+            path = self.directory / f"{profile_id}-{scope['method']}-{slug}.collapsed"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(text)
+            return
+        record = {
+            "id": profile_id,
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": status,
+            "duration_ms": round(seconds * 1000, 2),
+            "collapsed": text,
+        }
+        try:
+            r = await init_redis()
+            async with r.pipeline(transaction=False) as pipe:
+                pipe.lpush(PROFILE_REDIS_KEY, json.dumps(record))
+                pipe.ltrim(PROFILE_REDIS_KEY, 0, PROFILE_REDIS_KEEP - 1)
+                await pipe.execute()
+        except RedisError as exc:
+            logger.warning("Saving profile %s failed: %s", profile_id, exc)
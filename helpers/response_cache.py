@@ -0,0 +1,151 @@
+"""
+Response cache in front of routing.
+
+A cache hit on an opted-in GET route is answered here, before FastAPI
+resolves dependencies, parses the query or opens a session. Routes opt in
+with a CachedRoute, declared next to them in their router:
+
+- entity routes (`/books/{book_id}`) are keyed by the entry their handler
+  already caches (cache.make_book_key, ...), so the existing invalidation
+  hooks retire them; the handler fills the entry on a miss;
+- list routes name the cache version their writers bump (`books:list`) and
+  are keyed by that version plus the normalized query string
+  (cache.normalize_params). The handler's own key includes its defaults, so
+  on a miss the middleware stores the response it passes through, provided
+  the handler cached it too (it set an ETag).
+
+Vary policy: bodies vary only by Accept-Encoding, which selects the stored
+variant (helpers.conditional). Requests with credentials (Authorization,
+Cookie) or `Cache-Control: no-cache` bypass the lookup, and an entity route
+is only served for a request without a query string.
+"""
+
+import logging
+import re
+from dataclasses import dataclass
+from typing import Callable, Iterable
+from urllib.parse import parse_qsl
+
+from redis.exceptions import RedisError
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from cache import (
+    cache_list_with_params,
+    get_cache_version,
+    make_list_key_with_payload,
+)
+from helpers.conditional import MISS_STATE, serve_cached
+
+logger = logging.getLogger(__name__)
+
+BYPASS_HEADERS = ("authorization", "cookie")
+
+
+@dataclass(frozen=True)
+class CachedRoute:
+    """
+    An opted-in GET route. `path` is the full route path; its `{params}` are
+    integer ids passed to `key`. List routes set `version` instead.
+    """
+
+    path: str
+    key: Callable[..., str] | None = None
+    version: str | None = None
+
+    def pattern(self) -> re.Pattern:
+        return re.compile(
+            "^" + re.sub(r"\\{(\w+)\\}", r"(?P<\1>[0-9]+)", re.escape(self.path)) + "$"
+        )
+
+
+def query_params(query_string: bytes) -> dict:
+    """Query as a dict: blank values dropped, repeated keys kept in order."""
+    params: dict = {}
+    for name, value in parse_qsl(query_string.decode("latin-1")):
+        if name in params:
+            previous = params[name]
+            params[name] = (
+                [*previous, value] if isinstance(previous, list) else [previous, value]
+            )
+        else:
+            params[name] = value
+    return params
+
+
+class ResponseCacheMiddleware:
+    def __init__(self, app: ASGIApp, routes: Iterable[CachedRoute] = ()):
+        self.app = app
+        self.routes = [(route, route.pattern()) for route in routes]
+
+    def _match(self, path: str) -> tuple[CachedRoute, dict] | None:
+        for route, pattern in self.routes:
+            if m := pattern.match(path):
+                return route, {k: int(v) for k, v in m.groupdict().items()}
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            return await self.app(scope, receive, send)
+        match = self._match(scope["path"])
+        if match is None:
+            return await self.app(scope, receive, send)
+        route, path_params = match
+        request = Request(scope)
+        if any(h in request.headers for h in BYPASS_HEADERS) or "no-cache" in (
+            request.headers.get("cache-control", "")
+        ):
+            return await self.app(scope, receive, send)
+
+        payload = None
+        try:
+            if route.version is None:
+                if scope["query_string"]:
+                    return await self.app(scope, receive, send)
+                key = route.key(**path_params)
+            else:
+                version = await get_cache_version(route.version)
+                key, payload = make_list_key_with_payload(
+                    f"{route.version}:http",
+                    query_params(scope["query_string"]),
+                    version,
+                )
+            response = await serve_cached(request, key, payload)
+        except RedisError as exc:
+            logger.warning("Response cache lookup failed: %s", exc)
+            return await self.app(scope, receive, send)
+        if response is not None:
+            return await response(scope, receive, send)
+
+        if payload is None:
+            # the handler owns this entry; spare it a second lookup
+            scope.setdefault("state", {})[MISS_STATE] = key
+            return await self.app(scope, receive, send)
+        await self._fill(scope, receive, send, key, payload)
+
+    async def _fill(
+        self, scope: Scope, receive: Receive, send: Send, key: str, payload: str
+    ) -> None:
+        """Pass the request on and store the response body under `key`."""
+        start: Message | None = None
+        chunks: list[bytes] = []
+
+        async def capture(message: Message) -> None:
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, receive, capture)
+        if start is None or start["status"] != 200:
+            return
+        headers = Headers(raw=start["headers"])
+        if "etag" not in headers or "content-encoding" in headers:
+            return  # the handler chose not to cache it, or it is not plain JSON
+        try:
+            await cache_list_with_params(key, b"".join(chunks), payload)
+        except RedisError as exc:
+            logger.warning("Response cache fill failed: %s", exc)
@@ -0,0 +1,45 @@
+"""
+JSON rendering with pydantic-core, once per response.
+
+Handlers validate their result against the response type and render it in a
+single step (`dump`), then return those bytes (`json_response`). FastAPI
+skips its own validation and encoding for a returned Response, and the same
+bytes are what the cache stores (see cache.set_entry), so a miss renders a
+body once and a hit not at all. `response_model` stays on the routes for the
+OpenAPI schema.
+"""
+
+from functools import lru_cache
+from typing import Any
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from pydantic_core import to_json
+
+from helpers.timing import timed
+
+
+class FastJSONResponse(JSONResponse):
+    """App default: pydantic-core's encoder instead of json.dumps."""
+
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
+
+
+@lru_cache(maxsize=None)
+def adapter(tp: Any) -> TypeAdapter:
+    return TypeAdapter(tp)
+
+
+def dump(tp: Any, value: Any) -> bytes:
+    """Validate `value` (ORM objects, rows or dicts) as `tp`, rendered as JSON."""
+    ta = adapter(tp)
+    with timed("validate"):
+        validated = ta.validate_python(value, from_attributes=True)
+    with timed("serialize"):
+        return ta.dump_json(validated)
+
+
+def json_response(body: bytes, **kwargs: Any) -> Response:
+    return Response(content=body, media_type="application/json", **kwargs)
@@ -0,0 +1,250 @@
+"""
+Slow query log for the API's (async) engine.
+
+Enabled with SLOW_QUERY_MS=<threshold>. Every statement that takes at least
+that long is recorded with its normalized SQL (literals and placeholder lists
+folded, so one query shape has one fingerprint), the shapes of its bound
+parameters (types and sizes, never values), and the route, endpoint and
+query string of the request that sent it (SlowQueryMiddleware).
+
+A sample of offending SELECTs (SLOW_QUERY_EXPLAIN_RATE, and at most once per
+fingerprint every SLOW_QUERY_EXPLAIN_EVERY_S) is run again under
+`EXPLAIN (ANALYZE, BUFFERS)`, with the same parameters, on a separate
+connection in a rolled back transaction limited by
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS. That happens in a background task, after the
+request's own statement returned.
+
+Records go to the capped Redis stream SLOW_QUERY_STREAM (approximately
+SLOW_QUERY_STREAM_MAXLEN entries), or as JSON lines to SLOW_QUERY_FILE when
+set.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import time
+from contextvars import ContextVar
+from typing import Any
+
+from redis.exceptions import RedisError
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from cache import init_redis
+from database import get_async_engine
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", "0.1"))
+SLOW_QUERY_EXPLAIN_EVERY_S = float(os.getenv("SLOW_QUERY_EXPLAIN_EVERY_S", "60"))
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", "5000"))
+SLOW_QUERY_STREAM = os.getenv("SLOW_QUERY_STREAM", "slow_queries")
+SLOW_QUERY_STREAM_MAXLEN = int(os.getenv("SLOW_QUERY_STREAM_MAXLEN", "1000"))
+SLOW_QUERY_FILE = os.getenv("SLOW_QUERY_FILE", "")
+
+# execution option that keeps a connection's statements out of the log
+UNLOGGED = "slow_query_log"
+
+logger = logging.getLogger(__name__)
+
+_scope: ContextVar[Scope | None] = ContextVar("slow_query_scope", default=None)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"\$\d+")
+_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_SPACE = re.compile(r"\s+")
+_WRITE = re.compile(r"\b(?:INSERT|UPDATE|DELETE|MERGE)\b", re.IGNORECASE)
+
+
+def normalize(statement: str) -> str:
+    """SQL with literals and placeholders as `?` and `IN` lists folded."""
+    sql = _STRING.sub("?", statement)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _LIST.sub("?, ...", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+def _shape(value: Any) -> str:
+    name = type(value).__name__
+    if isinstance(value, (str, bytes, list, tuple, dict, set)):
+        return f"{name}[{len(value)}]"
+    return name
+
+
+def parameter_shapes(parameters: Any, executemany: bool) -> list:
+    if executemany:
+        rows = list(parameters or ())
+        return [f"{len(rows)} rows", *parameter_shapes(rows[0] if rows else (), False)]
+    if isinstance(parameters, dict):
+        return [f"{k}: {_shape(v)}" for k, v in parameters.items()]
+    return [_shape(v) for v in parameters or ()]
+
+
+def _explainable(statement: str) -> bool:
+    # ANALYZE runs the statement: never writes
+    head = statement.lstrip()[:6].upper()
+    if head == "SELECT":
+        return True
+    # a WITH may wrap data-modifying CTEs
+    return head.startswith("WITH") and not _WRITE.search(_STRING.sub("?", statement))
+
+
+class SlowQueryLog:
+    def __init__(
+        self,
+        threshold_ms: float = SLOW_QUERY_MS,
+        explain_rate: float = SLOW_QUERY_EXPLAIN_RATE,
+        explain_every_s: float = SLOW_QUERY_EXPLAIN_EVERY_S,
+        path: str = SLOW_QUERY_FILE,
+    ):
+        self.threshold = threshold_ms / 1000
+        self.explain_rate = explain_rate
+        self.explain_every = explain_every_s
+        self.path = path
+        self.engine: AsyncEngine | None = None
+        self._explained: dict[str, float] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def install(self, engine: AsyncEngine) -> None:
+        self.engine = engine
+        for name, fn in self._listeners():
+            if not event.contains(engine.sync_engine, name, fn):
+                event.listen(engine.sync_engine, name, fn)
+
+    def uninstall(self) -> None:
+        for name, fn in self._listeners():
+            if event.contains(self.engine.sync_engine, name, fn):
+                event.remove(self.engine.sync_engine, name, fn)
+
+    def _listeners(self):
+        return (
+            ("before_cursor_execute", self._before),
+            ("after_cursor_execute", self._after),
+        )
+
+    def _before(self, conn, cursor, statement, parameters, context, many):
+        if context is not None and context.execution_options.get(UNLOGGED, True):
+            context._slow_query_start = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, many):
+        start = getattr(context, "_slow_query_start", None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        if elapsed < self.threshold:
+            return
+        sql = normalize(statement)
+        fingerprint = hashlib.sha1(sql.encode()).hexdigest()[:12]
+        scope = _scope.get() or {}
+        route = scope.get("route")
+        endpoint = scope.get("endpoint")
+        entry = {
+            "ts": round(time.time(), 3),
+            "duration_ms": round(elapsed * 1000, 2),
+            "fingerprint": fingerprint,
+            "sql": sql,
+            "params": parameter_shapes(parameters, many),
+            "route": getattr(route, "path", scope.get("path")),
+            "endpoint": getattr(endpoint, "__name__", None),
+            "query": scope.get("query_string", b"").decode("latin-1"),
+        }
+        explain = (
+            not many and _explainable(statement) and self._should_explain(fingerprint)
+        )
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # a sync caller outside the app's loop
+        task = loop.create_task(
+            self._capture(entry, statement if explain else None, parameters)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _should_explain(self, fingerprint: str) -> bool:
+        if random.random() >= self.explain_rate:
+            return False
+        now = time.monotonic()
+        last = self._explained.get(fingerprint)
+        if last is not None and now - last < self.explain_every:
+            return False
+        if len(self._explained) > 1024:
+            self._explained.clear()
+        self._explained[fingerprint] = now
+        return True
+
+    async def _capture(self, entry: dict, statement: str | None, parameters) -> None:
+        if statement is not None:
+            entry["plan"] = await self._explain(statement, parameters)
+        await self._write(entry)
+
+    async def _explain(self, statement: str, parameters) -> str:
+        try:
+            async with self.engine.connect() as conn:
+                await conn.execution_options(**{UNLOGGED: False})
+                async with conn.begin() as tx:
+                    await conn.exec_driver_sql(
+                        f"SET LOCAL statement_timeout = {SLOW_QUERY_EXPLAIN_TIMEOUT_MS}"
+                    )
+                    result = await conn.exec_driver_sql(
+                        f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters
+                    )
+                    plan = "\n".join(row[0] for row in result)
+                    await tx.rollback()
+                    return plan
+        except SQLAlchemyError as exc:
+            return f"EXPLAIN failed: {exc.__class__.__name__}: {exc}"
+
+    async def _write(self, entry: dict) -> None:
+        if self.path:
+            line = json.dumps(entry) + "\n"
+            await asyncio.to_thread(self._append, line)
+            return
+        fields = {
+            k: v if isinstance(v, str) else json.dumps(v) for k, v in entry.items()
+        }
+        try:
+            r = await init_redis()
+            await r.xadd(
+                SLOW_QUERY_STREAM,
+                fields,
+                maxlen=SLOW_QUERY_STREAM_MAXLEN,
+                approximate=True,
+            )
+        except RedisError as exc:
+            logger.warning("Recording slow query %s failed: %s", entry["sql"], exc)
+
+    def _append(self, line: str) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    async def drain(self) -> None:
+        """Wait for pending EXPLAINs and writes."""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+class SlowQueryMiddleware:
+    """Tells the log which request (route, endpoint, query) sent a statement."""
+
+    def __init__(self, app: ASGIApp, log: SlowQueryLog | None = None):
+        self.app = app
+        self.log = log or SlowQueryLog()
+        if self.log.engine is None:
+            self.log.install(get_async_engine())
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = _scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _scope.reset(token)
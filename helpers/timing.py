@@ -0,0 +1,159 @@
+"""
+Per-request time breakdown: Redis, Postgres, pool waits, validation,
+serialization and compression.
+
+Enabled with SERVER_TIMING=1. ServerTimingMiddleware then gives each request
+its own accumulator in a ContextVar, so concurrent requests never mix their
+numbers, and the hooks below add to it:
+
+- Redis: every command and pipeline of the app's clients (cache.TimedRedis);
+- Postgres: cursor executes, through SQLAlchemy engine events;
+- db_pool: connection checkouts (database._TimedCheckout);
+- validate, serialize: helpers.responses.dump; compress: helpers.conditional.
+
+Totals go out as a Server-Timing header and as fields of one access-log
+record per request. Disabled, nothing is installed except the Redis client
+class, and `timed` costs one ContextVar lookup.
+"""
+
+import logging
+import os
+import time
+from contextlib import AbstractContextManager, nullcontext
+from contextvars import ContextVar
+
+from redis import asyncio as aioredis
+from sqlalchemy import Engine, event
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+SERVER_TIMING = os.getenv("SERVER_TIMING", "").lower() in ("1", "true", "yes", "on")
+
+logger = logging.getLogger("access")
+
+# name -> [total seconds, count] for the current request, None outside one
+_timings: ContextVar[dict[str, list] | None] = ContextVar("timings", default=None)
+
+
+def record(name: str, seconds: float) -> None:
+    timings = _timings.get()
+    if timings is not None:
+        entry = timings.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        record(self.name, time.perf_counter() - self.start)
+
+
+_NOT_TIMED = nullcontext()
+
+
+def timed(name: str) -> AbstractContextManager:
+    """`with timed("redis"): ...` adds the block's duration to the request's."""
+    return _NOT_TIMED if _timings.get() is None else _Timer(name)
+
+
+class TimedPipeline(aioredis.client.Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        with timed("redis"):
+            return await super().execute(raise_on_error)
+
+
+class TimedRedis(aioredis.Redis):
+    async def execute_command(self, *args, **options):
+        with timed("redis"):
+            return await super().execute_command(*args, **options)
+
+    def pipeline(
+        self, transaction: bool = True, shard_hint: str | None = None
+    ) -> TimedPipeline:
+        return TimedPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, many):
+    if context is not None and _timings.get() is not None:
+        context._timing_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, many):
+    start = getattr(context, "_timing_start", None)
+    if start is not None:
+        record("db", time.perf_counter() - start)
+
+
+def header_value(timings: dict[str, list], total: float) -> str:
+    parts = [
+        f'{name};dur={seconds * 1000:.2f};desc="{count}x"'
+        for name, (seconds, count) in timings.items()
+    ]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+class ServerTimingMiddleware:
+    """Outermost middleware: owns the request's accumulator and reports it."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        # statements on every engine, including ones created later
+        for name, fn in (
+            ("before_cursor_execute", _before_cursor_execute),
+            ("after_cursor_execute", _after_cursor_execute),
+        ):
+            if not event.contains(Engine, name, fn):
+                event.listen(Engine, name, fn)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timings: dict[str, list] = {}
+        token = _timings.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    header_value(timings, time.perf_counter() - start),
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
+            total = time.perf_counter() - start
+            logger.info(
+                "%s %s %s %.1fms",
+                scope["method"],
+                scope["path"],
+                status,
+                total * 1000,
+                extra={
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status,
+                    "duration_ms": round(total * 1000, 2),
+                    **{
+                        f"{name}_ms": round(seconds * 1000, 2)
+                        for name, (seconds, _) in timings.items()
+                    },
+                },
+            )
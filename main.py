@@ -1,25 +1,75 @@
+import asyncio
+import logging
+import os
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import DBAPIError
 
-from cache import close_redis, init_redis
-from routers import author, book, review
+from cache import close_redis, init_redis, prewarm_redis
+from database import (
+    AsyncSessionLocal,
+    get_async_engine,
+    is_statement_timeout,
+    prewarm_pool,
+)
+from helpers.encoding import COMPRESS_MIN_BYTES, GZIP_LEVEL, GZipMiddleware
+from helpers.limiter import ConcurrencyLimitMiddleware
+from helpers.profiling import PROFILE_SECRET, ProfilingMiddleware
+from helpers.response_cache import ResponseCacheMiddleware
+from helpers.slow_queries import SLOW_QUERY_MS, SlowQueryMiddleware
+from helpers.timing import SERVER_TIMING, ServerTimingMiddleware
+from helpers.responses import FastJSONResponse
+from routers import author, book, metrics, review, stats
+from search.inverted import SEARCH_BACKEND, run_index
 
 # from database import Base, engine
 # Base.metadata.create_all(bind=engine) #for prototyping
 
+logger = logging.getLogger(__name__)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     app.state.redis = await init_redis()
+    try:
+        await prewarm_redis(
+            app.state.redis, int(os.getenv("REDIS_PREWARM_CONNECTIONS", "2"))
+        )
+    except Exception as exc:  # a cold cache must not block startup
+        logger.warning("Redis prewarm failed: %s", exc)
+    await prewarm_pool(int(os.getenv("DB_PREWARM_CONNECTIONS", "2")))
+    indexer = None
+    if SEARCH_BACKEND == "memory":
+        indexer = asyncio.create_task(
+            run_index(
+                lambda: AsyncSessionLocal(bind=get_async_engine()), app.state.redis
+            )
+        )
     try:
         yield
     finally:
+        if indexer is not None:
+            indexer.cancel()
         await close_redis()
+        await get_async_engine().dispose()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 
-app = FastAPI(lifespan=lifespan)
+@app.exception_handler(DBAPIError)
+async def statement_timeout_handler(request: Request, exc: DBAPIError):
+    if not is_statement_timeout(exc):
+        raise exc
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Query took too long; try a more specific search"},
+        headers={"Retry-After": "1"},
+    )
+
 
 origins = [
     "http://127.0.0.1:5500",
@@ -28,6 +78,15 @@ origins = [
     "http://localhost:8000",
 ]
 
+# tags slow statements with the request that sent them; off by default
+if SLOW_QUERY_MS:
+    app.add_middleware(SlowQueryMiddleware)
+# sheds what reaches the handlers (and the database) when they slow
+app.add_middleware(ConcurrencyLimitMiddleware)
+# cache hits still get CORS headers and skip the limiter, routing and handlers
+app.add_middleware(
+    ResponseCacheMiddleware, routes=[*book.CACHED_ROUTES, *author.CACHED_ROUTES]
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -35,7 +94,21 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# responses computed on this request, tagged with a gzip ETag; cache hits
+# arrive already encoded and pass through untouched (Content-Encoding set)
+app.add_middleware(
+    GZipMiddleware, minimum_size=COMPRESS_MIN_BYTES, compresslevel=GZIP_LEVEL
+)
+# on request, or sampled; strips its query flag before the response cache
+# sees it. Not installed without a secret
+if PROFILE_SECRET:
+    app.add_middleware(ProfilingMiddleware, app_routes=app.routes)
+# outermost, so the breakdown covers every layer; off by default
+if SERVER_TIMING:
+    app.add_middleware(ServerTimingMiddleware)
 
 app.include_router(author.router)
 app.include_router(book.router)
 app.include_router(review.router)
+app.include_router(metrics.router)
+app.include_router(stats.router)
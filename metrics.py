@@ -0,0 +1,90 @@
+"""
+Minimal in-process metrics rendered in the Prometheus text format.
+
+Histograms are recorded on the hot path; gauges are read lazily at scrape time
+through collector callbacks, so nothing is computed between scrapes.
+"""
+
+import bisect
+import threading
+from typing import Callable, Iterable
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+    return "{" + inner + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a fixed label set per child."""
+
+    def __init__(
+        self, name: str, help: str, buckets: Iterable[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._children: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                # [bucket counts..., +Inf count, sum]
+                child = self._children[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            child[idx] += 1
+            child[-1] += value
+
+    def collect(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            children = {k: list(v) for k, v in self._children.items()}
+        for key, child in children.items():
+            labels = dict(key)
+            running = 0
+            for bound, count in zip(self.buckets, child):
+                running += count
+                bucket = _labels({**labels, "le": repr(bound)})
+                lines.append(f"{self.name}_bucket{bucket} {running}")
+            running += child[len(self.buckets)]
+            lines.append(
+                f"{self.name}_bucket{_labels({**labels, 'le': '+Inf'})} {running}"
+            )
+            lines.append(f"{self.name}_sum{_labels(labels)} {child[-1]}")
+            lines.append(f"{self.name}_count{_labels(labels)} {running}")
+        return lines
+
+
+# collectors return already formatted exposition lines
+_collectors: list[Callable[[], list[str]]] = []
+
+
+def register(collector: Callable[[], list[str]]) -> None:
+    _collectors.append(collector)
+
+
+def register_histogram(histogram: Histogram) -> Histogram:
+    register(histogram.collect)
+    return histogram
+
+
+def gauge_lines(
+    name: str, help: str, samples: Iterable[tuple[dict, float]]
+) -> list[str]:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+    lines += [f"{name}{_labels(labels)} {value}" for labels, value in samples]
+    return lines
+
+
+def render() -> str:
+    lines: list[str] = []
+    for collector in _collectors:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,76 @@
+"""stored normalized author name/email with trigram GIN indexes
+
+Adding stored generated columns rewrites the whole `authors` table while
+holding an ACCESS EXCLUSIVE lock: reads and writes of authors (and author
+joins of book queries) wait for as long as the rewrite takes, which grows
+with the table. Schedule it for a quiet window on large catalogs. The
+trigram indexes are then built CONCURRENTLY outside the migration
+transaction, as in 0003; a failed build leaves an INVALID index behind, drop
+it and rerun the upgrade.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (name, column)
+INDEXES = (
+    ("ix_authors_name_norm_trgm", "name_norm"),
+    ("ix_authors_email_norm_trgm", "email_norm"),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "authors",
+        sa.Column(
+            "name_norm",
+            sa.Text(),
+            sa.Computed("immutable_unaccent(name)", persisted=True),
+            nullable=True,
+        ),
+    )
+    op.add_column(
+        "authors",
+        sa.Column(
+            "email_norm",
+            sa.Text(),
+            sa.Computed("immutable_unaccent(email)", persisted=True),
+            nullable=True,
+        ),
+    )
+    with op.get_context().autocommit_block():
+        for name, column in INDEXES:
+            op.create_index(
+                name,
+                "authors",
+                [column],
+                postgresql_using="gin",
+                postgresql_ops={column: "gin_trgm_ops"},
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, _ in reversed(INDEXES):
+            op.drop_index(
+                name, table_name="authors", postgresql_concurrently=True, if_exists=True
+            )
+    op.drop_column("authors", "email_norm")
+    op.drop_column("authors", "name_norm")
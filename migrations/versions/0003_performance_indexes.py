@@ -0,0 +1,68 @@
+"""performance index pack for search, filters and author/book lookups
+
+Indexes are built CONCURRENTLY outside the migration transaction so writes keep
+flowing on large tables. If a concurrent build fails it leaves an INVALID
+index behind; drop it and rerun the upgrade.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (name, table, columns, kwargs)
+INDEXES = (
+    (
+        "ix_books_search_tsv",
+        "books",
+        ["search_tsv"],
+        {"postgresql_using": "gin"},
+    ),
+    (
+        "ix_books_title_trgm",
+        "books",
+        ["title"],
+        {"postgresql_using": "gin", "postgresql_ops": {"title": "gin_trgm_ops"}},
+    ),
+    (
+        "ix_authors_name_trgm",
+        "authors",
+        ["name"],
+        {"postgresql_using": "gin", "postgresql_ops": {"name": "gin_trgm_ops"}},
+    ),
+    ("ix_authors_email", "authors", ["email"], {}),
+    ("ix_author_book_relation_book_id", "author_book_relation", ["book_id"], {}),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, columns, kwargs in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+                **kwargs,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(
+                name, table_name=table, postgresql_concurrently=True, if_exists=True
+            )
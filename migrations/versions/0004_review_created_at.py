@@ -0,0 +1,63 @@
+"""reviews.created_at for time-windowed leaderboards
+
+Existing reviews have no creation time. They are backfilled to the epoch,
+so they count on the all-time board but fall outside every time window;
+stamping them with the migration time instead would put the whole history
+on the 7d and 30d boards. The column is added with that constant default
+and the default then switched to `now()` for new rows. Both steps only
+change the catalog, neither rewrites `reviews`. The index is built
+CONCURRENTLY outside the migration transaction.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# creation time of the reviews that predate the column
+EPOCH = "1970-01-01 00:00:00+00"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "reviews",
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text(f"'{EPOCH}'"),
+            nullable=False,
+        ),
+    )
+    op.alter_column("reviews", "created_at", server_default=sa.text("now()"))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_reviews_created_at",
+            "reviews",
+            ["created_at"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_reviews_created_at",
+            table_name="reviews",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+    op.drop_column("reviews", "created_at")
@@ -1,7 +1,10 @@
+from datetime import datetime
 from sqlalchemy.dialects.postgresql import TSVECTOR
 from database import Base
 from sqlalchemy import (
     Computed,
+    DateTime,
+    Index,
     Table,
     Column,
     String,
@@ -10,6 +13,7 @@ from sqlalchemy import (
     ForeignKey,
     CheckConstraint,
     UniqueConstraint,
+    func,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -20,6 +24,13 @@ class Author(Base):
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String(30), nullable=False)
     email: Mapped[str | None] = mapped_column(String(50))
+    # unaccented copies for trigram search, maintained by Postgres
+    name_norm: Mapped[str | None] = mapped_column(
+        Text, Computed("immutable_unaccent(name)", persisted=True)
+    )
+    email_norm: Mapped[str | None] = mapped_column(
+        Text, Computed("immutable_unaccent(email)", persisted=True)
+    )
 
     # many-to-many: authors → books
     books: Mapped[list["Book"]] = relationship(
@@ -32,6 +43,26 @@ class Author(Base):
             "email ~* '^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}$'",
             name="ck_authors_email_format",
         ),
+        Index(
+            "ix_authors_name_norm_trgm",
+            "name_norm",
+            postgresql_using="gin",
+            postgresql_ops={"name_norm": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_authors_email_norm_trgm",
+            "email_norm",
+            postgresql_using="gin",
+            postgresql_ops={"email_norm": "gin_trgm_ops"},
+        ),
+        # book search matches raw names; trigram GIN also serves `name = ...`
+        Index(
+            "ix_authors_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+        Index("ix_authors_email", "email"),
     )
 
 
@@ -65,6 +96,14 @@ class Book(Base):
             "book_isbn IS NULL OR char_length(book_isbn) IN (10, 13)",
             name="ck_book_isbn_length",
         ),
+        Index("ix_books_search_tsv", "search_tsv", postgresql_using="gin"),
+        # trigram GIN also serves the exact `title = ...` filter
+        Index(
+            "ix_books_title_trgm",
+            "title",
+            postgresql_using="gin",
+            postgresql_ops={"title": "gin_trgm_ops"},
+        ),
     )
 
     # many-to-many: books → authors
@@ -84,6 +123,9 @@ class Review(Base):
     reviewer_name: Mapped[str] = mapped_column(String(50), nullable=False)
     rating: Mapped[int] = mapped_column(Integer, nullable=False)
     comment: Mapped[str | None] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False, index=True
+    )
 
     book: Mapped["Book"] = relationship("Book", back_populates="reviews")
 
@@ -98,4 +140,6 @@ author_book_relation = Table(
     Base.metadata,
     Column("author_id", ForeignKey("authors.id", ondelete="CASCADE"), primary_key=True),
     Column("book_id", ForeignKey("books.id", ondelete="CASCADE"), primary_key=True),
+    # the PK leads with author_id; book -> authors lookups need their own index
+    Index("ix_author_book_relation_book_id", "book_id"),
 )
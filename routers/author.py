@@ -1,122 +1,252 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import func, or_, select
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import (
+    ColumnElement,
+    Select,
+    and_,
+    delete,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    update,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
-from models import Author, Book
-from database import get_async_db
-from schemas.author import AuthorCreate, AuthorRead, AuthorUpdate
+from models import Author, Book, author_book_relation
+from database import get_async_db, get_async_db_with_timeout
+from dependencies import search_term
+from schemas.author import (
+    AuthorCreate,
+    AuthorRead,
+    AuthorSuggestion,
+    AuthorUpdate,
+    PaginatedAuthors,
+)
 from schemas.shared import BookBase
+from helpers.conditional import serve_cached, set_etag
+from helpers.eager import apply_response_shape
+from helpers.response_cache import CachedRoute
+from helpers.responses import dump, json_response
+from helpers.helpers import decode_cursor, encode_cursor
+from search.inverted import publish_book_changes
+from search.suggest import index_entries, remove_entries, set_popularity, suggest
 from cache import (
     Redis,
     bump_cache_version,
     cache_author,
     cache_list,
     cache_list_with_params,
-    get_author,
-    get_list,
-    get_list_with_params,
     get_redis,
     invalidate_author,
     make_author_books_key,
+    make_author_key,
     make_authors_list_key,
 )
 
 router = APIRouter(prefix="/authors", tags=["authors"])
+# cache hits on these are answered by helpers.response_cache, before routing
+CACHED_ROUTES = [
+    CachedRoute("/authors/", version="authors:list"),
+    CachedRoute("/authors/{author_id}", key=make_author_key),
+]
 
 
-@router.get("/", response_model=List[AuthorRead])
-async def get_authors_router(
-    q: str | None = Query(None, description="Full-text query"),
-    name: str | None = Query(None, description="Exact name filter"),
-    email: str | None = Query(None, description="Exact email filter"),
-    limit: int = Query(20, ge=1, le=100),
-    offset: int = Query(0),
-    db: AsyncSession = Depends(get_async_db),
-    r: Redis = Depends(get_redis),
-):
-    params = {"q": q, "name": name, "email": email, "limit": limit, "offset": offset}
-    key, payload = await make_authors_list_key(params, r=r)
-    cached = await get_list_with_params(key, payload, r)
-    if cached is not None:
-        return cached
-    stat = select(Author).options(selectinload(Author.books))
+def _authors_search_stmt(
+    q: str | None = None, name: str | None = None, email: str | None = None
+) -> tuple[Select, ColumnElement | None]:
+    """Author list query and its score expression (None without q)."""
+    stat = apply_response_shape(select(Author), AuthorRead)
 
     if name:
         stat = stat.where(Author.name == name)
     if email:
         stat = stat.where(Author.email == email)
 
+    total_score = None
     order_exp = []
 
     if q:
+        # name_norm/email_norm are stored immutable_unaccent() copies with
+        # trigram GIN indexes, so `%` is answered from the index
         norm_q = func.immutable_unaccent(q)
-        name_sim = func.similarity(func.immutable_unaccent(Author.name), norm_q)
-        email_sim = func.similarity(
-            func.coalesce(func.immutable_unaccent(Author.email), ""), norm_q
-        )
+        name_sim = func.similarity(Author.name_norm, norm_q)
+        email_sim = func.similarity(func.coalesce(Author.email_norm, ""), norm_q)
         total_score = 0.7 * name_sim + 0.3 * email_sim
         stat = stat.where(
             or_(
-                func.immutable_unaccent(Author.name).op("%")(norm_q),
-                func.immutable_unaccent(Author.email).op("%")(norm_q),
+                Author.name_norm.op("%")(norm_q),
+                Author.email_norm.op("%")(norm_q),
             )
         ).add_columns(total_score.label("total_score"))
         order_exp.append(total_score.desc())
 
     order_exp.append(Author.id.asc())
-    stat = stat.order_by(*order_exp)
-    stat = stat.limit(limit).offset(offset)
-    authors = (await db.execute(stat)).scalars().all()
-    serialized = [
-        AuthorRead.model_validate(a, from_attributes=True).model_dump() for a in authors
+    return stat.order_by(*order_exp), total_score
+
+
+@router.get("/", response_model=PaginatedAuthors)
+async def get_authors_router(
+    request: Request,
+    q: str | None = Depends(search_term),
+    name: str | None = Query(None, description="Exact name filter"),
+    email: str | None = Query(None, description="Exact email filter"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int | None = Query(None, description="Work when no cursor"),
+    cursor: str | None = Query(None, description="Pagination cursor"),
+    db: AsyncSession = Depends(get_async_db_with_timeout("search")),
+    r: Redis = Depends(get_redis),
+):
+    params = {
+        "q": q,
+        "name": name,
+        "email": email,
+        "limit": limit,
+        "offset": offset,
+        "cursor": cursor,
+    }
+    key, payload = await make_authors_list_key(params, r=r)
+    if (cached := await serve_cached(request, key, payload)) is not None:
+        return cached
+
+    if cursor is not None and offset is not None:
+        raise HTTPException(
+            status_code=400,
+            detail="Cannot use both cursor and offset",
+        )
+
+    stat, total_score = _authors_search_stmt(q, name, email)
+
+    # keyset on (score desc, id asc) with q, on id alone without
+    if cursor:
+        data = decode_cursor(cursor)
+        if total_score is None:
+            stat = stat.where(Author.id > data["id"])
+        elif data["score"] is None:
+            raise HTTPException(status_code=400, detail="Malformed cursor")
+        else:
+            stat = stat.where(
+                or_(
+                    total_score < data["score"],
+                    and_(total_score == data["score"], Author.id > data["id"]),
+                )
+            )
+    elif offset is not None:
+        stat = stat.offset(offset)
+
+    rows = (await db.execute(stat.limit(limit + 1))).all()
+    items_rows = rows[:limit]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last_row = items_rows[-1]
+        last_score = float(last_row[-1]) if total_score is not None else None
+        next_cursor = encode_cursor({"id": last_row[0].id, "score": last_score})
+
+    body = dump(
+        PaginatedAuthors,
+        {"items": [row[0] for row in items_rows], "next_cursor": next_cursor},
+    )
+    response = json_response(body)
+    set_etag(response, await cache_list_with_params(key, body, payload, r))
+    return response
+
+
+@router.get("/suggest", response_model=List[AuthorSuggestion])
+async def suggest_authors(
+    prefix: str = Query(..., min_length=2, max_length=100),
+    limit: int = Query(10, ge=1, le=20),
+    r: Redis = Depends(get_redis),
+):
+    """Typeahead: names with a word starting with `prefix`, most books first."""
+    suggestions = [
+        {"id": s["id"], "name": s["label"]}
+        for s in await suggest(r, "authors", prefix, limit)
     ]
-    await cache_list_with_params(key, serialized, payload, r)
-    return serialized
+    return json_response(dump(List[AuthorSuggestion], suggestions))
 
 
 @router.get("/{author_id}", response_model=AuthorRead)
 async def get_author_router(
     author_id: int,
+    request: Request,
     db: AsyncSession = Depends(get_async_db),
     r: Redis = Depends(get_redis),
 ):
-    cached = await get_author(author_id, r)
-    if cached is not None:
+    key = make_author_key(author_id)
+    if (cached := await serve_cached(request, key)) is not None:
         return cached
-    stat = (
-        select(Author).options(selectinload(Author.books)).where(Author.id == author_id)
+    stat = apply_response_shape(select(Author), AuthorRead).where(
+        Author.id == author_id
     )
     author = (await db.execute(stat)).scalar_one_or_none()
     if not author:
         raise HTTPException(status_code=404, detail="Author not found")
-    serialized = AuthorRead.model_validate(author, from_attributes=True).model_dump()
-    await cache_author(author_id, serialized, r)
-    return serialized
+    body = dump(AuthorRead, author)
+    response = json_response(body)
+    set_etag(response, await cache_author(author_id, body, r))
+    return response
+
+
+def _author_books_stmt(author_id: int) -> Select:
+    return (
+        apply_response_shape(select(Book), BookBase)
+        .join(author_book_relation, author_book_relation.c.book_id == Book.id)
+        .where(author_book_relation.c.author_id == author_id)
+        .order_by(Book.id)
+    )
 
 
 @router.get("/{author_id}/books", response_model=List[BookBase])
 async def get_author_books(
     author_id: int,
+    request: Request,
     db: AsyncSession = Depends(get_async_db),
     r: Redis = Depends(get_redis),
 ):
     key = make_author_books_key(author_id)
-    cached = await get_list(key, r)
-    if cached is not None:
+    if (cached := await serve_cached(request, key)) is not None:
         return cached
-    stat = (
-        select(Author).options(selectinload(Author.books)).where(Author.id == author_id)
+    books = (await db.execute(_author_books_stmt(author_id))).scalars().all()
+    if not books:
+        exists = select(Author.id).where(Author.id == author_id)
+        if (await db.execute(exists)).scalar_one_or_none() is None:
+            raise HTTPException(status_code=404, detail="Author not found")
+    body = dump(List[BookBase], books)
+    response = json_response(body)
+    set_etag(response, await cache_list(key, body, r))
+    return response
+
+
+AUTHOR_COLUMNS = (Author.id, Author.name, Author.email)
+
+
+async def _link_author_books(
+    db: AsyncSession, author_id: int, book_ids: set[int]
+) -> None:
+    """Link existing books in one INSERT ... SELECT, failing if any id is missing."""
+    stmt = (
+        insert(author_book_relation)
+        .from_select(
+            ["author_id", "book_id"],
+            select(literal(author_id), Book.id).where(Book.id.in_(book_ids)),
+        )
+        .returning(author_book_relation.c.book_id)
     )
-    author = (await db.execute(stat)).scalar_one_or_none()
-    if not author:
-        raise HTTPException(status_code=404, detail="Author not found")
-    payload = [
-        BookBase.model_validate(b, from_attributes=True).model_dump()
-        for b in author.books
-    ]
-    await cache_list(key, payload, r)
-    return payload
+    linked = (await db.execute(stmt)).scalars().all()
+    if len(linked) != len(book_ids):
+        raise HTTPException(
+            status_code=400, detail="At least one book id does not exist."
+        )
+
+
+async def _unlink_author_books(db: AsyncSession, author_id: int) -> set[int]:
+    stmt = (
+        delete(author_book_relation)
+        .where(author_book_relation.c.author_id == author_id)
+        .returning(author_book_relation.c.book_id)
+    )
+    return set((await db.execute(stmt)).scalars().all())
 
 
 @router.post("/", response_model=AuthorRead)
@@ -126,32 +256,24 @@ async def create_author(
     r: Redis = Depends(get_redis),
 ):
     book_ids = set(author.book_ids or [])
-    new_author = Author(
-        name=author.name,
-        email=author.email,
+    stmt = (
+        insert(Author)
+        .values(name=author.name, email=author.email)
+        .returning(*AUTHOR_COLUMNS)
     )
-
+    row = (await db.execute(stmt)).one()
     if book_ids:
-        stmt_books = select(Book).where(Book.id.in_(book_ids))
-        books = (await db.execute(stmt_books)).scalars().all()
-
-        if len(books) != len(book_ids):
-            raise HTTPException(
-                status_code=400, detail="At least one book id does not exist."
-            )
-
-        new_author.books = list(books)
-    else:
-        new_author.books = []
+        await _link_author_books(db, row.id, book_ids)
 
-    db.add(new_author)
     await db.commit()
-    await db.refresh(new_author)
     if book_ids:
-        await invalidate_author(new_author.id, r, book_ids=book_ids)
+        await invalidate_author(row.id, r, book_ids=book_ids)
         await bump_cache_version("books:list", r)
     await bump_cache_version("authors:list", r)
-    return new_author
+    await index_entries(r, "authors", [(row.id, row.name)])
+    await set_popularity(r, "authors", row.id, len(book_ids))
+    await publish_book_changes(r, book_ids)
+    return json_response(dump(AuthorRead, row))
 
 
 @router.put("/{author_id}", response_model=AuthorRead)
@@ -161,39 +283,32 @@ async def replace_author(
     db: AsyncSession = Depends(get_async_db),
     r: Redis = Depends(get_redis),
 ):
-    stat = (
-        select(Author).options(selectinload(Author.books)).where(Author.id == author_id)
+    stmt = (
+        update(Author)
+        .where(Author.id == author_id)
+        .values(name=new_author.name, email=new_author.email)
+        .returning(*AUTHOR_COLUMNS)
+        .execution_options(synchronize_session=False)
     )
-    old_author = (await db.execute(stat)).scalar_one_or_none()
-    if not old_author:
+    row = (await db.execute(stmt)).one_or_none()
+    if not row:
         raise HTTPException(status_code=404, detail="Author not found")
 
-    previous_book_ids = {book.id for book in old_author.books}
-
-    if new_author.book_ids:
-        book_ids = set(new_author.book_ids)
-        stat_books = select(Book).where(Book.id.in_(book_ids))
-        books = (await db.execute(stat_books)).scalars().all()
-
-        if len(books) != len(book_ids):
-            raise HTTPException(
-                status_code=400, detail="At least one book id does not exist."
-            )
-        old_author.books = list(books)
-    else:
-        book_ids = set()
-        old_author.books = []
+    previous_book_ids = await _unlink_author_books(db, author_id)
+    book_ids = set(new_author.book_ids or [])
+    if book_ids:
+        await _link_author_books(db, author_id, book_ids)
 
-    old_author.name = new_author.name
-    old_author.email = new_author.email
     await db.commit()
     affected_book_ids = previous_book_ids | book_ids
     await invalidate_author(author_id, r, book_ids=affected_book_ids)
     await bump_cache_version("authors:list", r)
     if affected_book_ids:
         await bump_cache_version("books:list", r)
-    await db.refresh(old_author)
-    return old_author
+    await index_entries(r, "authors", [(author_id, row.name)])
+    await set_popularity(r, "authors", author_id, len(book_ids))
+    await publish_book_changes(r, affected_book_ids)
+    return json_response(dump(AuthorRead, row))
 
 
 @router.patch("/{author_id}", response_model=AuthorRead)
@@ -203,35 +318,32 @@ async def update_author(
     db: AsyncSession = Depends(get_async_db),
     r: Redis = Depends(get_redis),
 ):
-    stmt = (
-        select(Author).options(selectinload(Author.books)).where(Author.id == author_id)
-    )
-    old_author = (await db.execute(stmt)).scalar_one_or_none()
-    if not old_author:
+    update_data = new_author.model_dump(exclude={"book_ids"}, exclude_unset=True)
+    if update_data:
+        stmt = (
+            update(Author)
+            .where(Author.id == author_id)
+            .values(**update_data)
+            .returning(*AUTHOR_COLUMNS)
+            .execution_options(synchronize_session=False)
+        )
+    else:
+        stmt = select(*AUTHOR_COLUMNS).where(Author.id == author_id)
+    row = (await db.execute(stmt)).one_or_none()
+    if not row:
         raise HTTPException(status_code=404, detail="Author not found")
 
-    previous_book_ids = {book.id for book in old_author.books}
-    updated_book_ids = previous_book_ids
-
     if new_author.book_ids is not None:
-        if new_author.book_ids:
-            book_ids = set(new_author.book_ids)
-            stmt_books = select(Book).where(Book.id.in_(book_ids))
-            books = (await db.execute(stmt_books)).scalars().all()
-
-            if len(books) != len(book_ids):
-                raise HTTPException(
-                    status_code=400, detail="At least one book id does not exist"
-                )
-            old_author.books = list(books)
-            updated_book_ids = book_ids
-        else:
-            updated_book_ids = set()
-            old_author.books = []
-
-    update_data = new_author.model_dump(exclude={"book_ids"}, exclude_unset=True)
-    for key, val in update_data.items():
-        setattr(old_author, key, val)
+        previous_book_ids = await _unlink_author_books(db, author_id)
+        updated_book_ids = set(new_author.book_ids)
+        if updated_book_ids:
+            await _link_author_books(db, author_id, updated_book_ids)
+    else:
+        stmt_links = select(author_book_relation.c.book_id).where(
+            author_book_relation.c.author_id == author_id
+        )
+        previous_book_ids = set((await db.execute(stmt_links)).scalars().all())
+        updated_book_ids = previous_book_ids
 
     await db.commit()
     affected_book_ids = previous_book_ids | updated_book_ids
@@ -239,8 +351,12 @@ async def update_author(
     await bump_cache_version("authors:list", r)
     if affected_book_ids:
         await bump_cache_version("books:list", r)
-    await db.refresh(old_author)
-    return old_author
+    if "name" in update_data:
+        await index_entries(r, "authors", [(author_id, row.name)])
+    if new_author.book_ids is not None:
+        await set_popularity(r, "authors", author_id, len(updated_book_ids))
+    await publish_book_changes(r, affected_book_ids)
+    return json_response(dump(AuthorRead, row))
 
 
 @router.delete("/{author_id}", status_code=204)
@@ -249,16 +365,20 @@ async def del_author(
     db: AsyncSession = Depends(get_async_db),
     r: Redis = Depends(get_redis),
 ):
-    stat = (
-        select(Author).options(selectinload(Author.books)).where(Author.id == author_id)
+    book_ids = await _unlink_author_books(db, author_id)
+    stmt = (
+        delete(Author)
+        .where(Author.id == author_id)
+        .returning(Author.id)
+        .execution_options(synchronize_session=False)
     )
-    author = (await db.execute(stat)).scalar_one_or_none()
-    if not author:
+    deleted = (await db.execute(stmt)).scalar_one_or_none()
+    if deleted is None:
         raise HTTPException(status_code=404, detail="author not found")
-    book_ids = {b.id for b in author.books}
-    await db.delete(author)
     await db.commit()
     await invalidate_author(author_id, r, book_ids=book_ids)
     await bump_cache_version("authors:list", r)
     if book_ids:
         await bump_cache_version("books:list", r)
+    await remove_entries(r, "authors", [author_id])
+    await publish_book_changes(r, book_ids)
@@ -1,84 +1,122 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import and_, asc, desc, func, or_, select
+import csv
+import io
+import json
+import os
+from typing import AsyncIterator, List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import (
+    ColumnElement,
+    CompoundSelect,
+    Select,
+    Update,
+    and_,
+    asc,
+    delete,
+    desc,
+    func,
+    insert,
+    or_,
+    select,
+    union,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
-from models import Author, Book, Review
-from database import get_async_db
-from dependencies import parse_sort
+from sqlalchemy.orm import aliased
+from models import Author, Book, Review, author_book_relation
+from database import (
+    AsyncSessionLocal,
+    get_async_db,
+    get_async_db_with_timeout,
+    get_async_engine,
+)
+from dependencies import parse_sort, search_term
 from schemas.book import (
     BookCreate,
     BookDetailRead,
     BookListRead,
     BookUpdate,
     BookSortControl,
+    BookSuggestion,
+    ExportFormat,
     SortField,
     SortDirection,
     PaginatedBooks,
+    SimilarBook,
+    TopBook,
+    TopWindow,
 )
 from schemas.review import ReviewCreate, ReviewRead
+from helpers.conditional import serve_cached, set_etag
+from helpers.eager import apply_response_shape
+from helpers.response_cache import CachedRoute
+from helpers.responses import dump, json_response
 from helpers.helpers import encode_cursor, decode_cursor
+from search.inverted import InvertedIndex, get_index, publish_book_changes
+from search.leaderboard import drop_book, move_book, record_review, top
+from search.similar import SIMILAR_NEIGHBOURS
+from search.rerank import SEARCH_CANDIDATES, SEARCH_MODE, WEIGHTS, rerank
+from search.suggest import (
+    add_popularity,
+    index_entries,
+    link_deltas,
+    remove_entries,
+    suggest,
+)
 from cache import (
     Redis,
     bump_cache_version,
     cache_book,
+    cache_book_author_ids,
     cache_list,
     cache_list_with_params,
-    get_book,
-    get_list,
-    get_list_with_params,
+    get_book_author_ids,
     get_redis,
+    get_similar,
     invalidate_author,
     invalidate_book,
+    make_book_key,
     make_books_list_key,
     make_reviews_key,
+    make_search_estimate_key,
 )
 
 router = APIRouter(prefix="/books", tags=["books"])
+# cache hits on these are answered by helpers.response_cache, before routing
+CACHED_ROUTES = [
+    CachedRoute("/books/", version="books:list"),
+    CachedRoute("/books/{book_id}", key=make_book_key),
+    CachedRoute("/books/{book_id}/reviews", key=make_reviews_key),
+]
+
+EXPORT_FETCH_SIZE = int(os.getenv("BOOKS_EXPORT_FETCH_SIZE", "1000"))
+# above this many estimated trigram candidates, q is matched by FTS only
+SEARCH_TRIGRAM_ROW_LIMIT = int(os.getenv("SEARCH_TRIGRAM_ROW_LIMIT", "20000"))
+SEARCH_ESTIMATE_TTL = int(os.getenv("SEARCH_ESTIMATE_TTL", "3600"))
+# FTS-only matching ranks at most this many candidates, so a term that is also
+# common in the tsvector still costs a bounded amount
+SEARCH_FALLBACK_CANDIDATES = int(os.getenv("SEARCH_FALLBACK_CANDIDATES", "2000"))
+BOOK_COLUMNS = (
+    Book.id,
+    Book.title,
+    Book.year,
+    Book.book_isbn,
+    Book.genre_name,
+    Book.description,
+)
 
 
-@router.get("/", response_model=PaginatedBooks)
-async def get_books_router(
-    q: str | None = Query(None, description="Full-text query"),
-    title: str | None = Query(None, description="Exact title filter"),
-    isbn: str | None = Query(None, description="Exact ISBN filter"),
-    author_id: int | None = Query(None, description="Filter by author id"),
-    before: int | None = Query(None, description="Filter by Year(before)"),
-    after: int | None = Query(None, description="Filter by Year(after)"),
-    limit: int = Query(20, ge=1, le=100, description="Pagination limit"),
-    offset: int | None = Query(None, description="Work when no cursor"),
-    cursor: str | None = Query(None, description="Pagination cursor"),
-    sort: List[BookSortControl] = Depends(parse_sort),
-    db: AsyncSession = Depends(get_async_db),
-    r: Redis = Depends(get_redis),
-):
-    if q and not sort:
-        sort = [
-            BookSortControl(
-                sort_field=SortField.by_similarity, sort_direction=SortDirection.desc
-            )
-        ]
-
-    sort_param = [s.model_dump() for s in sort]
-    params = {
-        "q": q,
-        "title": title,
-        "isbn": isbn,
-        "author_id": author_id,
-        "before": before,
-        "after": after,
-        "limit": limit,
-        "offset": offset,
-        "cursor": cursor,
-        "sort": sort_param,
-    }
-    key, payload = await make_books_list_key(params, r=r)
-    cache = await get_list_with_params(key, payload, r)
-    if cache is not None:
-        return cache
-    stmt = select(Book).options(selectinload(Book.authors))
-    total = None
-
+def _apply_book_filters(
+    stmt: Select,
+    title: str | None = None,
+    isbn: str | None = None,
+    author_id: int | None = None,
+    before: int | None = None,
+    after: int | None = None,
+) -> Select:
     if title:
         stmt = stmt.where(Book.title == title)
     if isbn:
@@ -89,22 +127,91 @@ async def get_books_router(
         stmt = stmt.where(Book.year <= before)
     if after:
         stmt = stmt.where(Book.year >= after)
+    return stmt
+
+
+def _trigram_match(q: str) -> list[Select]:
+    return [
+        select(Book.id).where(Book.title.op("%")(q)),
+        select(author_book_relation.c.book_id)
+        .join(Author, Author.id == author_book_relation.c.author_id)
+        .where(Author.name.op("%")(q)),
+    ]
+
+
+def _search_match(q: str, fts_only: bool = False) -> Select | CompoundSelect:
+    """
+    Ids of books matching q. One branch per predicate so each is answered by
+    its own index (search_tsv GIN, title/author name trigram GIN) instead of
+    an OR across the author join that forces a full scan. `fts_only` keeps
+    just the full-text branch's best SEARCH_FALLBACK_CANDIDATES matches by
+    ts_rank (ties by id), for terms too broad to rank: the same ones on every
+    call, so pages and cache fills of one query agree.
+    """
+    tsq = func.websearch_to_tsquery("english", q)
+    fts = select(Book.id).where(Book.search_tsv.op("@@")(tsq))
+    if fts_only:
+        return fts.order_by(
+            func.ts_rank(Book.search_tsv, tsq).desc(), Book.id.asc()
+        ).limit(SEARCH_FALLBACK_CANDIDATES)
+    return union(fts, *_trigram_match(q))
+
+
+async def _trigram_too_broad(db: AsyncSession, q: str, r: Redis) -> bool:
+    """Whether the planner expects q's trigram branches to match too many rows."""
+    key = make_search_estimate_key(q)
+    cached = await r.get(key)
+    if cached is None:
+        conn = await db.connection()
+        compiled = union_all(*_trigram_match(q)).compile(
+            dialect=conn.dialect, compile_kwargs={"render_postcompile": True}
+        )
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+        plan = (
+            await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", params)
+        ).scalar_one()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        cached = int(plan[0]["Plan"]["Plan Rows"])
+        await r.set(key, cached, ex=SEARCH_ESTIMATE_TTL)
+    return int(cached) > SEARCH_TRIGRAM_ROW_LIMIT
+
+
+def _score_features(q: str) -> tuple[ColumnElement, ColumnElement, ColumnElement]:
+    """fts rank, title similarity and best author similarity; needs the author join."""
+    tsq = func.websearch_to_tsquery("english", q)
+    return (
+        func.ts_rank(Book.search_tsv, tsq),
+        func.similarity(Book.title, q),
+        func.coalesce(func.max(func.similarity(Author.name, q)), 0.0),
+    )
+
+
+def _books_search_stmt(
+    q: str | None = None,
+    title: str | None = None,
+    isbn: str | None = None,
+    author_id: int | None = None,
+    before: int | None = None,
+    after: int | None = None,
+    sort: List[BookSortControl] | None = None,
+    fts_only: bool = False,
+) -> tuple[Select, ColumnElement | None]:
+    """Book list query ordered per `sort`, and its score expression (None without q)."""
+    stmt = apply_response_shape(select(Book), BookListRead)
+    total = None
+    stmt = _apply_book_filters(stmt, title, isbn, author_id, before, after)
 
     if q:
-        tsq = func.websearch_to_tsquery("english", q)
-        fts_score = func.ts_rank(Book.search_tsv, tsq)
-        title_sim = func.similarity(Book.title, q)
-        author_sim = func.coalesce(func.max(func.similarity(Author.name, q)), 0.0)
-        total = 0.6 * fts_score + 0.25 * title_sim + 0.15 * author_sim
+        fts_score, title_sim, author_sim = _score_features(q)
+        total = (
+            WEIGHTS.fts * fts_score
+            + WEIGHTS.title * title_sim
+            + WEIGHTS.author * author_sim
+        )
         stmt = (
-            stmt.join(Book.authors, isouter=True)
-            .where(
-                or_(
-                    Book.search_tsv.op("@@")(tsq),
-                    Book.title.op("%")(q),
-                    Author.name.op("%")(q),
-                )
-            )
+            stmt.where(Book.id.in_(_search_match(q, fts_only)))
+            .join(Book.authors, isouter=True)
             .group_by(Book.id)
             .add_columns(
                 fts_score.label("fts_score"),
@@ -116,7 +223,7 @@ async def get_books_router(
 
     order_exprs: list = []
 
-    for s in sort:
+    for s in sort or []:
         if s.sort_field is SortField.by_similarity:
             if not q:
                 raise HTTPException(
@@ -135,14 +242,124 @@ async def get_books_router(
             asc(col) if s.sort_direction is SortDirection.asc else desc(col)
         )
 
-    # if q and not order_exprs:
-    #     order_exprs.append(desc(total))
-
     order_exprs.append(Book.id.asc())
-    stmt = stmt.order_by(*order_exprs)
+    return stmt.order_by(*order_exprs), total
+
+
+async def _two_phase_search(
+    db: AsyncSession,
+    q: str,
+    fts_only: bool,
+    filters: dict,
+    limit: int,
+    offset: int | None,
+    cursor: dict | None,
+) -> tuple[list[Book], str | None] | None:
+    """
+    Similarity search ranked in-process: one query returns the score features
+    of every index match, a second loads the page. None when there are more
+    than SEARCH_CANDIDATES matches: ranking only some of them would not find
+    the best ones, so the caller ranks in SQL instead.
+    """
+    candidates = (
+        _apply_book_filters(select(Book.id), **filters)
+        .where(Book.id.in_(_search_match(q, fts_only)))
+        .limit(SEARCH_CANDIDATES + 1)
+    )
+    features = (
+        select(Book.id, *_score_features(q))
+        .where(Book.id.in_(candidates.scalar_subquery()))
+        .join(Book.authors, isouter=True)
+        .group_by(Book.id)
+    )
+    rows = (await db.execute(features)).all()
+    if len(rows) > SEARCH_CANDIDATES:
+        return None
 
-    primary = sort[0] if sort else None
-    by_similarity = primary and primary.sort_field is SortField.by_similarity
+    after = (cursor["score"], cursor["id"]) if cursor else None
+    ids, scores = rerank(
+        [row[0] for row in rows], [row[1:] for row in rows], after=after
+    )
+    start = offset or 0
+    page_ids = ids[start : start + limit].tolist()
+    if not page_ids:
+        return [], None
+
+    stmt = apply_response_shape(select(Book), BookListRead).where(Book.id.in_(page_ids))
+    by_id = {book.id: book for book in (await db.scalars(stmt)).all()}
+    books = [by_id[book_id] for book_id in page_ids]
+
+    next_cursor = None
+    if len(ids) > start + limit:
+        next_cursor = encode_cursor(
+            {"id": page_ids[-1], "score": float(scores[start + limit - 1])}
+        )
+    return books, next_cursor
+
+
+def _memory_search(
+    index: InvertedIndex,
+    q: str,
+    author_id: int | None,
+    before: int | None,
+    after: int | None,
+    limit: int,
+    offset: int | None,
+    cursor: dict | None,
+) -> tuple[list[dict], str | None]:
+    """Similarity search answered by the in-process index, without Postgres."""
+    ids, scores = index.search(
+        q, author_id, before, after, (cursor["score"], cursor["id"]) if cursor else None
+    )
+    start = offset or 0
+    page_ids = ids[start : start + limit].tolist()
+    next_cursor = None
+    if len(ids) > start + limit:
+        next_cursor = encode_cursor(
+            {"id": page_ids[-1], "score": float(scores[start + limit - 1])}
+        )
+    return index.get_items(page_ids), next_cursor
+
+
+@router.get("/", response_model=PaginatedBooks)
+async def get_books_router(
+    request: Request,
+    q: str | None = Depends(search_term),
+    title: str | None = Query(None, description="Exact title filter"),
+    isbn: str | None = Query(None, description="Exact ISBN filter"),
+    author_id: int | None = Query(None, description="Filter by author id"),
+    before: int | None = Query(None, description="Filter by Year(before)"),
+    after: int | None = Query(None, description="Filter by Year(after)"),
+    limit: int = Query(20, ge=1, le=100, description="Pagination limit"),
+    offset: int | None = Query(None, description="Work when no cursor"),
+    cursor: str | None = Query(None, description="Pagination cursor"),
+    sort: List[BookSortControl] = Depends(parse_sort),
+    db: AsyncSession = Depends(get_async_db_with_timeout("search")),
+    r: Redis = Depends(get_redis),
+):
+    if q and not sort:
+        sort = [
+            BookSortControl(
+                sort_field=SortField.by_similarity, sort_direction=SortDirection.desc
+            )
+        ]
+
+    sort_param = [s.model_dump() for s in sort]
+    params = {
+        "q": q,
+        "title": title,
+        "isbn": isbn,
+        "author_id": author_id,
+        "before": before,
+        "after": after,
+        "limit": limit,
+        "offset": offset,
+        "cursor": cursor,
+        "sort": sort_param,
+    }
+    key, payload = await make_books_list_key(params, r=r)
+    if (cached := await serve_cached(request, key, payload)) is not None:
+        return cached
 
     if cursor is not None and offset is not None:
         raise HTTPException(
@@ -150,6 +367,60 @@ async def get_books_router(
             detail="Cannot use both cursor and offset",
         )
 
+    index = get_index()
+    if (
+        index is not None
+        and q
+        and not (title or isbn)
+        and len(sort) == 1
+        and sort[0].sort_field is SortField.by_similarity
+        and sort[0].sort_direction is SortDirection.desc
+    ):
+        data = decode_cursor(cursor) if cursor else None
+        if data is not None and data["score"] is None:
+            raise HTTPException(status_code=400, detail="Malformed cursor")
+        items, next_cursor = _memory_search(
+            index, q, author_id, before, after, limit, offset, data
+        )
+        # not cached: the index catches up with writes asynchronously, after
+        # the list cache version was bumped, and answering is cheap anyway
+        return json_response(
+            dump(PaginatedBooks, {"items": items, "next_cursor": next_cursor})
+        )
+
+    fts_only = bool(q) and await _trigram_too_broad(db, q, r)
+    stmt, total = _books_search_stmt(
+        q, title, isbn, author_id, before, after, sort, fts_only
+    )
+
+    primary = sort[0] if sort else None
+    by_similarity = primary and primary.sort_field is SortField.by_similarity
+
+    if (
+        SEARCH_MODE == "two_phase"
+        and by_similarity
+        and primary.sort_direction is SortDirection.desc
+        and len(sort) == 1
+    ):
+        data = decode_cursor(cursor) if cursor else None
+        if data is not None and data["score"] is None:
+            raise HTTPException(status_code=400, detail="Malformed cursor")
+        filters = {
+            "title": title,
+            "isbn": isbn,
+            "author_id": author_id,
+            "before": before,
+            "after": after,
+        }
+        page = await _two_phase_search(db, q, fts_only, filters, limit, offset, data)
+        if page is not None:
+            books, next_cursor = page
+            body = dump(PaginatedBooks, {"items": books, "next_cursor": next_cursor})
+            response = json_response(body)
+            set_etag(response, await cache_list_with_params(key, body, payload, r))
+            return response
+        # too many matches to rank in-process: same cursor format in SQL
+
     # cursor keyset for similarity sort
     if cursor and by_similarity:
         data = decode_cursor(cursor)
@@ -192,59 +463,259 @@ async def get_books_router(
         next_cursor = encode_cursor(
             {"id": last_book.id, "score": float(last_total_score)}
         )
-    serialized = PaginatedBooks(
-        items=books,  # type: ignore
-        next_cursor=next_cursor,
-    ).model_dump()
-    await cache_list_with_params(key, serialized, payload, r)
-    return serialized
+    body = dump(PaginatedBooks, {"items": books, "next_cursor": next_cursor})
+    response = json_response(body)
+    set_etag(response, await cache_list_with_params(key, body, payload, r))
+    return response
+
+
+async def _authors_for_books(
+    db: AsyncSession, book_ids: list[int]
+) -> dict[int, list[dict]]:
+    """Fetch authors for a batch of books in one round trip."""
+    stmt = (
+        select(author_book_relation.c.book_id, Author.id, Author.name, Author.email)
+        .join(Author, Author.id == author_book_relation.c.author_id)
+        .where(author_book_relation.c.book_id.in_(book_ids))
+        .order_by(author_book_relation.c.book_id, Author.id)
+    )
+    grouped: dict[int, list[dict]] = {bid: [] for bid in book_ids}
+    for bid, aid, name, email in (await db.execute(stmt)).all():
+        grouped[bid].append({"id": aid, "name": name, "email": email})
+    return grouped
+
+
+def _export_csv_chunk(rows: list[dict], include_authors: bool) -> str:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        line = [row[c.key] for c in BOOK_COLUMNS]
+        if include_authors:
+            line.append("|".join(str(a["id"]) for a in row["authors"]))
+            line.append("|".join(a["name"] for a in row["authors"]))
+        writer.writerow(line)
+    return buf.getvalue()
+
+
+async def _iter_export(
+    stmt: Select, fmt: ExportFormat, include_authors: bool
+) -> AsyncIterator[str]:
+    # Own session: the request-scoped one must not be held by a long download.
+    async with AsyncSessionLocal(bind=get_async_engine()) as db:
+        if fmt is ExportFormat.csv:
+            header = [c.key for c in BOOK_COLUMNS]
+            if include_authors:
+                header += ["author_ids", "author_names"]
+            buf = io.StringIO()
+            csv.writer(buf).writerow(header)
+            yield buf.getvalue()
+
+        # server-side cursor; only one partition of rows is in memory at a time
+        result = await db.stream(stmt.execution_options(yield_per=EXPORT_FETCH_SIZE))
+        async for partition in result.partitions():
+            rows = [row._asdict() for row in partition]
+            if include_authors:
+                authors = await _authors_for_books(db, [row["id"] for row in rows])
+                for row in rows:
+                    row["authors"] = authors[row["id"]]
+
+            if fmt is ExportFormat.csv:
+                yield _export_csv_chunk(rows, include_authors)
+            else:
+                yield "".join(
+                    json.dumps(row, separators=(",", ":")) + "\n" for row in rows
+                )
+
+
+@router.get("/export")
+async def export_books(
+    format: ExportFormat = Query(ExportFormat.ndjson, description="ndjson or csv"),
+    q: str | None = Depends(search_term),
+    title: str | None = Query(None, description="Exact title filter"),
+    isbn: str | None = Query(None, description="Exact ISBN filter"),
+    author_id: int | None = Query(None, description="Filter by author id"),
+    before: int | None = Query(None, description="Filter by Year(before)"),
+    after: int | None = Query(None, description="Filter by Year(after)"),
+    include_authors: bool = Query(False, description="Embed authors per book"),
+):
+    stmt = select(*BOOK_COLUMNS)
+    stmt = _apply_book_filters(stmt, title, isbn, author_id, before, after)
+    if q:
+        # same match as the list search, without ranking
+        stmt = stmt.where(Book.id.in_(_search_match(q)))
+    stmt = stmt.order_by(Book.id.asc())
+
+    if format is ExportFormat.csv:
+        media_type = "text/csv"
+    else:
+        media_type = "application/x-ndjson"
+    return StreamingResponse(
+        _iter_export(stmt, format, include_authors),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="books.{format.value}"'},
+    )
+
+
+@router.get("/suggest", response_model=List[BookSuggestion])
+async def suggest_books(
+    prefix: str = Query(..., min_length=2, max_length=100),
+    limit: int = Query(10, ge=1, le=20),
+    r: Redis = Depends(get_redis),
+):
+    """Typeahead: titles with a word starting with `prefix`, most reviewed first."""
+    suggestions = [
+        {"id": s["id"], "title": s["label"]}
+        for s in await suggest(r, "books", prefix, limit)
+    ]
+    return json_response(dump(List[BookSuggestion], suggestions))
+
+
+@router.get("/top", response_model=List[TopBook])
+async def top_books(
+    genre: str | None = Query(None, max_length=127),
+    window: TopWindow = TopWindow.all_time,
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+    r: Redis = Depends(get_redis),
+):
+    """
+    Best rated books (Bayesian average), optionally within one genre and over
+    reviews from the last 7 or 30 days only. Ranked from Redis leaderboards.
+    """
+    ranked = await top(r, window.value, genre, limit)
+    if not ranked:
+        return json_response(b"[]")
+    stmt = select(Book.id, Book.title, Book.year).where(
+        Book.id.in_([book_id for book_id, _, _ in ranked])
+    )
+    rows = {row.id: row for row in (await db.execute(stmt)).all()}
+    leaders = [
+        {**rows[book_id]._asdict(), "rating": rating, "reviews": reviews}
+        for book_id, rating, reviews in ranked
+        if book_id in rows
+    ]
+    return json_response(dump(List[TopBook], leaders))
 
 
 @router.get("/{book_id}", response_model=BookDetailRead)
 async def get_book_router(
     book_id: int,
+    request: Request,
     db: AsyncSession = Depends(get_async_db),
     r: Redis = Depends(get_redis),
 ):
-    cached = await get_book(book_id, r)
-    if cached is not None:
+    key = make_book_key(book_id)
+    if (cached := await serve_cached(request, key)) is not None:
         return cached
 
-    stmt = (
-        select(Book)
-        .options(selectinload(Book.authors))
-        .options(selectinload(Book.reviews))
-        .where(Book.id == book_id)
-    )
+    stmt = apply_response_shape(select(Book), BookDetailRead).where(Book.id == book_id)
     book = (await db.execute(stmt)).scalar_one_or_none()
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
 
-    payload = BookDetailRead.model_validate(book, from_attributes=True).model_dump()
-    await cache_book(book_id, payload, r=r)
-    return payload
+    body = dump(BookDetailRead, book)
+    response = json_response(body)
+    set_etag(response, await cache_book(book_id, body, r=r))
+    return response
 
 
 @router.get("/{book_id}/reviews", response_model=List[ReviewRead])
 async def get_reviews(
     book_id: int,
+    request: Request,
     db: AsyncSession = Depends(get_async_db),
     r: Redis = Depends(get_redis),
 ):
     key = make_reviews_key(book_id)
-    cached = await get_list(key, r)
-    if cached is not None:
+    if (cached := await serve_cached(request, key)) is not None:
         return cached
-    stat = select(Book).options(selectinload(Book.reviews)).where(Book.id == book_id)
-    book = (await db.execute(stat)).scalar_one_or_none()
-    if not book:
+    stat = (
+        apply_response_shape(select(Review), ReviewRead)
+        .where(Review.book_id == book_id)
+        .order_by(Review.id)
+    )
+    reviews = (await db.execute(stat)).scalars().all()
+    if not reviews and not await _book_exists(db, book_id):
+        raise HTTPException(status_code=404, detail="Book not found")
+    body = dump(List[ReviewRead], reviews)
+    response = json_response(body)
+    set_etag(response, await cache_list(key, body, r))
+    return response
+
+
+@router.get("/{book_id}/similar", response_model=List[SimilarBook])
+async def get_similar_books(
+    book_id: int,
+    limit: int = Query(10, ge=1, le=SIMILAR_NEIGHBOURS),
+    db: AsyncSession = Depends(get_async_db),
+    r: Redis = Depends(get_redis),
+):
+    """
+    Related titles, most similar first, from the neighbour lists precomputed
+    by tasks.recommend. Books added since its last run have none yet.
+    """
+    neighbours = await get_similar(book_id, r) or []
+    ids = [book_id, *(neighbour_id for neighbour_id, _ in neighbours)]
+    stmt = select(Book.id, Book.title, Book.year).where(Book.id.in_(ids))
+    rows = {row.id: row for row in (await db.execute(stmt)).all()}
+    if book_id not in rows:
         raise HTTPException(status_code=404, detail="Book not found")
-    payload = [
-        ReviewRead.model_validate(review, from_attributes=True).model_dump()
-        for review in book.reviews
+    # titles come from the database, so renames and deletes show up at once
+    similar = [
+        {**rows[neighbour_id]._asdict(), "score": score}
+        for neighbour_id, score in neighbours
+        if neighbour_id in rows
     ]
-    await cache_list(key, payload, r)
-    return payload
+    return json_response(dump(List[SimilarBook], similar[:limit]))
+
+
+async def _book_exists(db: AsyncSession, book_id: int) -> bool:
+    stmt = select(Book.id).where(Book.id == book_id)
+    return (await db.execute(stmt)).scalar_one_or_none() is not None
+
+
+async def _fetch_authors(db: AsyncSession, author_ids: set[int]) -> list[dict]:
+    """Load author rows for a write, failing if any id does not exist."""
+    if not author_ids:
+        return []
+    stmt = (
+        select(Author.id, Author.name, Author.email)
+        .where(Author.id.in_(author_ids))
+        .order_by(Author.id)
+    )
+    rows = (await db.execute(stmt)).all()
+    if len(rows) != len(author_ids):
+        raise HTTPException(
+            status_code=400, detail="At least one author id does not exist."
+        )
+    return [row._asdict() for row in rows]
+
+
+async def _fetch_reviews(db: AsyncSession, book_id: int) -> list[dict]:
+    stmt = (
+        select(Review.id, Review.rating, Review.reviewer_name, Review.comment)
+        .where(Review.book_id == book_id)
+        .order_by(Review.id)
+    )
+    return [row._asdict() for row in (await db.execute(stmt)).all()]
+
+
+async def _relink_book_authors(
+    db: AsyncSession, book_id: int, author_ids: set[int]
+) -> set[int]:
+    """Replace the book's author links; return the previously linked author ids."""
+    stmt = (
+        delete(author_book_relation)
+        .where(author_book_relation.c.book_id == book_id)
+        .returning(author_book_relation.c.author_id)
+    )
+    previous = set((await db.execute(stmt)).scalars().all())
+    if author_ids:
+        await db.execute(
+            insert(author_book_relation),
+            [{"author_id": aid, "book_id": book_id} for aid in author_ids],
+        )
+    return previous
 
 
 @router.post("/", response_model=BookDetailRead)
@@ -253,43 +724,40 @@ async def create_book(
     db: AsyncSession = Depends(get_async_db),
     r: Redis | None = Depends(get_redis),
 ):
-    author_objs: list[Author] = []
-    new_book = Book(
-        title=book.title,
-        year=book.year,
-        book_isbn=book.book_isbn,
-        genre_name=book.genre_name,
-        description=book.description,
+    authors = await _fetch_authors(db, set(book.author_ids))
+    stmt = (
+        insert(Book)
+        .values(**book.model_dump(exclude={"author_ids"}))
+        .returning(*BOOK_COLUMNS)
     )
-
-    if book.author_ids:
-        author_ids = set(book.author_ids)
-        stmt_authors = select(Author).where(Author.id.in_(author_ids))
-        author_objs = (await db.execute(stmt_authors)).scalars().all()
-
-        if len(author_objs) != len(author_ids):
-            raise HTTPException(
-                status_code=400, detail="At least one author id does not exist."
-            )
-
-        new_book.authors = list(author_objs)
-    else:
-        new_book.authors = []
-
-    db.add(new_book)
+    row = (await db.execute(stmt)).one()
+    if authors:
+        await db.execute(
+            insert(author_book_relation),
+            [{"author_id": a["id"], "book_id": row.id} for a in authors],
+        )
     await db.commit()
-    await db.refresh(new_book)
-    stmt_reload = (
-        select(Book)
-        .options(selectinload(Book.authors))
-        .options(selectinload(Book.reviews))
-        .where(Book.id == new_book.id)
-    )
-    new_book = (await db.execute(stmt_reload)).scalar_one()
     await bump_cache_version("books:list", r)
-    for author in author_objs:
-        await invalidate_author(author.id, r, book_ids=[new_book.id])
-    return new_book
+    for author in authors:
+        await invalidate_author(author["id"], r, book_ids=[row.id])
+    await index_entries(r, "books", [(row.id, row.title)])
+    await add_popularity(r, "authors", {a["id"]: 1 for a in authors})
+    await publish_book_changes(r, [row.id])
+    return json_response(
+        dump(BookDetailRead, {**row._asdict(), "authors": authors, "reviews": []})
+    )
+
+
+async def _linked_author_ids(db: AsyncSession, book_id: int, r: Redis) -> list[int]:
+    """Author ids for a book from the cached link, falling back to the join table."""
+    author_ids = await get_book_author_ids(book_id, r)
+    if author_ids is None:
+        stmt = select(author_book_relation.c.author_id).where(
+            author_book_relation.c.book_id == book_id
+        )
+        author_ids = list((await db.execute(stmt)).scalars().all())
+        await cache_book_author_ids(book_id, author_ids, r)
+    return author_ids
 
 
 @router.post("/{book_id}/reviews", response_model=ReviewRead)
@@ -299,36 +767,57 @@ async def create_review(
     db: AsyncSession = Depends(get_async_db),
     r: Redis | None = Depends(get_redis),
 ):
-    stat_book = (
-        select(Book)
-        .options(selectinload(Book.authors))
-        .options(selectinload(Book.reviews))
-        .where(Book.id == book_id)
+    # single statement: the FK proves the book exists, the unique constraint
+    # rejects duplicates without a read-then-write race
+    stmt = (
+        pg_insert(Review)
+        .values(
+            book_id=book_id,
+            reviewer_name=review.reviewer_name,
+            rating=review.rating,
+            comment=review.comment,
+        )
+        .on_conflict_do_nothing(constraint="uq_reviews_book_reviewer")
+        .returning(
+            Review.id,
+            Review.reviewer_name,
+            Review.rating,
+            Review.comment,
+            Review.created_at,
+            select(Book.genre_name)
+            .where(Book.id == book_id)
+            .scalar_subquery()
+            .label("genre_name"),
+        )
     )
-    book = (await db.execute(stat_book)).scalar_one_or_none()
-    if not book:
+    try:
+        row = (await db.execute(stmt)).one_or_none()
+    except IntegrityError:
+        await db.rollback()
         raise HTTPException(status_code=404, detail="Book not found")
-    dup_check = select(Review).where(
-        Review.book_id == book_id, Review.reviewer_name == review.reviewer_name
-    )
-    if (await db.execute(dup_check)).scalar_one_or_none():
+    if row is None:
         raise HTTPException(
             status_code=400, detail="Reviewer has already reviewed this book."
         )
-    new_review = Review(
-        book_id=book_id,
-        reviewer_name=review.reviewer_name,
-        rating=review.rating,
-        comment=review.comment,
-    )
-    author_ids = [author.id for author in book.authors]
-    db.add(new_review)
     await db.commit()
-    await db.refresh(new_review)
-    for aid in author_ids:
-        await invalidate_author(aid, r, book_ids=[book_id])
-    await invalidate_book(book_id, r)
-    return new_review
+    for aid in await _linked_author_ids(db, book_id, r):
+        await invalidate_author(aid, r, book_ids=[book_id], keep_author_link=True)
+    await invalidate_book(book_id, r, keep_author_link=True)
+    await add_popularity(r, "books", {book_id: 1})
+    await record_review(r, book_id, row.genre_name, row.rating, row.created_at)
+    return json_response(dump(ReviewRead, row))
+
+
+def _update_book_stmt(book_id: int, values: dict) -> Update:
+    """UPDATE returning the new row plus the genre it had before."""
+    previous = aliased(Book)
+    return (
+        update(Book)
+        .where(Book.id == book_id, previous.id == Book.id)
+        .values(**values)
+        .returning(*BOOK_COLUMNS, previous.genre_name.label("previous_genre"))
+        .execution_options(synchronize_session=False)
+    )
 
 
 @router.put("/{book_id}", response_model=BookDetailRead)
@@ -338,48 +827,30 @@ async def replace_book(
     db: AsyncSession = Depends(get_async_db),
     r: Redis = Depends(get_redis),
 ):
-    stat = (
-        select(Book)
-        .options(selectinload(Book.authors))
-        .options(selectinload(Book.reviews))
-        .where(Book.id == book_id)
-    )
-    old_book = (await db.execute(stat)).scalar_one_or_none()
-    if not old_book:
+    stmt = _update_book_stmt(book_id, new_book.model_dump(exclude={"author_ids"}))
+    row = (await db.execute(stmt)).one_or_none()
+    if not row:
         raise HTTPException(status_code=404, detail="Book not found")
 
-    previous_author_ids = {a.id for a in old_book.authors}
-
-    if new_book.author_ids:
-        author_ids = set(new_book.author_ids)
-        stmt_authors = select(Author).where(Author.id.in_(author_ids))
-        authors = (await db.execute(stmt_authors)).scalars().all()
-
-        if len(authors) != len(author_ids):
-            raise HTTPException(
-                status_code=400, detail="At least one author id does not exist."
-            )
-
-        old_book.authors = list(authors)
-        updated_author_ids = author_ids
-    else:
-        old_book.authors = []
-        updated_author_ids = set()
-
-    old_book.title = new_book.title
-    old_book.year = new_book.year
-    old_book.book_isbn = new_book.book_isbn
-    old_book.genre_name = new_book.genre_name
-    old_book.description = new_book.description
-    # old_book.reviews = []
+    authors = await _fetch_authors(db, set(new_book.author_ids))
+    updated_author_ids = {a["id"] for a in authors}
+    previous_author_ids = await _relink_book_authors(db, book_id, updated_author_ids)
+    reviews = await _fetch_reviews(db, book_id)
     affected_author_ids = previous_author_ids | updated_author_ids
     await db.commit()
-    await db.refresh(old_book)
     for aid in affected_author_ids:
         await invalidate_author(aid, r, book_ids=[book_id])
     await invalidate_book(book_id, r)
     await bump_cache_version("books:list", r)
-    return old_book
+    await index_entries(r, "books", [(book_id, row.title)])
+    await add_popularity(
+        r, "authors", link_deltas(previous_author_ids, updated_author_ids)
+    )
+    await publish_book_changes(r, [book_id])
+    await move_book(r, book_id, row.previous_genre, row.genre_name)
+    return json_response(
+        dump(BookDetailRead, {**row._asdict(), "authors": authors, "reviews": reviews})
+    )
 
 
 @router.put("/{book_id}/authors", response_model=BookDetailRead)
@@ -389,38 +860,26 @@ async def update_author_list(
     db: AsyncSession = Depends(get_async_db),
     r: Redis | None = Depends(get_redis),
 ):
-    stat_book = (
-        select(Book)
-        .options(selectinload(Book.authors))
-        .options(selectinload(Book.reviews))
-        .where(Book.id == book_id)
-    )
-    book = (await db.execute(stat_book)).scalar_one_or_none()
-    if not book:
+    stmt = select(*BOOK_COLUMNS).where(Book.id == book_id)
+    row = (await db.execute(stmt)).one_or_none()
+    if not row:
         raise HTTPException(status_code=404, detail="Cant find the book")
-    previous_author_ids = {a.id for a in book.authors}
-    if not new_author_list:
-        author_ids: set[int] = set()
-        book.authors = []
-    else:
-        author_ids = set(new_author_list)
-        stmt_authors = select(Author).where(Author.id.in_(author_ids))
-        authors = (await db.execute(stmt_authors)).scalars().all()
-
-        if len(author_ids) != len(authors):
-            raise HTTPException(
-                status_code=400, detail="At least one author id does not exist."
-            )
 
-        book.authors = list(authors)
+    authors = await _fetch_authors(db, set(new_author_list))
+    author_ids = {a["id"] for a in authors}
+    previous_author_ids = await _relink_book_authors(db, book_id, author_ids)
+    reviews = await _fetch_reviews(db, book_id)
     affected_author_ids = previous_author_ids | author_ids
     await db.commit()
-    await db.refresh(book)
     for aid in affected_author_ids:
         await invalidate_author(aid, r, book_ids=[book_id])
     await invalidate_book(book_id, r)
     await bump_cache_version("books:list", r)
-    return book
+    await add_popularity(r, "authors", link_deltas(previous_author_ids, author_ids))
+    await publish_book_changes(r, [book_id])
+    return json_response(
+        dump(BookDetailRead, {**row._asdict(), "authors": authors, "reviews": reviews})
+    )
 
 
 @router.patch("/{book_id}", response_model=BookDetailRead)
@@ -430,26 +889,30 @@ async def update_book(
     db: AsyncSession = Depends(get_async_db),
     r: Redis | None = Depends(get_redis),
 ):
-    stat = (
-        select(Book)
-        .options(selectinload(Book.authors))
-        .options(selectinload(Book.reviews))
-        .where(Book.id == book_id)
-    )
-    old_book = (await db.execute(stat)).scalar_one_or_none()
+    update_data = new_book.model_dump(exclude_unset=True)
+    if update_data:
+        stmt = _update_book_stmt(book_id, update_data)
+    else:
+        stmt = select(*BOOK_COLUMNS).where(Book.id == book_id)
+    row = (await db.execute(stmt)).one_or_none()
 
-    if not old_book:
+    if not row:
         raise HTTPException(status_code=404, detail="Book not found")
 
-    update_data = new_book.model_dump(exclude_unset=True)
-    for key, val in update_data.items():
-        setattr(old_book, key, val)
-
+    authors = (await _authors_for_books(db, [book_id]))[book_id]
+    reviews = await _fetch_reviews(db, book_id)
     await db.commit()
-    await db.refresh(old_book)
     await invalidate_book(book_id, r)
     await bump_cache_version("books:list", r)
-    return old_book
+    if "title" in update_data:
+        await index_entries(r, "books", [(book_id, row.title)])
+    if update_data:
+        await publish_book_changes(r, [book_id])
+    if "genre_name" in update_data:
+        await move_book(r, book_id, row.previous_genre, row.genre_name)
+    return json_response(
+        dump(BookDetailRead, {**row._asdict(), "authors": authors, "reviews": reviews})
+    )
 
 
 @router.delete("/{book_id}", status_code=204)
@@ -458,17 +921,25 @@ async def delete_book(
     db: AsyncSession = Depends(get_async_db),
     r: Redis | None = Depends(get_redis),
 ):
-    stat = select(Book).options(selectinload(Book.authors)).where(Book.id == book_id)
-
-    old_book = (await db.execute(stat)).scalar_one_or_none()
+    # links first: the FK cascade would otherwise drop the author ids we need
+    author_ids = await _relink_book_authors(db, book_id, set())
+    stmt = (
+        delete(Book)
+        .where(Book.id == book_id)
+        .returning(Book.id, Book.genre_name)
+        .execution_options(synchronize_session=False)
+    )
+    deleted = (await db.execute(stmt)).one_or_none()
 
-    if not old_book:
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Book not found")
 
-    author_ids = [author.id for author in old_book.authors]
-    await db.delete(old_book)
     await db.commit()
     for aid in author_ids:
         await invalidate_author(aid, r, book_ids=[book_id])
     await invalidate_book(book_id, r)
     await bump_cache_version("books:list", r)
+    await remove_entries(r, "books", [book_id])
+    await add_popularity(r, "authors", {aid: -1 for aid in author_ids})
+    await publish_book_changes(r, [book_id])
+    await drop_book(r, book_id, deleted.genre_name)
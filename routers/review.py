@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from sqlalchemy import delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
-from models import Review
+from models import Book, Review
 from database import get_async_db
 from cache import Redis, get_redis, invalidate_book
+from search.leaderboard import record_review
+from search.suggest import add_popularity
 
 router = APIRouter(prefix="/reviews", tags=["reviews"])
 
@@ -16,12 +17,25 @@ async def delete_review(
     r: Redis = Depends(get_redis),
 ):
     stat = (
-        select(Review).options(selectinload(Review.book)).where(Review.id == review_id)
+        delete(Review)
+        .where(Review.id == review_id)
+        .returning(
+            Review.book_id,
+            Review.rating,
+            Review.created_at,
+            select(Book.genre_name)
+            .where(Book.id == Review.book_id)
+            .scalar_subquery()
+            .label("genre_name"),
+        )
+        .execution_options(synchronize_session=False)
     )
-    review = (await db.execute(stat)).scalar_one_or_none()
-    if not review:
+    row = (await db.execute(stat)).one_or_none()
+    if row is None:
         raise HTTPException(status_code=404, detail="Review not found")
-    book_id = review.book.id
-    await db.delete(review)
     await db.commit()
-    await invalidate_book(book_id, r)
+    await invalidate_book(row.book_id, r, keep_author_link=True)
+    await add_popularity(r, "books", {row.book_id: -1})
+    await record_review(
+        r, row.book_id, row.genre_name, row.rating, row.created_at, sign=-1
+    )
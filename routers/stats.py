@@ -0,0 +1,20 @@
+from fastapi import APIRouter, HTTPException
+
+from cache import get_stats_body
+from helpers.responses import json_response
+from schemas.stats import CatalogStats
+
+router = APIRouter(tags=["stats"])
+
+
+@router.get("/stats", response_model=CatalogStats)
+async def get_catalog_stats():
+    """Catalog statistics precomputed by the compute_stats task (one Redis GET)."""
+    body = await get_stats_body()
+    if body is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Statistics have not been computed yet",
+            headers={"Retry-After": "60"},
+        )
+    return json_response(body)
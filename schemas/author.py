@@ -21,4 +21,12 @@ class AuthorRead(BaseModel):
         from_attributes = True
 
 class AuthorDetailedRead(AuthorRead):
-    books: List[BookBase] = Field(default_factory=list)
\ No newline at end of file
+    books: List[BookBase] = Field(default_factory=list)
+
+class PaginatedAuthors(BaseModel):
+    items: List[AuthorRead]
+    next_cursor: str | None = None
+
+class AuthorSuggestion(BaseModel):
+    id: int
+    name: str
\ No newline at end of file
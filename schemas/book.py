@@ -1,6 +1,6 @@
 from typing import List
 from pydantic import BaseModel, Field
-from .shared import ReviewBase, AuthorBase
+from .shared import ReviewBase, AuthorBase, BookBase
 from enum import Enum
 
 class SortField(str, Enum):
@@ -12,6 +12,15 @@ class SortDirection(str, Enum):
     asc = "asc"
     desc = "desc"
 
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+class TopWindow(str, Enum):
+    all_time = "all"
+    month = "30d"
+    week = "7d"
+
 class BookSortControl(BaseModel):
     sort_field : SortField | None
     sort_direction : SortDirection | None
@@ -48,4 +57,15 @@ class BookDetailRead(BookListRead):
 
 class PaginatedBooks(BaseModel):
     items: List[BookListRead]
-    next_cursor: str | None = None
\ No newline at end of file
+    next_cursor: str | None = None
+
+class BookSuggestion(BaseModel):
+    id: int
+    title: str
+
+class SimilarBook(BookBase):
+    score: float
+
+class TopBook(BookBase):
+    rating: float
+    reviews: int
\ No newline at end of file
@@ -0,0 +1,25 @@
+from datetime import date, datetime
+from typing import List
+from pydantic import BaseModel
+
+class AuthorBookCount(BaseModel):
+    id: int
+    name: str
+    books: int
+
+class ReviewVelocity(BaseModel):
+    last_7d: int
+    last_30d: int
+    per_day: dict[date, int]
+
+class CatalogStats(BaseModel):
+    computed_at: datetime
+    full_run_at: datetime
+    books: int
+    reviews: int
+    books_per_genre: dict[str, int]
+    books_per_year: dict[int, int]
+    top_authors: List[AuthorBookCount]
+    rating_distribution: dict[int, int]
+    average_rating: float | None
+    review_velocity: ReviewVelocity
\ No newline at end of file
@@ -0,0 +1,34 @@
+"""
+Rebuild the Redis top-rated leaderboards (GET /books/top) from the reviews
+table. The API maintains them incrementally; run this once after deploying,
+after a Redis flush, or to correct drift.
+
+Usage:
+    python scripts/rebuild_leaderboards.py
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import close_redis, init_redis  # noqa: E402
+from database import AsyncSessionLocal, get_async_engine  # noqa: E402
+from search.leaderboard import rebuild  # noqa: E402
+
+
+async def main() -> None:
+    r = await init_redis()
+    try:
+        async with AsyncSessionLocal(bind=get_async_engine()) as db:
+            counts = await rebuild(db, r)
+    finally:
+        await close_redis()
+        await get_async_engine().dispose()
+    for window, count in counts.items():
+        print(f"{window}: ranked {count} books")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,34 @@
+"""
+Rebuild the Redis typeahead indexes (GET /books/suggest, /authors/suggest)
+from a database snapshot. The API maintains them incrementally; run this once
+after deploying, after a Redis flush, or to correct drift.
+
+Usage:
+    python scripts/rebuild_suggest_index.py
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import close_redis, init_redis  # noqa: E402
+from database import AsyncSessionLocal, get_async_engine  # noqa: E402
+from search.suggest import rebuild  # noqa: E402
+
+
+async def main() -> None:
+    r = await init_redis()
+    try:
+        async with AsyncSessionLocal(bind=get_async_engine()) as db:
+            counts = await rebuild(db, r)
+    finally:
+        await close_redis()
+        await get_async_engine().dispose()
+    for kind, count in counts.items():
+        print(f"indexed {count} {kind}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
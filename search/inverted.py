@@ -0,0 +1,346 @@
+"""
+In-process search backend (SEARCH_BACKEND=memory): an inverted index over
+title, genre, description and author names that answers `GET /books?q=`
+without touching Postgres.
+
+- Postings are numpy arrays (doc numbers, weighted term frequencies) grouped
+  in segments: one base segment from the startup snapshot, plus small segments
+  appended as books change. Deleted or replaced docs are tombstoned.
+- Scoring is BM25 over field-weighted term frequencies, accumulated for all
+  query terms in one vectorized pass.
+- Query terms missing from the vocabulary are expanded to vocabulary terms
+  with similar trigrams (the pg_trgm measure), weighted by that similarity.
+- Writes publish changed book ids on a Redis channel; every API process
+  re-reads those books and updates its index. A full rebuild runs every
+  SEARCH_INDEX_REBUILD_SECONDS to bound drift from missed messages.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Iterable
+
+import numpy as np
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import Redis
+from dependencies import STOPWORDS
+from models import Author, Book, author_book_relation
+from search.suggest import normalize
+
+logger = logging.getLogger(__name__)
+
+# "sql" (Postgres FTS + trigram) or "memory" (this module)
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "sql")
+SEARCH_INDEX_REBUILD_SECONDS = int(os.getenv("SEARCH_INDEX_REBUILD_SECONDS", "3600"))
+CHANGES_CHANNEL = "search:books:changed"
+
+FIELD_WEIGHTS = {"title": 3.0, "authors": 2.0, "genre_name": 1.5, "description": 1.0}
+K1 = 1.2
+B = 0.75
+FUZZY_THRESHOLD = 0.4
+FUZZY_EXPANSIONS = 3
+MAX_SEGMENTS = 8
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str | None) -> list[str]:
+    if not text:
+        return []
+    return [t for t in _TOKEN.findall(normalize(text)) if t not in STOPWORDS]
+
+
+def trigrams(term: str) -> set[str]:
+    padded = f"  {term} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def doc_terms(item: dict) -> Counter:
+    tf: Counter = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        if field == "authors":
+            text = " ".join(a["name"] for a in item["authors"])
+        else:
+            text = item.get(field)
+        for term in tokenize(text):
+            tf[term] += weight
+    return tf
+
+
+class InvertedIndex:
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.doc_len = np.empty(0, dtype=np.float32)
+        self.alive = np.empty(0, dtype=bool)
+        self.year = np.empty(0, dtype=np.float64)  # NaN when unknown
+        self.doc_of: dict[int, int] = {}  # book id -> live doc number
+        self.terms_of: dict[int, tuple[str, ...]] = {}  # book id -> its terms
+        self.items: dict[int, bytes] = {}  # book id -> BookListRead JSON
+        self.author_docs: dict[int, list[int]] = defaultdict(list)
+        self.segments: list[dict[str, tuple[np.ndarray, np.ndarray]]] = []
+        self.df: Counter = Counter()
+        self.by_trigram: dict[str, set[str]] = defaultdict(set)
+        self.live_len = 0.0
+
+    @property
+    def size(self) -> int:
+        return len(self.doc_of)
+
+    def upsert(self, items: Iterable[dict]) -> None:
+        """Index (or re-index) books given as BookListRead-shaped dicts."""
+        items = list(items)
+        if not items:
+            return
+        self.remove(item["id"] for item in items)
+
+        base = len(self.ids)
+        postings: dict[str, tuple[list[int], list[float]]] = {}
+        lengths, years = [], []
+        for n, item in enumerate(items):
+            doc = base + n
+            tf = doc_terms(item)
+            for term, freq in tf.items():
+                docs, freqs = postings.setdefault(term, ([], []))
+                docs.append(doc)
+                freqs.append(freq)
+            lengths.append(sum(tf.values()))
+            self.terms_of[item["id"]] = tuple(tf)
+            years.append(item["year"] if item["year"] is not None else np.nan)
+            self.doc_of[item["id"]] = doc
+            self.items[item["id"]] = json.dumps(item, separators=(",", ":")).encode()
+            for author in item["authors"]:
+                self.author_docs[author["id"]].append(doc)
+
+        for term, (docs, freqs) in postings.items():
+            if term not in self.df:
+                for gram in trigrams(term):
+                    self.by_trigram[gram].add(term)
+            self.df[term] += len(docs)
+        self.segments.append(
+            {
+                term: (np.asarray(docs, np.int32), np.asarray(freqs, np.float32))
+                for term, (docs, freqs) in postings.items()
+            }
+        )
+        self.ids = np.concatenate([self.ids, [item["id"] for item in items]])
+        self.doc_len = np.concatenate([self.doc_len, np.asarray(lengths, np.float32)])
+        self.alive = np.concatenate([self.alive, np.ones(len(items), dtype=bool)])
+        self.year = np.concatenate([self.year, np.asarray(years, np.float64)])
+        self.live_len += float(sum(lengths))
+        if len(self.segments) > MAX_SEGMENTS:
+            self._merge_tail()
+
+    def remove(self, book_ids: Iterable[int]) -> None:
+        for book_id in book_ids:
+            doc = self.doc_of.pop(book_id, None)
+            if doc is not None:
+                self.alive[doc] = False
+                self.live_len -= float(self.doc_len[doc])
+                self.items.pop(book_id, None)
+                self._forget_terms(self.terms_of.pop(book_id, ()))
+
+    def _forget_terms(self, terms: Iterable[str]) -> None:
+        # a term no live doc has leaves the vocabulary, so fuzzy expansion
+        # stops offering it
+        for term in terms:
+            self.df[term] -= 1
+            if self.df[term] > 0:
+                continue
+            del self.df[term]
+            for gram in trigrams(term):
+                similar = self.by_trigram[gram]
+                similar.discard(term)
+                if not similar:
+                    del self.by_trigram[gram]
+
+    def _merge_tail(self) -> None:
+        # fold every incremental segment into one; the base segment is only
+        # replaced by a full rebuild
+        base, *tail = self.segments
+        merged: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        for term in set().union(*tail):
+            parts = [seg[term] for seg in tail if term in seg]
+            docs = np.concatenate([p[0] for p in parts])
+            freqs = np.concatenate([p[1] for p in parts])
+            keep = self.alive[docs]
+            if keep.any():
+                merged[term] = (docs[keep], freqs[keep])
+        self.segments = [base, merged]
+
+    def _expand(self, term: str) -> list[tuple[str, float]]:
+        if term in self.df:
+            return [(term, 1.0)]
+        grams = trigrams(term)
+        shared: Counter = Counter()
+        for gram in grams:
+            shared.update(self.by_trigram.get(gram, ()))
+        scored = []
+        for candidate, count in shared.items():
+            sim = count / (len(grams) + len(trigrams(candidate)) - count)
+            if sim >= FUZZY_THRESHOLD:
+                scored.append((sim, candidate))
+        scored.sort(reverse=True)
+        return [(candidate, sim) for sim, candidate in scored[:FUZZY_EXPANSIONS]]
+
+    def search(
+        self,
+        q: str,
+        author_id: int | None = None,
+        before: int | None = None,
+        after: int | None = None,
+        cursor: tuple[float, int] | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Matching book ids ordered by (BM25 score desc, id asc) with their
+        scores, past the keyset `cursor` = (score, id) when given.
+        """
+        n_docs = self.size
+        empty = np.empty(0, dtype=np.int64), np.empty(0)
+        if not n_docs:
+            return empty
+        avgdl = self.live_len / n_docs
+
+        doc_parts, score_parts = [], []
+        for query_term in dict.fromkeys(tokenize(q)):
+            for term, weight in self._expand(query_term):
+                df = self.df[term]
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for segment in self.segments:
+                    if term not in segment:
+                        continue
+                    docs, tf = segment[term]
+                    norm = K1 * (1 - B + B * self.doc_len[docs] / avgdl)
+                    doc_parts.append(docs)
+                    score_parts.append(weight * idf * tf * (K1 + 1) / (tf + norm))
+        if not doc_parts:
+            return empty
+
+        docs, inverse = np.unique(np.concatenate(doc_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+        keep = self.alive[docs]
+        if author_id:
+            keep &= np.isin(docs, self.author_docs.get(author_id, []))
+        if before:
+            keep &= self.year[docs] <= before
+        if after:
+            keep &= self.year[docs] >= after
+        ids, scores = self.ids[docs[keep]], scores[keep]
+
+        order = np.lexsort((ids, -scores))
+        ids, scores = ids[order], scores[order]
+        if cursor is not None:
+            last_score, last_id = cursor
+            past = (scores < last_score) | ((scores == last_score) & (ids > last_id))
+            ids, scores = ids[past], scores[past]
+        return ids, scores
+
+    def get_items(self, book_ids: Iterable[int]) -> list[dict]:
+        return [json.loads(self.items[book_id]) for book_id in book_ids]
+
+
+_index: InvertedIndex | None = None
+
+
+def get_index() -> InvertedIndex | None:
+    """The live index when the memory backend is enabled and built."""
+    return _index if SEARCH_BACKEND == "memory" else None
+
+
+def _books_stmt() -> Select:
+    return select(
+        Book.id,
+        Book.title,
+        Book.year,
+        Book.book_isbn,
+        Book.genre_name,
+        Book.description,
+    ).order_by(Book.id)
+
+
+async def _load_items(db: AsyncSession, stmt: Select) -> list[dict]:
+    items = [row._asdict() for row in (await db.execute(stmt)).all()]
+    if not items:
+        return items
+    by_id = {item["id"]: item for item in items}
+    for item in items:
+        item["authors"] = []
+    links = (
+        select(author_book_relation.c.book_id, Author.id, Author.name, Author.email)
+        .join(Author, Author.id == author_book_relation.c.author_id)
+        .where(author_book_relation.c.book_id.in_(list(by_id)))
+        .order_by(author_book_relation.c.book_id, Author.id)
+    )
+    for book_id, author_id, name, email in (await db.execute(links)).all():
+        by_id[book_id]["authors"].append(
+            {"id": author_id, "name": name, "email": email}
+        )
+    return items
+
+
+async def build_index(db: AsyncSession, batch_size: int = 5000) -> InvertedIndex:
+    """Snapshot every book into a fresh index (keyset batches, one segment)."""
+    items: list[dict] = []
+    last_id = 0
+    while True:
+        stmt = _books_stmt().where(Book.id > last_id).limit(batch_size)
+        batch = await _load_items(db, stmt)
+        if not batch:
+            break
+        items += batch
+        last_id = batch[-1]["id"]
+    index = InvertedIndex()
+    # tokenizing is CPU-bound; keep the event loop serving requests meanwhile
+    await asyncio.to_thread(index.upsert, items)
+    return index
+
+
+async def apply_changes(db: AsyncSession, index: InvertedIndex, book_ids: list[int]):
+    items = await _load_items(db, _books_stmt().where(Book.id.in_(book_ids)))
+    index.upsert(items)
+    found = {item["id"] for item in items}
+    index.remove(book_id for book_id in book_ids if book_id not in found)
+
+
+async def publish_book_changes(r: Redis, book_ids: Iterable[int]) -> None:
+    """Tell every process's index to re-read these books (no-op on the sql backend)."""
+    book_ids = sorted(set(book_ids))
+    if SEARCH_BACKEND == "memory" and book_ids:
+        await r.publish(CHANGES_CHANNEL, json.dumps(book_ids))
+
+
+async def run_index(session_factory, r: Redis) -> None:
+    """
+    Background task: build the index, then apply change events and rebuild
+    periodically. Subscribes before building so no change is missed.
+    """
+    global _index
+    pubsub = r.pubsub()
+    await pubsub.subscribe(CHANGES_CHANNEL)
+    try:
+        while True:
+            try:
+                async with session_factory() as db:
+                    _index = await build_index(db)
+                logger.info("search index built: %d books", _index.size)
+            except Exception:
+                logger.exception("search index build failed")
+            deadline = asyncio.get_running_loop().time() + SEARCH_INDEX_REBUILD_SECONDS
+            while (remaining := deadline - asyncio.get_running_loop().time()) > 0:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=min(remaining, 5.0)
+                )
+                if message is None or _index is None:
+                    continue
+                try:
+                    async with session_factory() as db:
+                        await apply_changes(db, _index, json.loads(message["data"]))
+                except Exception:
+                    logger.exception("search index update failed")
+    finally:
+        await pubsub.aclose()
@@ -0,0 +1,247 @@
+"""
+Top-rated leaderboards in Redis, per time window and genre, kept current by
+review writes so reads never touch the `reviews` table.
+
+- `top:{window}:{genre}:stats`: hash with `n:{book id}` (review count) and
+  `s:{book id}` (rating sum). `genre` is the normalized genre name, or `*`
+  for the board over every book.
+- `top:{window}:{genre}`: zset book id -> Bayesian average
+  (TOP_PRIOR_COUNT * TOP_PRIOR_MEAN + sum) / (TOP_PRIOR_COUNT + n), so a book
+  with a couple of 5s does not outrank one with hundreds of 4.8s.
+- `top:cutoffs`: hash window -> epoch seconds; reviews created at or before it
+  have been subtracted from that window's boards (tasks.analytics.
+  expire_leaderboards advances it).
+
+{window} is a hash tag: all boards of a window share a cluster slot, so a
+genre move is one script call.
+"""
+
+import os
+import time
+from datetime import datetime, timezone
+from typing import Iterable
+
+from sqlalchemy import Select, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import Redis
+from models import Book, Review
+from search.suggest import normalize
+
+TOP_PRIOR_MEAN = float(os.getenv("TOP_PRIOR_MEAN", "3.0"))
+TOP_PRIOR_COUNT = float(os.getenv("TOP_PRIOR_COUNT", "5"))
+# window -> length in seconds (None: all time)
+WINDOWS = {"all": None, "30d": 30 * 24 * 3600, "7d": 7 * 24 * 3600}
+ALL_GENRES = "*"
+CUTOFFS_KEY = "top:cutoffs"
+
+
+def board_key(window: str, genre: str) -> str:
+    return f"top:{{{window}}}:{genre}"
+
+
+def stats_key(window: str, genre: str) -> str:
+    return f"top:{{{window}}}:{genre}:stats"
+
+
+def genre_board(genre_name: str | None) -> str | None:
+    return normalize(genre_name or "") or None
+
+
+# KEYS: (stats, board) pairs; ARGV: book id, prior mean, prior count, then a
+# (count delta, sum delta) per pair
+ADJUST_SCRIPT = """
+local id, mean, prior = ARGV[1], tonumber(ARGV[2]), tonumber(ARGV[3])
+for i = 1, #KEYS, 2 do
+    local n = redis.call('HINCRBY', KEYS[i], 'n:' .. id, ARGV[3 + i])
+    local s = redis.call('HINCRBY', KEYS[i], 's:' .. id, ARGV[4 + i])
+    if n <= 0 then
+        redis.call('HDEL', KEYS[i], 'n:' .. id, 's:' .. id)
+        redis.call('ZREM', KEYS[i + 1], id)
+    else
+        redis.call('ZADD', KEYS[i + 1], (prior * mean + s) / (prior + n), id)
+    end
+end
+"""
+_adjust_script = None
+
+
+def adjust_calls(
+    window: str, book_id: int, deltas: Iterable[tuple[str, int, int]]
+) -> tuple[list[str], list]:
+    """Script keys and args applying (genre, count delta, sum delta) to one book."""
+    keys, args = [], [book_id, TOP_PRIOR_MEAN, TOP_PRIOR_COUNT]
+    for genre, dn, ds in deltas:
+        keys += [stats_key(window, genre), board_key(window, genre)]
+        args += [dn, ds]
+    return keys, args
+
+
+def review_deltas(genre_name: str | None, n: int, total: int) -> list:
+    genre = genre_board(genre_name)
+    deltas = [(ALL_GENRES, n, total)]
+    if genre:
+        deltas.append((genre, n, total))
+    return deltas
+
+
+def in_window(window: str, created_at: float, cutoffs: dict, now: float) -> bool:
+    """Whether a review created at `created_at` is still counted by `window`."""
+    if WINDOWS[window] is None:
+        return True
+    cutoff = cutoffs.get(window)
+    return created_at > (float(cutoff) if cutoff else now - WINDOWS[window])
+
+
+async def _adjust(r: Redis, calls: list[tuple[list[str], list]]) -> None:
+    global _adjust_script
+    if not calls:
+        return
+    if _adjust_script is None:
+        _adjust_script = r.register_script(ADJUST_SCRIPT)
+    async with r.pipeline(transaction=False) as pipe:
+        for keys, args in calls:
+            await _adjust_script(keys=keys, args=args, client=pipe)
+        await pipe.execute()
+
+
+async def record_review(
+    r: Redis,
+    book_id: int,
+    genre_name: str | None,
+    rating: int,
+    created_at: datetime,
+    sign: int = 1,
+) -> None:
+    """Add (sign=1) or remove (sign=-1) a review from every board counting it."""
+    cutoffs = await r.hgetall(CUTOFFS_KEY) if sign < 0 else {}
+    now = time.time()
+    calls = [
+        adjust_calls(window, book_id, review_deltas(genre_name, sign, sign * rating))
+        for window in WINDOWS
+        if in_window(window, created_at.timestamp(), cutoffs, now)
+    ]
+    await _adjust(r, calls)
+
+
+async def move_book(
+    r: Redis, book_id: int, old_genre: str | None, new_genre: str | None
+) -> None:
+    """Carry a book's tallies over to the board of its new genre."""
+    old, new = genre_board(old_genre), genre_board(new_genre)
+    if old == new:
+        return
+    # every review is on the overall board too, which holds the same tallies
+    async with r.pipeline(transaction=False) as pipe:
+        for window in WINDOWS:
+            pipe.hmget(stats_key(window, ALL_GENRES), f"n:{book_id}", f"s:{book_id}")
+        tallies = await pipe.execute()
+    calls = []
+    for window, (n, total) in zip(WINDOWS, tallies):
+        if not n:
+            continue
+        deltas = []
+        if old:
+            deltas.append((old, -int(n), -int(total)))
+        if new:
+            deltas.append((new, int(n), int(total)))
+        calls.append(adjust_calls(window, book_id, deltas))
+    await _adjust(r, calls)
+
+
+async def drop_book(r: Redis, book_id: int, genre_name: str | None) -> None:
+    genre = genre_board(genre_name)
+    async with r.pipeline(transaction=False) as pipe:
+        for window in WINDOWS:
+            for board in (ALL_GENRES, genre) if genre else (ALL_GENRES,):
+                pipe.zrem(board_key(window, board), book_id)
+                pipe.hdel(stats_key(window, board), f"n:{book_id}", f"s:{book_id}")
+        await pipe.execute()
+
+
+async def top(
+    r: Redis, window: str, genre_name: str | None, limit: int
+) -> list[tuple[int, float, int]]:
+    """(book id, Bayesian rating, review count), best first."""
+    genre = genre_board(genre_name) or ALL_GENRES
+    ranked = await r.zrevrange(board_key(window, genre), 0, limit - 1, withscores=True)
+    if not ranked:
+        return []
+    counts = await r.hmget(stats_key(window, genre), [f"n:{i}" for i, _ in ranked])
+    return [
+        (int(book_id), score, int(n or 0))
+        for (book_id, score), n in zip(ranked, counts)
+    ]
+
+
+def tallies_stmt(
+    since: datetime | None = None, until: datetime | None = None
+) -> Select:
+    """Review count and rating sum per book (with its genre) in (since, until]."""
+    stmt = (
+        select(
+            Review.book_id,
+            Book.genre_name,
+            func.count().label("n"),
+            func.sum(Review.rating).label("total"),
+        )
+        .join(Book, Book.id == Review.book_id)
+        .group_by(Review.book_id, Book.genre_name)
+    )
+    if since is not None:
+        stmt = stmt.where(Review.created_at > since)
+    if until is not None:
+        stmt = stmt.where(Review.created_at <= until)
+    return stmt
+
+
+async def rebuild(db: AsyncSession, r: Redis, batch_size: int = 5000) -> dict[str, int]:
+    """
+    Recompute every board from the reviews table into temporary keys, then
+    swap them in with RENAME (bootstrap, and repair after a Redis flush).
+    """
+    now = time.time()
+    counts = {}
+    for window, seconds in WINDOWS.items():
+        since = datetime.fromtimestamp(now - seconds, timezone.utc) if seconds else None
+        suffix = ":rebuild"
+        written: set[str] = set()
+        stale = {key async for key in r.scan_iter(match=board_key(window, "*"))}
+        counts[window] = 0
+        result = await db.stream(
+            tallies_stmt(since).execution_options(yield_per=batch_size)
+        )
+        async for partition in result.partitions():
+            async with r.pipeline(transaction=False) as pipe:
+                for book_id, genre_name, n, total in partition:
+                    for genre, dn, ds in review_deltas(genre_name, n, total):
+                        board, stats = board_key(window, genre), stats_key(
+                            window, genre
+                        )
+                        if board not in written:
+                            pipe.delete(board + suffix, stats + suffix)
+                            written.add(board)
+                        score = (TOP_PRIOR_COUNT * TOP_PRIOR_MEAN + ds) / (
+                            TOP_PRIOR_COUNT + dn
+                        )
+                        pipe.zadd(board + suffix, {book_id: score})
+                        pipe.hset(
+                            stats + suffix,
+                            mapping={f"n:{book_id}": dn, f"s:{book_id}": ds},
+                        )
+                await pipe.execute()
+            counts[window] += len(partition)
+
+        async with r.pipeline(transaction=True) as pipe:
+            for key in stale:
+                if key.endswith(":stats") or key.endswith(suffix):
+                    continue
+                if key not in written:
+                    pipe.delete(key, key + ":stats")
+            for board in written:
+                pipe.rename(board + suffix, board)
+                pipe.rename(board + ":stats" + suffix, board + ":stats")
+            if seconds:
+                pipe.hset(CUTOFFS_KEY, window, now - seconds)
+            await pipe.execute()
+    return counts
@@ -0,0 +1,56 @@
+"""
+Two-phase book search, second phase: the database returns per-candidate
+features for every index match, and the weighted score, ordering and keyset
+paging happen here in one vectorized pass. Terms with more than
+SEARCH_CANDIDATES matches are ranked in SQL instead.
+"""
+
+import os
+from typing import NamedTuple, Sequence
+
+import numpy as np
+
+
+class SearchWeights(NamedTuple):
+    fts: float
+    title: float
+    author: float
+
+
+def load_weights(raw: str | None = None) -> SearchWeights:
+    """Parse `fts,title,author` weights (SEARCH_WEIGHTS, default 0.6,0.25,0.15)."""
+    raw = raw if raw is not None else os.getenv("SEARCH_WEIGHTS", "0.6,0.25,0.15")
+    parts = [float(part) for part in raw.split(",")]
+    if len(parts) != 3:
+        raise ValueError("SEARCH_WEIGHTS must be three numbers: fts,title,author")
+    return SearchWeights(*parts)
+
+
+WEIGHTS = load_weights()
+# "sql" ranks every match in Postgres; "two_phase" ranks them here, up to
+# SEARCH_CANDIDATES matches
+SEARCH_MODE = os.getenv("SEARCH_MODE", "sql")
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", "1000"))
+
+
+def rerank(
+    ids: Sequence[int],
+    features: Sequence[Sequence[float]],
+    weights: SearchWeights = WEIGHTS,
+    after: tuple[float, int] | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Candidate ids ordered by (score desc, id asc) and their scores, keeping only
+    rows past the keyset `after` = (score, id) when given.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    if not len(ids):
+        return ids, np.empty(0)
+    scores = np.asarray(features, dtype=np.float64) @ np.asarray(weights)
+    order = np.lexsort((ids, -scores))
+    ids, scores = ids[order], scores[order]
+    if after is not None:
+        last_score, last_id = after
+        keep = (scores < last_score) | ((scores == last_score) & (ids > last_id))
+        ids, scores = ids[keep], scores[keep]
+    return ids, scores
@@ -0,0 +1,79 @@
+"""
+"Similar books" vectors: hashed TF-IDF over title, genre, description and
+author names (the field-weighted terms of the search index), folded into a
+compact float32 matrix with one L2-normalized row per book, so cosine
+similarity is a plain dot product.
+
+Neighbours are computed offline (tasks.recommend) for every book at once,
+in row blocks sized to keep the (block x books) similarity matrix bounded.
+"""
+
+import math
+import os
+import zlib
+from collections import Counter
+
+import numpy as np
+
+SIMILAR_DIM = int(os.getenv("SIMILAR_DIM", "512"))
+SIMILAR_NEIGHBOURS = int(os.getenv("SIMILAR_NEIGHBOURS", "20"))
+SIMILAR_BLOCK_BYTES = int(os.getenv("SIMILAR_BLOCK_BYTES", str(256 * 1024 * 1024)))
+
+
+def _bucket(term: str, dim: int) -> tuple[int, float]:
+    # crc32 rather than hash(): stable across processes; the top bit picks a
+    # sign so colliding terms cancel out on average instead of piling up
+    h = zlib.crc32(term.encode())
+    return h % dim, 1.0 if h & 0x80000000 else -1.0
+
+
+def build_vectors(docs: list[Counter], dim: int = SIMILAR_DIM) -> np.ndarray:
+    """One L2-normalized float32 row per doc (term -> weighted frequency)."""
+    n_docs = len(docs)
+    df: Counter = Counter()
+    for tf in docs:
+        df.update(tf.keys())
+    idf = {term: math.log((1 + n_docs) / (1 + n)) + 1 for term, n in df.items()}
+    buckets = {term: _bucket(term, dim) for term in df}
+
+    rows, cols, vals = [], [], []
+    for row, tf in enumerate(docs):
+        for term, freq in tf.items():
+            col, sign = buckets[term]
+            rows.append(row)
+            cols.append(col)
+            vals.append(sign * (1 + math.log(freq)) * idf[term])
+
+    matrix = np.zeros((n_docs, dim), dtype=np.float32)
+    np.add.at(matrix, (rows, cols), vals)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def nearest(
+    matrix: np.ndarray,
+    k: int = SIMILAR_NEIGHBOURS,
+    block_bytes: int = SIMILAR_BLOCK_BYTES,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Row numbers and cosine scores of each row's `k` most similar other rows,
+    best first.
+    """
+    n_docs = len(matrix)
+    k = min(k, n_docs - 1)
+    if k <= 0:
+        return np.empty((n_docs, 0), np.int64), np.empty((n_docs, 0), np.float32)
+    block = max(1, block_bytes // (n_docs * 4))
+    idx = np.empty((n_docs, k), np.int64)
+    scores = np.empty((n_docs, k), np.float32)
+    for start in range(0, n_docs, block):
+        stop = min(start + block, n_docs)
+        sims = matrix[start:stop] @ matrix.T
+        sims[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+        top = np.argpartition(sims, -k, axis=1)[:, -k:]
+        top_scores = np.take_along_axis(sims, top, axis=1)
+        order = np.lexsort((top, -top_scores), axis=1)
+        idx[start:stop] = np.take_along_axis(top, order, axis=1)
+        scores[start:stop] = np.take_along_axis(top_scores, order, axis=1)
+    return idx, scores
@@ -0,0 +1,219 @@
+"""
+Typeahead prefix index in Redis, one per kind ("books", "authors").
+
+- `suggest:{kind}:lex`: zset with every member at score 0, so ZRANGEBYLEX
+  answers prefix scans. Members are `{normalized suffix}\x00{id}`, one per
+  word start of the label, so "lord" finds "The Lord of the Rings".
+- `suggest:{kind}:labels`: hash id -> display label; members are derived
+  from it, which is how an update or delete finds what to remove.
+- `suggest:{kind}:popularity`: zset id -> popularity (reviews for books,
+  linked books for authors) used to rank the prefix matches.
+"""
+
+import os
+import unicodedata
+from typing import Iterable
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import Redis
+from dependencies import STOPWORDS
+from models import Author, Book, Review, author_book_relation
+
+# prefix matches scanned per lookup before ranking by popularity
+SUGGEST_SCAN_LIMIT = int(os.getenv("SUGGEST_SCAN_LIMIT", "500"))
+MAX_WORD_STARTS = 8
+MAX_MEMBER_CHARS = 64
+_LEX_MAX = "\U0010ffff"  # sorts after any UTF-8 encoded character
+
+
+# {kind} is a hash tag: a kind's keys share a cluster slot, so the rebuild can
+# RENAME them and pipelines stay single-slot
+def _lex_key(kind: str) -> str:
+    return f"suggest:{{{kind}}}:lex"
+
+
+def _labels_key(kind: str) -> str:
+    return f"suggest:{{{kind}}}:labels"
+
+
+def _popularity_key(kind: str) -> str:
+    return f"suggest:{{{kind}}}:popularity"
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents and collapse whitespace."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.lower().split())
+
+
+def _members(entry_id: int, label: str) -> list[str]:
+    words = normalize(label).split(" ")
+    members = []
+    for i, word in enumerate(words[:MAX_WORD_STARTS]):
+        if i and word in STOPWORDS:
+            continue
+        suffix = " ".join(words[i:])[:MAX_MEMBER_CHARS]
+        members.append(f"{suffix}\x00{entry_id}")
+    return members
+
+
+async def index_entries(
+    r: Redis, kind: str, entries: Iterable[tuple[int, str]]
+) -> None:
+    """Add or relabel entries, dropping the members of their previous labels."""
+    entries = list(entries)
+    if not entries:
+        return
+    ids = [entry_id for entry_id, _ in entries]
+    previous = await r.hmget(_labels_key(kind), ids)
+    async with r.pipeline(transaction=False) as pipe:
+        for (entry_id, label), old_label in zip(entries, previous):
+            if old_label == label:
+                continue
+            if old_label is not None:
+                pipe.zrem(_lex_key(kind), *_members(entry_id, old_label))
+            pipe.zadd(_lex_key(kind), {m: 0 for m in _members(entry_id, label)})
+            pipe.hset(_labels_key(kind), entry_id, label)
+        await pipe.execute()
+
+
+async def remove_entries(r: Redis, kind: str, ids: Iterable[int]) -> None:
+    ids = list(ids)
+    if not ids:
+        return
+    labels = await r.hmget(_labels_key(kind), ids)
+    async with r.pipeline(transaction=False) as pipe:
+        for entry_id, label in zip(ids, labels):
+            if label is not None:
+                pipe.zrem(_lex_key(kind), *_members(entry_id, label))
+        pipe.hdel(_labels_key(kind), *ids)
+        pipe.zrem(_popularity_key(kind), *ids)
+        await pipe.execute()
+
+
+async def add_popularity(r: Redis, kind: str, deltas: dict[int, float]) -> None:
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas:
+        return
+    async with r.pipeline(transaction=False) as pipe:
+        for entry_id, delta in deltas.items():
+            pipe.zincrby(_popularity_key(kind), delta, entry_id)
+        await pipe.execute()
+
+
+def link_deltas(previous: set[int], current: set[int]) -> dict[int, int]:
+    """Popularity changes for ids gaining (+1) or losing (-1) a link."""
+    return {**{i: -1 for i in previous - current}, **{i: 1 for i in current - previous}}
+
+
+async def set_popularity(r: Redis, kind: str, entry_id: int, value: float) -> None:
+    await r.zadd(_popularity_key(kind), {entry_id: value})
+
+
+# Scan, dedupe, rank and label server-side in one round trip, so only `limit`
+# rows cross the wire instead of every scanned member.
+_SUGGEST_SCRIPT = """
+local members = redis.call('ZRANGEBYLEX', KEYS[1], ARGV[1], ARGV[2], 'LIMIT', 0, ARGV[3])
+local seen, ids = {}, {}
+for _, member in ipairs(members) do
+    local id = string.match(member, '%z(%d+)$')
+    if id and not seen[id] then
+        seen[id] = true
+        ids[#ids + 1] = id
+    end
+end
+if #ids == 0 then
+    return {}
+end
+local scores = redis.call('ZMSCORE', KEYS[2], unpack(ids))
+local ranked = {}
+for i, id in ipairs(ids) do
+    ranked[i] = {tonumber(scores[i]) or 0, tonumber(id)}
+end
+table.sort(ranked, function(a, b)
+    if a[1] ~= b[1] then return a[1] > b[1] end
+    return a[2] < b[2]
+end)
+local out = {}
+for i = 1, math.min(#ranked, tonumber(ARGV[4])) do
+    local id = ranked[i][2]
+    out[#out + 1] = id
+    out[#out + 1] = redis.call('HGET', KEYS[3], id)
+end
+return out
+"""
+_suggest_script = None
+
+
+async def suggest(r: Redis, kind: str, prefix: str, limit: int) -> list[dict]:
+    """Entries whose label has a word starting with `prefix`, most popular first."""
+    norm = normalize(prefix)
+    if not norm:
+        return []
+    global _suggest_script
+    if _suggest_script is None:
+        _suggest_script = r.register_script(_SUGGEST_SCRIPT)
+    # EVALSHA, loading the script on NOSCRIPT
+    rows = await _suggest_script(
+        keys=[_lex_key(kind), _popularity_key(kind), _labels_key(kind)],
+        args=[f"[{norm}", f"[{norm}{_LEX_MAX}", SUGGEST_SCAN_LIMIT, limit],
+        client=r,
+    )
+    return [
+        {"id": int(entry_id), "label": label}
+        for entry_id, label in zip(rows[::2], rows[1::2])
+        if label
+    ]
+
+
+async def rebuild(db: AsyncSession, r: Redis, batch_size: int = 5000) -> dict[str, int]:
+    """
+    Rebuild both indexes from the database into temporary keys, then swap them
+    in with RENAME so lookups never see a half-built index.
+    """
+    review_counts = (
+        select(Review.book_id, func.count().label("n"))
+        .group_by(Review.book_id)
+        .subquery()
+    )
+    book_counts = (
+        select(author_book_relation.c.author_id, func.count().label("n"))
+        .group_by(author_book_relation.c.author_id)
+        .subquery()
+    )
+    sources = {
+        "books": select(Book.id, Book.title, func.coalesce(review_counts.c.n, 0))
+        .outerjoin(review_counts, review_counts.c.book_id == Book.id)
+        .order_by(Book.id),
+        "authors": select(Author.id, Author.name, func.coalesce(book_counts.c.n, 0))
+        .outerjoin(book_counts, book_counts.c.author_id == Author.id)
+        .order_by(Author.id),
+    }
+
+    counts = {}
+    for kind, stmt in sources.items():
+        keys = [_lex_key(kind), _labels_key(kind), _popularity_key(kind)]
+        tmp = [f"{key}:rebuild" for key in keys]
+        await r.delete(*tmp)
+        counts[kind] = 0
+        result = await db.stream(stmt.execution_options(yield_per=batch_size))
+        async for partition in result.partitions():
+            async with r.pipeline(transaction=False) as pipe:
+                for entry_id, label, popularity in partition:
+                    pipe.zadd(tmp[0], {m: 0 for m in _members(entry_id, label)})
+                    pipe.hset(tmp[1], entry_id, label)
+                    pipe.zadd(tmp[2], {entry_id: popularity})
+                await pipe.execute()
+            counts[kind] += len(partition)
+
+        async with r.pipeline(transaction=True) as pipe:
+            for src, dst in zip(tmp, keys):
+                if counts[kind]:
+                    pipe.rename(src, dst)
+                else:
+                    pipe.delete(dst)
+            await pipe.execute()
+    return counts
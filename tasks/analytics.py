@@ -1,11 +1,210 @@
 """Analytics/statistics tasks."""
+
+import json
+import logging
+import os
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import redis
 from celery import shared_task
+from sqlalchemy import Select, select
+
+from cache import REDIS_URL, STATS_KEY
+from database import get_sync_engine
+from helpers.responses import dump
+from models import Author, Book, Review, author_book_relation
+from schemas.stats import CatalogStats
+from search.leaderboard import (
+    ADJUST_SCRIPT,
+    CUTOFFS_KEY,
+    WINDOWS,
+    adjust_calls,
+    review_deltas,
+    tallies_stmt,
+)
+
+STATS_STATE_KEY = "stats:state"
+STATS_CHUNK_SIZE = int(os.getenv("STATS_CHUNK_SIZE", "5000"))
+STATS_TOP_AUTHORS = int(os.getenv("STATS_TOP_AUTHORS", "20"))
+STATS_VELOCITY_DAYS = 30
+COUNTERS = ("genres", "years", "authors", "ratings", "days")
+
+logger = logging.getLogger(__name__)
+
+
+def _keyset(conn, stmt: Select, column, after: int, chunk_size: int):
+    """Yield `stmt` rows in `column` order, `chunk_size` at a time, past `after`."""
+    while True:
+        rows = conn.execute(
+            stmt.where(column > after).order_by(column).limit(chunk_size)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        after = rows[-1][0]
+
+
+def _fresh_state() -> dict:
+    return {
+        "high_water": {"books": 0, "reviews": 0},
+        "full_run_at": datetime.now(timezone.utc).isoformat(),
+        "books": 0,
+        "reviews": 0,
+        **{name: {} for name in COUNTERS},
+    }
+
+
+def _accumulate(conn, state: dict, chunk_size: int) -> None:
+    """Fold books and reviews past the high-water marks into the counters."""
+    counters = {name: Counter(state[name]) for name in COUNTERS}
+    high_water = state["high_water"]
+
+    books = select(Book.id, Book.genre_name, Book.year)
+    for rows in _keyset(conn, books, Book.id, high_water["books"], chunk_size):
+        links = select(author_book_relation.c.author_id).where(
+            author_book_relation.c.book_id > high_water["books"],
+            author_book_relation.c.book_id <= rows[-1].id,
+        )
+        counters["authors"].update(str(a) for a in conn.execute(links).scalars())
+        counters["genres"].update(row.genre_name for row in rows if row.genre_name)
+        counters["years"].update(str(row.year) for row in rows if row.year is not None)
+        state["books"] += len(rows)
+        high_water["books"] = rows[-1].id
+
+    reviews = select(Review.id, Review.rating, Review.created_at)
+    for rows in _keyset(conn, reviews, Review.id, high_water["reviews"], chunk_size):
+        counters["ratings"].update(str(row.rating) for row in rows)
+        counters["days"].update(row.created_at.date().isoformat() for row in rows)
+        state["reviews"] += len(rows)
+        high_water["reviews"] = rows[-1].id
+
+    oldest = (
+        datetime.now(timezone.utc).date() - timedelta(days=STATS_VELOCITY_DAYS)
+    ).isoformat()
+    counters["days"] = Counter(
+        {d: n for d, n in counters["days"].items() if d > oldest}
+    )
+    for name in COUNTERS:
+        state[name] = dict(counters[name])
+
+
+def _publish(conn, state: dict) -> dict:
+    top = Counter(state["authors"]).most_common(STATS_TOP_AUTHORS)
+    names = dict(
+        conn.execute(
+            select(Author.id, Author.name).where(
+                Author.id.in_([int(a) for a, _ in top])
+            )
+        ).all()
+    )
+    ratings = {r: state["ratings"].get(str(r), 0) for r in range(1, 6)}
+    today = datetime.now(timezone.utc).date()
+    per_day = {
+        (today - timedelta(days=n)).isoformat(): 0 for n in range(STATS_VELOCITY_DAYS)
+    }
+    for day, n in state["days"].items():
+        if day in per_day:
+            per_day[day] = n
+    last_7d = sorted(per_day)[-7:]
+    return {
+        "computed_at": datetime.now(timezone.utc).isoformat(),
+        "full_run_at": state["full_run_at"],
+        "books": state["books"],
+        "reviews": state["reviews"],
+        "books_per_genre": dict(Counter(state["genres"]).most_common()),
+        "books_per_year": dict(sorted(state["years"].items(), key=lambda i: int(i[0]))),
+        "top_authors": [
+            {"id": int(a), "name": names[int(a)], "books": n}
+            for a, n in top
+            if int(a) in names
+        ],
+        "rating_distribution": ratings,
+        "average_rating": (
+            sum(r * n for r, n in ratings.items()) / state["reviews"]
+            if state["reviews"]
+            else None
+        ),
+        "review_velocity": {
+            "last_7d": sum(per_day[d] for d in last_7d),
+            "last_30d": sum(per_day.values()),
+            "per_day": dict(sorted(per_day.items())),
+        },
+    }
+
+
+@shared_task
+def compute_stats(full: bool = False, chunk_size: int = STATS_CHUNK_SIZE) -> dict:
+    """
+    Catalog statistics for `GET /stats`: books per genre/year/author, rating
+    distribution and review velocity.
+
+    Incremental runs only read books and reviews added since the stored
+    high-water marks; edits and deletes of older rows are picked up by the
+    next full run (`full=True`), which recounts from scratch.
+    """
+    r = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+    lock = r.lock("stats:lock", timeout=3600, blocking=False)
+    if not lock.acquire():
+        r.close()
+        return {"status": "skipped"}
+    try:
+        raw = None if full else r.get(STATS_STATE_KEY)
+        state = json.loads(raw) if raw else _fresh_state()
+        with get_sync_engine().connect() as conn:
+            _accumulate(conn, state, chunk_size)
+            payload = _publish(conn, state)
+        with r.pipeline(transaction=True) as pipe:
+            pipe.set(STATS_STATE_KEY, json.dumps(state))
+            # rendered once here; GET /stats returns these bytes as they are
+            pipe.set(STATS_KEY, dump(CatalogStats, payload))
+            pipe.execute()
+        return {"status": "ok", **state["high_water"]}
+    finally:
+        try:
+            lock.release()
+        except redis.exceptions.LockError:
+            # the run outlived the lock timeout; another run may hold it now
+            logger.warning("compute_stats finished after its lock expired")
+        r.close()
 
 
 @shared_task
-def compute_stats() -> dict:
+def expire_leaderboards() -> dict:
     """
-    Placeholder analytics task. Compute aggregates and store results.
+    Subtract reviews that aged out of each windowed leaderboard since the last
+    run, then advance the window's cutoff.
     """
-    # TODO: implement real analytics
-    return {"status": "ok"}
+    r = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+    adjust = r.register_script(ADJUST_SCRIPT)
+    expired = {}
+    try:
+        cutoffs = r.hgetall(CUTOFFS_KEY)
+        now = time.time()
+        for window, seconds in WINDOWS.items():
+            if seconds is None:
+                continue
+            until = now - seconds
+            # no cutoff yet: the boards only hold reviews written since deploy
+            since = float(cutoffs.get(window, until))
+            rows = []
+            if since < until:
+                stmt = tallies_stmt(
+                    datetime.fromtimestamp(since, timezone.utc),
+                    datetime.fromtimestamp(until, timezone.utc),
+                )
+                with get_sync_engine().connect() as conn:
+                    rows = conn.execute(stmt).all()
+            with r.pipeline(transaction=False) as pipe:
+                for book_id, genre_name, n, total in rows:
+                    keys, args = adjust_calls(
+                        window, book_id, review_deltas(genre_name, -n, -total)
+                    )
+                    adjust(keys=keys, args=args, client=pipe)
+                pipe.hset(CUTOFFS_KEY, window, until)
+                pipe.execute()
+            expired[window] = len(rows)
+    finally:
+        r.close()
+    return expired
@@ -0,0 +1,75 @@
+"""Recommendation tasks: precompute "similar books" neighbour lists."""
+
+import json
+import os
+
+import redis
+from celery import shared_task
+from sqlalchemy import func, select
+
+from cache import REDIS_URL, make_similar_key
+from database import get_sync_engine
+from models import Author, Book, author_book_relation
+from search.inverted import doc_terms
+from search.similar import SIMILAR_NEIGHBOURS, build_vectors, nearest
+
+# outlives the daily run, so a missed run degrades to stale lists, not none
+SIMILAR_TTL = int(os.getenv("SIMILAR_TTL", str(3 * 24 * 3600)))
+
+
+@shared_task
+def compute_similar_books(batch_size: int = 5000) -> dict:
+    """
+    Vectorize every book, find each one's nearest neighbours and store them
+    per book in Redis for `GET /books/{id}/similar`.
+    """
+    names = (
+        select(
+            author_book_relation.c.book_id,
+            func.array_agg(Author.name).label("names"),
+        )
+        .join(Author, Author.id == author_book_relation.c.author_id)
+        .group_by(author_book_relation.c.book_id)
+        .subquery()
+    )
+    stmt = (
+        select(Book.id, Book.title, Book.genre_name, Book.description, names.c.names)
+        .outerjoin(names, names.c.book_id == Book.id)
+        .order_by(Book.id)
+    )
+    ids, docs = [], []
+    with get_sync_engine().connect() as conn:
+        result = conn.execution_options(yield_per=batch_size).execute(stmt)
+        for book_id, title, genre_name, description, authors in result:
+            ids.append(book_id)
+            docs.append(
+                doc_terms(
+                    {
+                        "title": title,
+                        "genre_name": genre_name,
+                        "description": description,
+                        "authors": [{"name": name} for name in authors or []],
+                    }
+                )
+            )
+
+    idx, scores = nearest(build_vectors(docs), SIMILAR_NEIGHBOURS)
+    r = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+    try:
+        for start in range(0, len(ids), batch_size):
+            with r.pipeline(transaction=False) as pipe:
+                for row in range(start, min(start + batch_size, len(ids))):
+                    neighbours = [
+                        [ids[col], round(float(score), 4)]
+                        for col, score in zip(idx[row], scores[row])
+                        if score > 0
+                    ]
+                    pipe.set(
+                        make_similar_key(ids[row]),
+                        json.dumps(neighbours, separators=(",", ":")),
+                        ex=SIMILAR_TTL,
+                    )
+                pipe.execute()
+    finally:
+        r.close()
+    return {"books": len(ids)}
@@ -0,0 +1,46 @@
+"""
+Author search must stay on the trigram GIN indexes over name_norm/email_norm.
+Seeds 100k authors inside a transaction that is rolled back afterwards.
+"""
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+
+from routers.author import _authors_search_stmt
+
+AUTHOR_COUNT = 100_000
+
+
+@pytest_asyncio.fixture
+async def seeded_conn(pg_engine):
+    async with pg_engine.connect() as conn:
+        trans = await conn.begin()
+        await conn.execute(
+            text(
+                "INSERT INTO authors (name, email) "
+                "SELECT substr(md5(i::text), 1, 8) || ' ' || substr(md5(i::text), 9, 10), "
+                "'a' || i || '@example.com' "
+                "FROM generate_series(1, :n) AS i"
+            ),
+            {"n": AUTHOR_COUNT},
+        )
+        await conn.execute(
+            text("INSERT INTO authors (name, email) VALUES ('J.R.R. Tolkien', NULL)")
+        )
+        await conn.execute(text("ANALYZE authors"))
+        try:
+            yield conn
+        finally:
+            await trans.rollback()
+
+
+@pytest.mark.asyncio
+async def test_author_search_uses_trigram_index(seeded_conn, explain):
+    stmt, _ = _authors_search_stmt(q="Tolkién")
+    plan = await explain(seeded_conn, stmt.limit(21))
+    assert "ix_authors_name_norm_trgm" in plan, plan
+    assert "Seq Scan on authors" not in plan, plan
+
+    rows = (await seeded_conn.execute(stmt.limit(21))).all()
+    assert [row.name for row in rows] == ["J.R.R. Tolkien"]
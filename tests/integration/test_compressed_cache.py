@@ -0,0 +1,109 @@
+"""
+Cache hits are served from stored, pre-encoded bodies chosen by
+Accept-Encoding, and those bodies are retired with their cache entry.
+"""
+
+import pytest
+
+from helpers.encoding import COMPRESS_MIN_BYTES
+
+
+@pytest.mark.asyncio
+async def test_hits_serve_negotiated_encodings(app_client):
+    description = "lorem ipsum dolor " * (COMPRESS_MIN_BYTES // 9)
+    book = (
+        await app_client.post(
+            "/books/", json={"title": "Encoded", "description": description}
+        )
+    ).json()
+    url = f"/books/{book['id']}"
+
+    miss = await app_client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert miss.headers["content-encoding"] == "gzip"  # middleware
+    etags = {}
+    for coding in ("gzip", "br", "gzip", "br"):
+        resp = await app_client.get(url, headers={"Accept-Encoding": coding})
+        assert resp.headers["content-encoding"] == coding
+        assert resp.headers["vary"] == "Accept-Encoding"
+        assert etags.setdefault(coding, resp.headers["etag"]) == resp.headers["etag"]
+        assert int(resp.headers["content-length"]) < len(description)
+        assert resp.json() == miss.json()
+    plain = await app_client.get(url, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.json() == miss.json()
+    etags["identity"] = plain.headers["etag"]
+    # one tag per representation; the middleware's gzip tag is the stored one's
+    assert len(set(etags.values())) == 3
+    assert miss.headers["etag"] == etags["gzip"]
+
+    await app_client.patch(url, json={"year": 2001})
+    await app_client.get(url, headers={"Accept-Encoding": "br"})
+    resp = await app_client.get(url, headers={"Accept-Encoding": "br"})
+    assert resp.headers["content-encoding"] == "br"
+    assert resp.json()["year"] == 2001
+
+    small = await app_client.get("/books/", params={"title": "Encoded", "limit": 1})
+    resp = await app_client.get(
+        "/books/",
+        params={"title": "Encoded", "limit": 1},
+        headers={"Accept-Encoding": "br"},
+    )
+    assert resp.json() == small.json()
+    await app_client.delete(url)
+
+
+@pytest.mark.asyncio
+async def test_miss_and_hit_send_the_same_bytes(app_client):
+    book = (await app_client.post("/books/", json={"title": "Café crème"})).json()
+    url = f"/books/{book['id']}"
+    headers = {"Accept-Encoding": "identity"}
+    miss = await app_client.get(url, headers=headers)
+    hit = await app_client.get(url, headers=headers)
+    assert hit.content == miss.content
+    assert hit.headers["etag"] == miss.headers["etag"]
+    assert "Café crème".encode() in hit.content  # UTF-8, not \u escapes
+    await app_client.delete(url)
+
+
+@pytest.mark.asyncio
+async def test_each_encoding_revalidates_with_its_own_etag(app_client):
+    description = "lorem ipsum dolor " * (COMPRESS_MIN_BYTES // 9)
+    book = (
+        await app_client.post(
+            "/books/", json={"title": "Revalidated", "description": description}
+        )
+    ).json()
+    url = f"/books/{book['id']}"
+    await app_client.get(url)  # fill the cache
+
+    for coding in ("gzip", "br", "identity"):
+        headers = {"Accept-Encoding": coding}
+        etag = (await app_client.get(url, headers=headers)).headers["etag"]
+        resp = await app_client.get(url, headers={**headers, "If-None-Match": etag})
+        assert resp.status_code == 304 and resp.content == b""
+        assert resp.headers["etag"] == etag
+    # an old representation's tag still revalidates while the entry lives
+    gzip_etag = (
+        await app_client.get(url, headers={"Accept-Encoding": "gzip"})
+    ).headers["etag"]
+    resp = await app_client.get(
+        url, headers={"Accept-Encoding": "br", "If-None-Match": gzip_etag}
+    )
+    assert resp.status_code == 304
+    assert resp.headers["etag"] != gzip_etag
+
+    await app_client.patch(url, json={"year": 2002})
+    resp = await app_client.get(
+        url, headers={"Accept-Encoding": "br", "If-None-Match": gzip_etag}
+    )
+    assert resp.status_code == 200
+    # before the gzip body is stored, the 304 already names the gzip tag
+    plain = await app_client.get(url, headers={"Accept-Encoding": "identity"})
+    resp = await app_client.get(
+        url,
+        headers={"Accept-Encoding": "gzip", "If-None-Match": plain.headers["etag"]},
+    )
+    assert resp.status_code == 304
+    gzipped = await app_client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["etag"] == gzipped.headers["etag"] != plain.headers["etag"]
+    await app_client.delete(url)
@@ -0,0 +1,47 @@
+"""
+Cached reads carry strong ETags; a matching If-None-Match gets an empty 304
+until a write changes the entry.
+"""
+
+import pytest
+
+
+async def _revalidate(client, url, **params):
+    first = await client.get(url, params=params)
+    assert first.status_code == 200, first.text
+    # the first request may have filled the cache; the second is a hit
+    second = await client.get(url, params=params)
+    etag = second.headers["etag"]
+    assert first.headers["etag"] == etag
+    resp = await client.get(url, params=params, headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.content == b""
+    assert resp.headers["etag"] == etag
+    return etag
+
+
+@pytest.mark.asyncio
+async def test_conditional_reads(app_client):
+    author = (await app_client.post("/authors/", json={"name": "Etag"})).json()
+    book = (
+        await app_client.post(
+            "/books/", json={"title": "Etag", "author_ids": [author["id"]]}
+        )
+    ).json()
+
+    etag = await _revalidate(app_client, f"/books/{book['id']}")
+    await _revalidate(app_client, f"/books/{book['id']}/reviews")
+    await _revalidate(app_client, "/books/", title="Etag")
+    await _revalidate(app_client, "/authors/", name="Etag")
+    await _revalidate(app_client, f"/authors/{author['id']}")
+
+    await app_client.patch(f"/books/{book['id']}", json={"year": 1999})
+    resp = await app_client.get(
+        f"/books/{book['id']}", headers={"If-None-Match": etag}
+    )
+    assert resp.status_code == 200
+    assert resp.json()["year"] == 1999
+    assert resp.headers["etag"] != etag
+
+    await app_client.delete(f"/books/{book['id']}")
+    await app_client.delete(f"/authors/{author['id']}")
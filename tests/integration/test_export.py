@@ -0,0 +1,62 @@
+import csv
+import io
+import json
+import uuid
+
+import httpx
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_export_streams_ndjson_and_csv(local_redis_client: httpx.AsyncClient):
+    c = local_redis_client
+    suffix = uuid.uuid4().hex[:8]
+    author = (await c.post("/authors/", json={"name": f"Export {suffix}"})).json()
+    books = [
+        (
+            await c.post(
+                "/books/",
+                json={"title": f"Export {suffix} {i}", "author_ids": [author["id"]]},
+            )
+        ).json()
+        for i in range(3)
+    ]
+    try:
+        resp = await c.get(
+            "/books/export",
+            params={"author_id": author["id"], "include_authors": True},
+        )
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in resp.text.splitlines()]
+        assert [r["id"] for r in rows] == sorted(b["id"] for b in books)
+        assert rows[0]["authors"] == [
+            {"id": author["id"], "name": author["name"], "email": None}
+        ]
+
+        resp = await c.get(
+            "/books/export",
+            params={"author_id": author["id"], "format": "csv"},
+        )
+        assert resp.headers["content-type"].startswith("text/csv")
+        header, *lines = list(csv.reader(io.StringIO(resp.text)))
+        assert header[:2] == ["id", "title"] and "author_ids" not in header
+        assert len(lines) == 3
+
+        resp = await c.get(
+            "/books/export",
+            params={
+                "author_id": author["id"],
+                "format": "csv",
+                "include_authors": True,
+            },
+        )
+        header, *lines = list(csv.reader(io.StringIO(resp.text)))
+        assert header[-2:] == ["author_ids", "author_names"]
+        assert {tuple(line[-2:]) for line in lines} == {
+            (str(author["id"]), author["name"])
+        }
+    finally:
+        for book in books:
+            await c.delete(f"/books/{book['id']}")
+        await c.delete(f"/authors/{author['id']}")
@@ -0,0 +1,103 @@
+"""
+`GET /books/top` leaderboards follow review and book writes, and a rebuild
+from the reviews table reproduces them.
+"""
+
+import asyncio
+import time
+import uuid
+
+import pytest
+from sqlalchemy import text, update
+
+from cache import init_redis
+from database import AsyncSessionLocal, get_async_engine
+from models import Review
+from search import leaderboard
+from tasks.analytics import expire_leaderboards
+
+
+async def _review(client, book_id, rating, name="r"):
+    resp = await client.post(
+        f"/books/{book_id}/reviews", json={"reviewer_name": name, "rating": rating}
+    )
+    assert resp.status_code == 200, resp.text
+    return resp.json()["id"]
+
+
+async def _top(client, genre, window="all"):
+    resp = await client.get("/books/top", params={"genre": genre, "window": window})
+    assert resp.status_code == 200, resp.text
+    return [(b["id"], b["reviews"]) for b in resp.json()]
+
+
+@pytest.mark.asyncio
+async def test_top_books_follow_writes(app_client):
+    genre = f"Zq {uuid.uuid4().hex[:8]}"
+    ids = []
+    for title in ("one five", "many fours"):
+        resp = await app_client.post(
+            "/books/", json={"title": title, "genre_name": genre}
+        )
+        ids.append(resp.json()["id"])
+    lucky, steady = ids
+
+    await _review(app_client, lucky, 5)
+    for n in range(6):
+        await _review(app_client, steady, 4, name=f"r{n}")
+    # the prior pulls a single 5 below six 4s
+    assert await _top(app_client, genre.lower()) == [(steady, 6), (lucky, 1)]
+    assert await _top(app_client, genre, "7d") == [(steady, 6), (lucky, 1)]
+
+    resp = await app_client.get(f"/books/{lucky}/reviews")
+    await app_client.delete(f"/reviews/{resp.json()[0]['id']}")
+    assert await _top(app_client, genre) == [(steady, 6)]
+
+    other = f"{genre} b"
+    await app_client.patch(f"/books/{steady}", json={"genre_name": other})
+    assert await _top(app_client, genre) == []
+    assert await _top(app_client, other) == [(steady, 6)]
+    overall = await _top(app_client, None)
+    assert (steady, 6) in overall or len(overall) == 10
+
+    await app_client.delete(f"/books/{steady}")
+    assert await _top(app_client, other) == []
+    await app_client.delete(f"/books/{lucky}")
+
+
+@pytest.mark.asyncio
+async def test_expiry_and_rebuild_agree(app_client):
+    genre = f"Zq {uuid.uuid4().hex[:8]}"
+    resp = await app_client.post("/books/", json={"title": "x", "genre_name": genre})
+    book_id = resp.json()["id"]
+    old = await _review(app_client, book_id, 2, name="old")
+    await _review(app_client, book_id, 5, name="new")
+    assert await _top(app_client, genre, "7d") == [(book_id, 2)]
+
+    async with AsyncSessionLocal(bind=get_async_engine()) as db:
+        await db.execute(
+            update(Review)
+            .where(Review.id == old)
+            .values(created_at=text("now() - interval '10 days'"))
+        )
+        await db.commit()
+    r = await init_redis()
+    await r.hset(leaderboard.CUTOFFS_KEY, "7d", time.time() - 12 * 24 * 3600)
+    await asyncio.to_thread(expire_leaderboards)
+
+    incremental = {w: await _top(app_client, genre, w) for w in leaderboard.WINDOWS}
+    assert incremental == {
+        "all": [(book_id, 2)],
+        "30d": [(book_id, 2)],
+        "7d": [(book_id, 1)],
+    }
+    scores = (await app_client.get("/books/top", params={"genre": genre})).json()
+
+    async with AsyncSessionLocal(bind=get_async_engine()) as db:
+        await leaderboard.rebuild(db, r)
+    assert {w: await _top(app_client, genre, w) for w in leaderboard.WINDOWS} == (
+        incremental
+    )
+    resp = await app_client.get("/books/top", params={"genre": genre})
+    assert resp.json() == scores
+    await app_client.delete(f"/books/{book_id}")
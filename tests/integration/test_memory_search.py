@@ -0,0 +1,71 @@
+"""
+SEARCH_BACKEND=memory: /books?q= is answered from the in-process index,
+which follows writes through the Redis change channel.
+"""
+
+import asyncio
+import uuid
+
+import pytest
+
+import search.inverted as inverted
+from cache import init_redis
+from database import AsyncSessionLocal, get_async_engine
+
+
+async def _eventually(check, timeout: float = 5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        if await check():
+            return
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.05)
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_follows_writes(app_client, count_statements, monkeypatch):
+    monkeypatch.setattr(inverted, "SEARCH_BACKEND", "memory")
+    task = asyncio.create_task(
+        inverted.run_index(
+            lambda: AsyncSessionLocal(bind=get_async_engine()), await init_redis()
+        )
+    )
+    try:
+        await _eventually(lambda: asyncio.sleep(0, inverted._index is not None))
+
+        word = f"mem{uuid.uuid4().hex[:8]}"
+        author = (
+            await app_client.post("/authors/", json={"name": "Mem Author"})
+        ).json()
+        book = (
+            await app_client.post(
+                "/books/",
+                json={"title": f"The {word} Book", "author_ids": [author["id"]]},
+            )
+        ).json()
+
+        async def found():
+            resp = await app_client.get("/books/", params={"q": word})
+            return [item["id"] for item in resp.json()["items"]] == [book["id"]]
+
+        await _eventually(found)
+        with count_statements() as statements:
+            resp = await app_client.get("/books/", params={"q": word, "limit": 5})
+        assert statements == []
+        item = resp.json()["items"][0]
+        assert item["authors"] == [
+            {"id": author["id"], "name": "Mem Author", "email": None}
+        ]
+
+        await app_client.delete(f"/books/{book['id']}")
+        await app_client.delete(f"/authors/{author['id']}")
+
+        async def gone():
+            resp = await app_client.get("/books/", params={"q": word})
+            return resp.json()["items"] == []
+
+        await _eventually(gone)
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        inverted._index = None
@@ -0,0 +1,269 @@
+"""
+Query budgets: every route in routers/ is called once, on a cold cache
+(fakeredis, see local_redis_client), and may not send more statements or
+round trips to Postgres than declared below, nor lazy load a relationship.
+
+Round trips are statements plus transaction control (BEGIN, COMMIT and
+ROLLBACK, which asyncpg sends as their own messages). A route added without
+a budget fails test_every_route_has_a_budget. Raise a budget only together
+with the change that needs it, and say why next to it.
+"""
+
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable
+
+import httpx
+import pytest
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from main import app
+
+
+@dataclass(frozen=True)
+class Case:
+    statements: int
+    round_trips: int
+    # (url, extra request kwargs) from the ids of the fixture rows
+    request: Callable[[dict], tuple[str, dict]]
+    status: int = 200
+    # collection the request adds a row to, deleted again by its response id
+    creates: str | None = None
+
+
+@dataclass
+class QueryLog:
+    statements: list[str] = field(default_factory=list)
+    transaction_control: int = 0
+    lazy_loads: list[str] = field(default_factory=list)
+
+    @property
+    def round_trips(self) -> int:
+        return len(self.statements) + self.transaction_control
+
+
+@contextmanager
+def query_log(engine):
+    log = QueryLog()
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        log.statements.append(statement)
+
+    def on_transaction(conn):
+        log.transaction_control += 1
+
+    def on_orm_execute(state):
+        if state.is_select and state.lazy_loaded_from is not None:
+            log.lazy_loads.append(str(state.statement))
+
+    listeners = [
+        (engine, "before_cursor_execute", on_execute),
+        (engine, "begin", on_transaction),
+        (engine, "commit", on_transaction),
+        (engine, "rollback", on_transaction),
+        (Session, "do_orm_execute", on_orm_execute),
+    ]
+    for target, name, fn in listeners:
+        event.listen(target, name, fn)
+    try:
+        yield log
+    finally:
+        for target, name, fn in listeners:
+            event.remove(target, name, fn)
+
+
+def _json(url: str, body) -> tuple[str, dict]:
+    return url, {"json": body}
+
+
+CASES: dict[tuple[str, str], Case] = {
+    # reads: BEGIN, the statements, ROLLBACK when the session closes
+    # SET LOCAL statement_timeout, the page, selectinload(authors)
+    ("GET", "/books/"): Case(
+        3, 5, lambda ids: ("/books/", {"params": {"title": ids["title"]}})
+    ),
+    # one partition of rows, then its authors
+    ("GET", "/books/export"): Case(
+        2,
+        4,
+        lambda ids: (
+            "/books/export",
+            {"params": {"author_id": ids["author"], "include_authors": True}},
+        ),
+    ),
+    ("GET", "/books/suggest"): Case(0, 0, lambda ids: ("/books/suggest?prefix=qb", {})),
+    ("GET", "/books/top"): Case(1, 3, lambda ids: ("/books/top", {})),
+    # the book, selectinload(authors), selectinload(reviews)
+    ("GET", "/books/{book_id}"): Case(3, 5, lambda ids: (f"/books/{ids['book']}", {})),
+    ("GET", "/books/{book_id}/reviews"): Case(
+        1, 3, lambda ids: (f"/books/{ids['book']}/reviews", {})
+    ),
+    ("GET", "/books/{book_id}/similar"): Case(
+        1, 3, lambda ids: (f"/books/{ids['book']}/similar", {})
+    ),
+    # SET LOCAL statement_timeout, the page
+    ("GET", "/authors/"): Case(
+        2, 4, lambda ids: ("/authors/", {"params": {"name": ids["name"]}})
+    ),
+    ("GET", "/authors/suggest"): Case(
+        0, 0, lambda ids: ("/authors/suggest?prefix=qb", {})
+    ),
+    ("GET", "/authors/{author_id}"): Case(
+        1, 3, lambda ids: (f"/authors/{ids['author']}", {})
+    ),
+    ("GET", "/authors/{author_id}/books"): Case(
+        1, 3, lambda ids: (f"/authors/{ids['author']}/books", {})
+    ),
+    # Redis only; 503 until compute_stats has run
+    ("GET", "/stats"): Case(0, 0, lambda ids: ("/stats", {}), status=503),
+    ("GET", "/metrics"): Case(0, 0, lambda ids: ("/metrics", {})),
+    # writes
+    ("POST", "/books/"): Case(
+        3,
+        5,
+        lambda ids: _json(
+            "/books/", {"title": "QB new", "author_ids": [ids["author"]]}
+        ),
+        creates="/books",
+    ),
+    # the insert; plus the author ids when their cached link has expired
+    ("POST", "/books/{book_id}/reviews"): Case(
+        2,
+        4,
+        lambda ids: _json(
+            f"/books/{ids['book']}/reviews", {"reviewer_name": "qb-new", "rating": 3}
+        ),
+    ),
+    # update, authors, unlink, link, reviews
+    ("PUT", "/books/{book_id}"): Case(
+        5,
+        7,
+        lambda ids: _json(
+            f"/books/{ids['book']}", {"title": "QB put", "author_ids": [ids["other"]]}
+        ),
+    ),
+    ("PUT", "/books/{book_id}/authors"): Case(
+        5,
+        7,
+        lambda ids: _json(
+            f"/books/{ids['book']}/authors", [ids["author"], ids["other"]]
+        ),
+    ),
+    ("PATCH", "/books/{book_id}"): Case(
+        3, 5, lambda ids: _json(f"/books/{ids['book']}", {"year": 2001})
+    ),
+    ("DELETE", "/books/{book_id}"): Case(
+        2, 4, lambda ids: (f"/books/{ids['book']}", {}), status=204
+    ),
+    ("POST", "/authors/"): Case(
+        2,
+        4,
+        lambda ids: _json("/authors/", {"name": "QB new", "book_ids": [ids["book"]]}),
+        creates="/authors",
+    ),
+    ("PUT", "/authors/{author_id}"): Case(
+        3,
+        5,
+        lambda ids: _json(
+            f"/authors/{ids['author']}", {"name": "QB put", "book_ids": [ids["book"]]}
+        ),
+    ),
+    ("PATCH", "/authors/{author_id}"): Case(
+        2, 4, lambda ids: _json(f"/authors/{ids['author']}", {"name": "QB patch"})
+    ),
+    ("DELETE", "/authors/{author_id}"): Case(
+        2, 4, lambda ids: (f"/authors/{ids['author']}", {}), status=204
+    ),
+    ("DELETE", "/reviews/{review_id}"): Case(
+        1, 3, lambda ids: (f"/reviews/{ids['review']}", {}), status=204
+    ),
+}
+
+
+def _routes() -> set[tuple[str, str]]:
+    return {
+        (method, route.path)
+        for route in app.routes
+        if isinstance(route, APIRoute)
+        for method in route.methods
+    }
+
+
+def test_every_route_has_a_budget():
+    assert _routes() - set(CASES) == set(), "declare a query budget for new routes"
+    assert set(CASES) - _routes() == set(), "budget for a route that is gone"
+
+
+async def _fixture_rows(client: httpx.AsyncClient) -> dict:
+    suffix = uuid.uuid4().hex[:8]
+    author = (await client.post("/authors/", json={"name": f"QB {suffix}"})).json()
+    other = (await client.post("/authors/", json={"name": f"QB2 {suffix}"})).json()
+    book = (
+        await client.post(
+            "/books/",
+            json={
+                "title": f"QB {suffix}",
+                "genre_name": "qb",
+                "author_ids": [author["id"]],
+            },
+        )
+    ).json()
+    review = (
+        await client.post(
+            f"/books/{book['id']}/reviews", json={"reviewer_name": "qb", "rating": 4}
+        )
+    ).json()
+    return {
+        "author": author["id"],
+        "other": other["id"],
+        "name": author["name"],
+        "book": book["id"],
+        "title": book["title"],
+        "review": review["id"],
+    }
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("route", sorted(CASES), ids=" ".join)
+async def test_route_stays_within_its_query_budget(
+    local_redis_client: httpx.AsyncClient, pg_engine, route
+):
+    method, _ = route
+    case = CASES[route]
+    ids = await _fixture_rows(local_redis_client)
+    url, kwargs = case.request(ids)
+    resp = None
+    try:
+        with query_log(pg_engine.sync_engine) as log:
+            resp = await local_redis_client.request(method, url, **kwargs)
+        assert resp.status_code == case.status, resp.text
+        assert not log.lazy_loads, f"lazy loads: {log.lazy_loads}"
+        assert len(log.statements) <= case.statements, log.statements
+        assert log.round_trips <= case.round_trips, log.statements
+    finally:
+        if case.creates and resp is not None and resp.is_success:
+            await local_redis_client.delete(f"{case.creates}/{resp.json()['id']}")
+        await local_redis_client.delete(f"/books/{ids['book']}")
+        for author_id in (ids["author"], ids["other"]):
+            await local_redis_client.delete(f"/authors/{author_id}")
+
+
+@pytest.mark.asyncio
+async def test_lazy_loads_are_detected(local_redis_client, pg_engine):
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from models import Book
+
+    ids = await _fixture_rows(local_redis_client)
+    try:
+        async with AsyncSession(pg_engine) as session:
+            with query_log(pg_engine.sync_engine) as log:
+                await session.run_sync(lambda s: s.get(Book, ids["book"]).authors)
+        assert len(log.lazy_loads) == 1
+    finally:
+        await local_redis_client.delete(f"/books/{ids['book']}")
+        for author_id in (ids["author"], ids["other"]):
+            await local_redis_client.delete(f"/authors/{author_id}")
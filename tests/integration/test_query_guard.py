@@ -0,0 +1,99 @@
+"""
+Search cost guard: term validation, per-route statement_timeout, and the
+FTS-only fallback for terms whose trigram match is estimated to be huge.
+"""
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import close_redis, init_redis, make_search_estimate_key
+from database import get_async_db_with_timeout, is_statement_timeout
+from routers import book as book_router
+from routers.book import SEARCH_TRIGRAM_ROW_LIMIT, _trigram_too_broad
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("path", ["/books/", "/authors/"])
+@pytest.mark.parametrize("q", ["ab", "the of and", "x" * 201])
+async def test_search_term_guard_rejects(app_client, path, q):
+    resp = await app_client.get(path, params={"q": q})
+    assert resp.status_code == 400, resp.text
+
+
+@pytest.mark.asyncio
+async def test_route_statement_timeout(pg_engine, monkeypatch):
+    monkeypatch.setenv("STATEMENT_TIMEOUT_MS_GUARDTEST", "50")
+    get_db = get_async_db_with_timeout("guardtest")
+    async for db in get_db():
+        with pytest.raises(DBAPIError) as exc_info:
+            await db.execute(text("SELECT pg_sleep(1)"))
+        assert is_statement_timeout(exc_info.value)
+        await db.rollback()
+        # the timeout is re-applied to every new transaction
+        with pytest.raises(DBAPIError):
+            await db.execute(text("SELECT pg_sleep(1)"))
+
+
+@pytest.mark.asyncio
+async def test_broad_trigram_term_falls_back_to_fts(pg_engine):
+    r = await init_redis()
+    terms = ["Book", "Book c4ca4238a0"]
+    await r.delete(*(make_search_estimate_key(q) for q in terms))
+    async with pg_engine.connect() as conn:
+        trans = await conn.begin()
+        await conn.execute(
+            text(
+                "INSERT INTO books (title, year, book_isbn, genre_name, description) "
+                "SELECT 'Book ' || substr(md5(i::text), 1, 10), 2000, "
+                "lpad(i::text, 13, '7'), 'g', 'd' "
+                "FROM generate_series(1, :n) AS i"
+            ),
+            {"n": SEARCH_TRIGRAM_ROW_LIMIT * 2},
+        )
+        await conn.execute(text("ANALYZE books"))
+        db = AsyncSession(bind=conn)
+        try:
+            assert await _trigram_too_broad(db, "Book", r)
+            assert not await _trigram_too_broad(db, "Book c4ca4238a0", r)
+            # the estimate is cached per term
+            assert await r.get(make_search_estimate_key("Book")) is not None
+        finally:
+            await db.close()
+            await trans.rollback()
+            await r.delete(*(make_search_estimate_key(q) for q in terms))
+            await close_redis()
+
+
+@pytest.mark.asyncio
+async def test_fts_fallback_keeps_the_best_ranked_matches(pg_engine, monkeypatch):
+    monkeypatch.setattr(book_router, "SEARCH_FALLBACK_CANDIDATES", 10)
+    async with pg_engine.connect() as conn:
+        trans = await conn.begin()
+        # i mentions of the term: ts_rank grows with i
+        await conn.execute(
+            text(
+                "INSERT INTO books (title, year, book_isbn, genre_name, description) "
+                "SELECT 'Capped ' || i, 2000, lpad(i::text, 13, '5'), 'g', "
+                "repeat('zymurgy ', i) || 'filler' "
+                "FROM generate_series(1, 40) AS i"
+            )
+        )
+        db = AsyncSession(bind=conn)
+        try:
+            capped = book_router._search_match("zymurgy", fts_only=True)
+            runs = [list((await db.scalars(capped)).all()) for _ in range(3)]
+            assert runs[0] == runs[1] == runs[2]
+            best = (
+                await db.scalars(
+                    text(
+                        "SELECT id FROM books WHERE title LIKE 'Capped %' "
+                        "ORDER BY length(description) DESC LIMIT 10"
+                    )
+                )
+            ).all()
+            assert set(runs[0]) == set(best)
+        finally:
+            await db.close()
+            await trans.rollback()
@@ -0,0 +1,162 @@
+"""
+Query-plan regression suite: seeds a catalog at scale inside a transaction
+that is rolled back, then checks the plan of every list/search query shape
+the routers build. A dropped or unusable index shows up as a failure naming
+the shape instead of a silent full scan in production.
+
+Scale is configurable with PLAN_TEST_BOOKS / PLAN_TEST_AUTHORS.
+"""
+
+import hashlib
+import os
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+
+from routers.author import _author_books_stmt, _authors_search_stmt
+from routers.book import _books_search_stmt
+from schemas.book import BookSortControl, SortDirection, SortField
+
+BOOKS = int(os.getenv("PLAN_TEST_BOOKS", "100000"))
+AUTHORS = int(os.getenv("PLAN_TEST_AUTHORS", "100000"))
+PROBE = 4242  # seeded row whose values the probes look up
+
+
+def _md5(value: str) -> str:
+    return hashlib.md5(value.encode()).hexdigest()
+
+
+@pytest_asyncio.fixture
+async def catalog(pg_engine):
+    async with pg_engine.connect() as conn:
+        trans = await conn.begin()
+        book_floor = (
+            await conn.execute(text("SELECT coalesce(max(id), 0) FROM books"))
+        ).scalar_one()
+        author_floor = (
+            await conn.execute(text("SELECT coalesce(max(id), 0) FROM authors"))
+        ).scalar_one()
+        await conn.execute(
+            text(
+                "INSERT INTO authors (name, email) "
+                "SELECT substr(md5('a' || i), 1, 8) || ' ' || substr(md5('b' || i), 1, 8), "
+                "'author' || i || '@example.com' "
+                "FROM generate_series(1, :n) AS i"
+            ),
+            {"n": AUTHORS},
+        )
+        await conn.execute(
+            text(
+                "INSERT INTO books (title, year, book_isbn, genre_name, description) "
+                "SELECT 'Book ' || substr(md5(i::text), 1, 10), 1900 + i % 120, "
+                "lpad(i::text, 13, '9'), 'genre ' || i % 20, "
+                "'about ' || md5((i * 7)::text) "
+                "FROM generate_series(1, :n) AS i"
+            ),
+            {"n": BOOKS},
+        )
+        await conn.execute(
+            text(
+                "INSERT INTO author_book_relation (author_id, book_id) "
+                "SELECT a.id, b.id FROM "
+                "(SELECT id, row_number() OVER (ORDER BY id) AS rn "
+                " FROM books WHERE id > :book_floor) b "
+                "JOIN (SELECT id, row_number() OVER (ORDER BY id) AS rn "
+                " FROM authors WHERE id > :author_floor) a "
+                "ON a.rn = b.rn % :authors + 1"
+            ),
+            {
+                "book_floor": book_floor,
+                "author_floor": author_floor,
+                "authors": AUTHORS,
+            },
+        )
+        for table in ("authors", "books", "author_book_relation"):
+            await conn.execute(text(f"ANALYZE {table}"))
+        try:
+            yield conn, author_floor + PROBE % AUTHORS
+        finally:
+            await trans.rollback()
+
+
+@pytest.mark.asyncio
+async def test_query_shapes_use_indexes(catalog, explain):
+    conn, probe_author_id = catalog
+    probe_title = f"Book {_md5(str(PROBE))[:10]}"
+    probe_author = f"{_md5(f'a{PROBE}')[:8]} {_md5(f'b{PROBE}')[:8]}"
+    by_title = [
+        BookSortControl(sort_field=SortField.by_title, sort_direction=SortDirection.asc)
+    ]
+    by_similarity = [
+        BookSortControl(
+            sort_field=SortField.by_similarity, sort_direction=SortDirection.desc
+        )
+    ]
+
+    # (shape, statement, index names that must appear, tables that must not be seq scanned)
+    shapes = [
+        (
+            "books: q search",
+            _books_search_stmt(q=probe_title, sort=by_similarity)[0],
+            ["ix_books_search_tsv", "ix_books_title_trgm", "ix_authors_name_trgm"],
+            ["books", "authors"],
+        ),
+        (
+            "books: q search by author name",
+            _books_search_stmt(q=probe_author, sort=by_similarity)[0],
+            ["ix_authors_name_trgm", "ix_author_book_relation_book_id"],
+            ["books", "authors", "author_book_relation"],
+        ),
+        (
+            "books: exact title",
+            _books_search_stmt(title=probe_title)[0],
+            ["ix_books_title_trgm"],
+            ["books"],
+        ),
+        (
+            "books: isbn",
+            _books_search_stmt(isbn=str(PROBE).rjust(13, "9"))[0],
+            ["ix_books_book_isbn"],
+            ["books"],
+        ),
+        (
+            "books: author_id",
+            _books_search_stmt(author_id=probe_author_id, sort=by_title)[0],
+            [],
+            ["books", "author_book_relation"],
+        ),
+        (
+            "authors: q search",
+            _authors_search_stmt(q=probe_author.split()[0])[0],
+            ["ix_authors_name_norm_trgm", "ix_authors_email_norm_trgm"],
+            ["authors"],
+        ),
+        (
+            "authors: exact name",
+            _authors_search_stmt(name=probe_author)[0],
+            ["ix_authors_name_trgm"],
+            ["authors"],
+        ),
+        (
+            "authors: exact email",
+            _authors_search_stmt(email=f"author{PROBE}@example.com")[0],
+            ["ix_authors_email"],
+            ["authors"],
+        ),
+        (
+            "author books",
+            _author_books_stmt(probe_author_id),
+            [],
+            ["books", "author_book_relation"],
+        ),
+    ]
+
+    failures = []
+    for shape, stmt, indexes, no_seq_scan in shapes:
+        plan = await explain(conn, stmt.limit(21))
+        missing = [ix for ix in indexes if ix not in plan]
+        scanned = [t for t in no_seq_scan if f"Seq Scan on {t} " in plan + " "]
+        if missing or scanned:
+            failures.append(f"{shape}: missing {missing}, seq scans {scanned}\n{plan}")
+    assert not failures, "\n\n".join(failures)
@@ -0,0 +1,70 @@
+"""
+Cache hits on opted-in routes are answered by the response cache middleware,
+before dependency resolution, and retired by the usual invalidation.
+"""
+
+import uuid
+from contextlib import contextmanager
+
+import pytest
+
+from database import get_async_db
+from dependencies import parse_sort, search_term
+from helpers.response_cache import query_params
+from main import app
+
+
+@contextmanager
+def handlers_unavailable():
+    """Any request that reaches a handler's dependencies fails."""
+
+    def fail():
+        raise AssertionError("request reached the handler")
+
+    overrides = {get_async_db: fail, parse_sort: fail, search_term: fail}
+    app.dependency_overrides.update(overrides)
+    try:
+        yield
+    finally:
+        for dep in overrides:
+            app.dependency_overrides.pop(dep, None)
+
+
+def test_query_params_normalization():
+    assert query_params(b"b=2&a=1&a=3&c=") == {"b": "2", "a": ["1", "3"]}
+
+
+@pytest.mark.asyncio
+async def test_hits_skip_routing_and_follow_invalidation(app_client):
+    title = f"RC {uuid.uuid4().hex[:8]}"
+    book = (await app_client.post("/books/", json={"title": title})).json()
+    detail, params = f"/books/{book['id']}", {"title": title, "limit": 5}
+
+    first = await app_client.get(detail)
+    listed = await app_client.get("/books/", params=params)
+    assert [b["id"] for b in listed.json()["items"]] == [book["id"]]
+    with handlers_unavailable():
+        hit = await app_client.get(detail)
+        assert hit.content == first.content
+        assert hit.headers["etag"] == first.headers["etag"]
+        # same query, parameters in another order
+        hit = await app_client.get(f"/books/?limit=5&title={title}")
+        assert hit.json() == listed.json()
+        assert hit.headers["etag"] == listed.headers["etag"]
+        assert (
+            await app_client.get(
+                "/books/", params=params, headers={"If-None-Match": hit.headers["etag"]}
+            )
+        ).status_code == 304
+
+    await app_client.patch(detail, json={"year": 1999})
+    assert (await app_client.get(detail)).json()["year"] == 1999
+    listed = await app_client.get("/books/", params=params)
+    assert listed.json()["items"][0]["year"] == 1999
+
+    # no-cache and credentials bypass the lookup
+    with handlers_unavailable():
+        for headers in ({"Cache-Control": "no-cache"}, {"Authorization": "x"}):
+            with pytest.raises(AssertionError):
+                await app_client.get(detail, headers=headers)
+    await app_client.delete(detail)
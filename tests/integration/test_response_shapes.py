@@ -0,0 +1,83 @@
+"""
+Every read route must select only columns its response model serializes:
+a loader that drifts from the schema (e.g. loading books for AuthorRead)
+shows up here as an unexpected column.
+"""
+
+import re
+import uuid
+
+import httpx
+import pytest
+from sqlalchemy import inspect
+
+from helpers.eager import _nested_model
+from models import Author, Book, Review
+from schemas.author import AuthorRead
+from schemas.book import BookDetailRead, BookListRead
+from schemas.review import ReviewRead
+from schemas.shared import BookBase
+
+_COLUMN = re.compile(r"\b([a-z_]+?)(?:_\d+)?\.([a-z_]+)\b")
+
+
+def _allowed(model, entity) -> set[str]:
+    mapper = inspect(entity)
+    allowed = set()
+    for name, field in model.model_fields.items():
+        if name in mapper.column_attrs:
+            allowed.add(f"{mapper.local_table.name}.{name}")
+        elif name in mapper.relationships:
+            rel = mapper.relationships[name]
+            allowed |= _allowed(_nested_model(field.annotation), rel.mapper.class_)
+            # join columns selectinload needs to group the related rows
+            allowed |= {f"{c.table.name}.{c.name}" for c in rel.remote_side}
+    return allowed
+
+
+def _selected(statements: list[str]) -> set[str]:
+    selected = set()
+    for sql in statements:
+        if sql.startswith("SELECT"):
+            select_list = sql[len("SELECT ") : sql.index("\nFROM")]
+            selected |= {f"{t}.{c}" for t, c in _COLUMN.findall(select_list)}
+    return selected
+
+
+@pytest.mark.asyncio
+async def test_read_routes_fetch_only_what_they_serialize(
+    app_client: httpx.AsyncClient, count_statements
+):
+    suffix = uuid.uuid4().hex[:8]
+    author = (
+        await app_client.post("/authors/", json={"name": f"Shape {suffix}"})
+    ).json()
+    book = (
+        await app_client.post(
+            "/books/",
+            json={"title": f"Shape {suffix}", "author_ids": [author["id"]]},
+        )
+    ).json()
+    await app_client.post(
+        f"/books/{book['id']}/reviews", json={"reviewer_name": "shape", "rating": 5}
+    )
+
+    routes = [
+        ("/books", {"title": book["title"]}, BookListRead, Book),
+        (f"/books/{book['id']}", None, BookDetailRead, Book),
+        (f"/books/{book['id']}/reviews", None, ReviewRead, Review),
+        ("/authors", {"name": author["name"]}, AuthorRead, Author),
+        (f"/authors/{author['id']}", None, AuthorRead, Author),
+        (f"/authors/{author['id']}/books", None, BookBase, Book),
+    ]
+    try:
+        for url, params, model, entity in routes:
+            with count_statements() as stmts:
+                resp = await app_client.get(url, params=params)
+            assert resp.status_code == 200, (url, resp.text)
+            assert stmts, f"{url} was served from cache"
+            extra = _selected(stmts) - _allowed(model, entity)
+            assert not extra, f"{url} over-fetches {sorted(extra)}"
+    finally:
+        await app_client.delete(f"/books/{book['id']}")
+        await app_client.delete(f"/authors/{author['id']}")
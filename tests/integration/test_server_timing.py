@@ -0,0 +1,23 @@
+import httpx
+import pytest
+
+from helpers.timing import ServerTimingMiddleware
+
+
+@pytest.mark.asyncio
+async def test_server_timing_breaks_down_a_request(app_client, caplog):
+    from main import app
+
+    transport = httpx.ASGITransport(app=ServerTimingMiddleware(app))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        book = (await c.post("/books/", json={"title": "Timed"})).json()
+        with caplog.at_level("INFO", logger="access"):
+            miss = await c.get(f"/books/{book['id']}")
+        hit = await c.get(f"/books/{book['id']}")
+        await c.delete(f"/books/{book['id']}")
+
+    names = {part.split(";")[0] for part in miss.headers["server-timing"].split(", ")}
+    assert {"redis", "db", "validate", "serialize", "total"} <= names
+    assert "db;" not in hit.headers["server-timing"]
+    record = next(r for r in caplog.records if r.name == "access")
+    assert record.status == 200 and record.db_ms > 0 and record.redis_ms > 0
@@ -0,0 +1,49 @@
+"""
+`GET /books/{id}/similar` serves the neighbour lists written by the
+compute_similar_books task.
+"""
+
+import asyncio
+import uuid
+
+import pytest
+
+from tasks.recommend import compute_similar_books
+
+
+@pytest.mark.asyncio
+async def test_similar_books_from_precomputed_neighbours(app_client):
+    word = f"zq{uuid.uuid4().hex[:8]}"
+    payloads = [
+        {"title": f"{word} dunes", "genre_name": "desert", "description": "spice"},
+        {"title": f"{word} dunes returns", "genre_name": "desert"},
+        {"title": "Whales at sea", "genre_name": "ocean"},
+    ]
+    ids = []
+    for payload in payloads:
+        resp = await app_client.post("/books/", json=payload)
+        assert resp.status_code == 200, resp.text
+        ids.append(resp.json()["id"])
+    first, sequel, unrelated = ids
+
+    resp = await app_client.get(f"/books/{first}/similar")
+    assert resp.status_code == 200
+    assert resp.json() == []
+
+    await asyncio.to_thread(compute_similar_books)
+
+    resp = await app_client.get(f"/books/{first}/similar", params={"limit": 5})
+    similar = resp.json()
+    assert similar[0]["id"] == sequel
+    assert similar[0]["title"] == f"{word} dunes returns"
+    assert unrelated not in [s["id"] for s in similar]
+
+    # deleted neighbours drop out without waiting for the next run
+    await app_client.delete(f"/books/{sequel}")
+    resp = await app_client.get(f"/books/{first}/similar")
+    assert sequel not in [s["id"] for s in resp.json()]
+
+    for book_id in (first, unrelated):
+        await app_client.delete(f"/books/{book_id}")
+    resp = await app_client.get(f"/books/{first}/similar")
+    assert resp.status_code == 404
@@ -0,0 +1,39 @@
+import json
+
+import httpx
+import pytest
+
+from helpers.slow_queries import SLOW_QUERY_STREAM, SlowQueryLog, SlowQueryMiddleware
+
+
+@pytest.mark.asyncio
+async def test_slow_search_is_logged_with_its_plan(local_redis_client, pg_engine):
+    import cache
+    from main import app
+
+    log = SlowQueryLog(threshold_ms=0, explain_rate=1.0)
+    log.install(pg_engine)
+    transport = httpx.ASGITransport(app=SlowQueryMiddleware(app, log))
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            resp = await c.get(
+                "/books/", params={"q": "slow query", "sort": "title:asc"}
+            )
+            assert resp.status_code == 200, resp.text
+        await log.drain()
+    finally:
+        log.uninstall()
+
+    entries = [
+        fields
+        for _, fields in await cache._redis.xrange(SLOW_QUERY_STREAM)
+        if fields["endpoint"] == "get_books_router"
+    ]
+    page = next(e for e in entries if "plan" in e and "FROM books" in e["sql"])
+    assert page["route"] == "/books/"
+    assert "sort=title" in page["query"]
+    assert "slow query" not in page["params"]
+    assert "str[" in " ".join(json.loads(page["params"]))
+    assert "actual time=" in page["plan"]
+    # the captured EXPLAIN ANALYZE itself is not logged
+    assert not any("ANALYZE" in e["sql"] for e in entries)
@@ -0,0 +1,67 @@
+"""
+compute_stats publishes catalog statistics that `GET /stats` serves, and
+incremental runs fold in only rows past the high-water marks.
+"""
+
+import asyncio
+import uuid
+
+import pytest
+import redis
+
+from cache import REDIS_URL, STATS_KEY, init_redis
+from tasks import analytics
+from tasks.analytics import compute_stats
+
+
+@pytest.mark.asyncio
+async def test_stats_full_then_incremental(app_client):
+    r = await init_redis()
+    await r.delete(STATS_KEY)
+    resp = await app_client.get("/stats")
+    assert resp.status_code == 503
+
+    await asyncio.to_thread(compute_stats, True, 2)
+    before = (await app_client.get("/stats")).json()
+    assert sum(before["rating_distribution"].values()) == before["reviews"]
+
+    genre = f"zq{uuid.uuid4().hex[:8]}"
+    author = (await app_client.post("/authors/", json={"name": "Stats"})).json()
+    book = (
+        await app_client.post(
+            "/books/",
+            json={"title": "x", "genre_name": genre, "author_ids": [author["id"]]},
+        )
+    ).json()
+    await app_client.post(
+        f"/books/{book['id']}/reviews", json={"reviewer_name": "s", "rating": 4}
+    )
+
+    result = await asyncio.to_thread(compute_stats)
+    assert result["books"] == book["id"]
+    after = (await app_client.get("/stats")).json()
+    assert after["books"] == before["books"] + 1
+    assert after["reviews"] == before["reviews"] + 1
+    assert after["books_per_genre"][genre] == 1
+    assert after["rating_distribution"]["4"] == before["rating_distribution"]["4"] + 1
+    assert after["review_velocity"]["last_7d"] >= 1
+    assert after["full_run_at"] == before["full_run_at"]
+
+    await app_client.delete(f"/books/{book['id']}")
+    await app_client.delete(f"/authors/{author['id']}")
+    await asyncio.to_thread(compute_stats, True)
+    assert (await app_client.get("/stats")).json()["books"] == before["books"]
+
+
+@pytest.mark.asyncio
+async def test_stats_run_survives_losing_its_lock(monkeypatch):
+    publish = analytics._publish
+
+    def expire_lock(conn, state):
+        # the lock timed out mid-run
+        redis.Redis.from_url(REDIS_URL).delete("stats:lock")
+        return publish(conn, state)
+
+    monkeypatch.setattr(analytics, "_publish", expire_lock)
+    result = await asyncio.to_thread(compute_stats, True)
+    assert result["status"] == "ok"
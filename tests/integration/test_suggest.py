@@ -0,0 +1,55 @@
+"""
+Typeahead indexes follow writes and rank prefix matches by popularity.
+"""
+
+import uuid
+
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_book_suggestions_follow_writes(app_client):
+    word = f"zq{uuid.uuid4().hex[:8]}"
+    ids = []
+    for title in (f"The {word} Saga", f"{word.capitalize()} Rising"):
+        resp = await app_client.post("/books/", json={"title": title})
+        assert resp.status_code == 200, resp.text
+        ids.append(resp.json()["id"])
+    quiet, popular = ids
+
+    resp = await app_client.post(
+        f"/books/{popular}/reviews", json={"reviewer_name": "sg", "rating": 5}
+    )
+    assert resp.status_code == 200, resp.text
+
+    resp = await app_client.get("/books/suggest", params={"prefix": word[:6]})
+    assert [s["id"] for s in resp.json()] == [popular, quiet]
+
+    resp = await app_client.patch(f"/books/{quiet}", json={"title": "Renamed"})
+    assert resp.status_code == 200, resp.text
+    await app_client.delete(f"/books/{popular}")
+
+    resp = await app_client.get("/books/suggest", params={"prefix": word})
+    assert resp.json() == []
+    resp = await app_client.get("/books/suggest", params={"prefix": "renam"})
+    assert {"id": quiet, "title": "Renamed"} in resp.json()
+    await app_client.delete(f"/books/{quiet}")
+
+
+@pytest.mark.asyncio
+async def test_author_suggestions_rank_by_book_count(app_client):
+    word = f"Zq{uuid.uuid4().hex[:8]}"
+    one = (await app_client.post("/authors/", json={"name": f"Ana {word}"})).json()
+    two = (await app_client.post("/authors/", json={"name": f"Bo {word}"})).json()
+    book = (
+        await app_client.post("/books/", json={"title": "x", "author_ids": [two["id"]]})
+    ).json()
+
+    resp = await app_client.get("/authors/suggest", params={"prefix": word.lower()})
+    assert [s["name"] for s in resp.json()] == [f"Bo {word}", f"Ana {word}"]
+
+    await app_client.delete(f"/books/{book['id']}")
+    for author in (one, two):
+        await app_client.delete(f"/authors/{author['id']}")
+    resp = await app_client.get("/authors/suggest", params={"prefix": word})
+    assert resp.json() == []
@@ -0,0 +1,119 @@
+"""
+Two-phase search must return the same ranking as the single-query search when
+every match fits in the candidate set, and leave terms with more matches to it.
+"""
+
+import uuid
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from helpers.helpers import decode_cursor
+from routers.book import _books_search_stmt, _two_phase_search
+from schemas.book import BookSortControl, SortDirection, SortField
+
+NO_FILTERS = {
+    "title": None,
+    "isbn": None,
+    "author_id": None,
+    "before": None,
+    "after": None,
+}
+
+
+@pytest.mark.asyncio
+async def test_two_phase_matches_sql_ranking(pg_engine):
+    async with pg_engine.connect() as conn:
+        trans = await conn.begin()
+        await conn.execute(
+            text(
+                "INSERT INTO books (title, year, book_isbn, genre_name, description) "
+                "SELECT 'Rerank probe ' || i, 2000, lpad(i::text, 13, '6'), 'g', "
+                "CASE WHEN i % 3 = 0 THEN 'probe probe' ELSE 'other' END "
+                "FROM generate_series(1, 60) AS i"
+            )
+        )
+        db = AsyncSession(bind=conn)
+        try:
+            sort = [
+                BookSortControl(
+                    sort_field=SortField.by_similarity,
+                    sort_direction=SortDirection.desc,
+                )
+            ]
+            stmt, _ = _books_search_stmt(q="Rerank probe", sort=sort)
+            expected = [row[0].id for row in (await db.execute(stmt)).all()]
+
+            seen: list[int] = []
+            cursor = None
+            while True:
+                books, next_cursor = await _two_phase_search(
+                    db, "Rerank probe", False, NO_FILTERS, 25, None, cursor
+                )
+                seen += [book.id for book in books]
+                if next_cursor is None:
+                    break
+                cursor = decode_cursor(next_cursor)
+            assert seen == expected
+        finally:
+            await db.close()
+            await trans.rollback()
+
+
+@pytest.mark.asyncio
+async def test_above_the_candidate_limit_pages_are_ranked_in_sql(
+    local_redis_client, pg_engine, monkeypatch
+):
+    import cache
+    from routers import book as book_router
+
+    monkeypatch.setattr(book_router, "SEARCH_MODE", "two_phase")
+    monkeypatch.setattr(book_router, "SEARCH_CANDIDATES", 5)
+    c = local_redis_client
+    suffix = uuid.uuid4().hex[:8]
+    q = f"Overflow {suffix}"
+    ids = [
+        (
+            await c.post(
+                "/books/",
+                json={"title": f"{q} {'x' * i}", "description": "probe " * i},
+            )
+        ).json()["id"]
+        for i in range(12)
+    ]
+    try:
+        sort = [
+            BookSortControl(
+                sort_field=SortField.by_similarity, sort_direction=SortDirection.desc
+            )
+        ]
+        async with AsyncSession(bind=pg_engine) as db:
+            stmt, _ = _books_search_stmt(q=q, sort=sort)
+            expected = [row[0].id for row in (await db.execute(stmt)).all()]
+            assert (
+                await _two_phase_search(db, q, False, NO_FILTERS, 5, None, None) is None
+            )
+        assert set(expected) == set(ids)
+
+        params = {"q": q, "sort": "similarity:desc", "limit": 5}
+        pages = []
+        for _ in range(2):
+            await cache._raw_redis.flushall()
+            pages.append((await c.get("/books/", params=params)).json())
+        assert pages[0] == pages[1]
+        assert [b["id"] for b in pages[0]["items"]] == expected[:5]
+
+        seen = []
+        page = pages[0]
+        while True:
+            seen += [b["id"] for b in page["items"]]
+            if page["next_cursor"] is None:
+                break
+            page = (
+                await c.get("/books/", params={**params, "cursor": page["next_cursor"]})
+            ).json()
+        assert seen == expected
+    finally:
+        for book_id in ids:
+            await c.delete(f"/books/{book_id}")
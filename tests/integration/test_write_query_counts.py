@@ -0,0 +1,148 @@
+"""
+Round trips per write endpoint. The comments record the count before the
+handlers moved to INSERT/UPDATE/DELETE ... RETURNING.
+"""
+
+import uuid
+
+import httpx
+import pytest
+
+
+async def _author(client: httpx.AsyncClient) -> dict:
+    suffix = uuid.uuid4().hex[:8]
+    resp = await client.post(
+        "/authors/",
+        json={"name": f"QC {suffix}", "email": f"{suffix}@example.com"},
+    )
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+
+async def _book(client: httpx.AsyncClient, author_ids: list[int]) -> dict:
+    resp = await client.post(
+        "/books/",
+        json={"title": f"QC Book {uuid.uuid4().hex[:8]}", "author_ids": author_ids},
+    )
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+
+@pytest.mark.asyncio
+async def test_book_writes(app_client: httpx.AsyncClient, count_statements):
+    author = await _author(app_client)
+    other = await _author(app_client)
+
+    # was 7: authors, insert, link, refresh, reload + 2 selectinloads
+    with count_statements() as stmts:
+        book = await _book(app_client, [author["id"]])
+    assert len(stmts) == 3
+    assert [a["id"] for a in book["authors"]] == [author["id"]]
+    book_id = book["id"]
+
+    # was 5: book + 2 selectinloads, update, refresh
+    with count_statements() as stmts:
+        resp = await app_client.patch(f"/books/{book_id}", json={"year": 2001})
+    assert resp.status_code == 200 and resp.json()["year"] == 2001
+    assert len(stmts) == 3
+
+    # was 8: book + 2 selectinloads, authors, update, unlink, link, refresh
+    with count_statements() as stmts:
+        resp = await app_client.put(
+            f"/books/{book_id}",
+            json={"title": "QC replaced", "author_ids": [other["id"]]},
+        )
+    assert resp.status_code == 200, resp.text
+    assert len(stmts) == 5
+
+    # was 8: book + 2 selectinloads, authors, unlink, link, refresh
+    with count_statements() as stmts:
+        resp = await app_client.put(
+            f"/books/{book_id}/authors", json=[author["id"], other["id"]]
+        )
+    assert resp.status_code == 200, resp.text
+    assert len(stmts) == 5
+
+    # was 6: book + selectinload, reviews cascade load, unlink, delete
+    with count_statements() as stmts:
+        resp = await app_client.delete(f"/books/{book_id}")
+    assert resp.status_code == 204
+    assert len(stmts) == 2
+
+    for a in (author, other):
+        await app_client.delete(f"/authors/{a['id']}")
+
+
+@pytest.mark.asyncio
+async def test_author_writes(app_client: httpx.AsyncClient, count_statements):
+    book = await _book(app_client, [])
+    suffix = uuid.uuid4().hex[:8]
+
+    # was 4: books, insert, link, refresh
+    with count_statements() as stmts:
+        resp = await app_client.post(
+            "/authors/",
+            json={"name": f"QC {suffix}", "book_ids": [book["id"]]},
+        )
+    assert resp.status_code == 200, resp.text
+    assert len(stmts) == 2
+    author_id = resp.json()["id"]
+
+    # was 7: author + selectinload, books, update, unlink, link, refresh
+    with count_statements() as stmts:
+        resp = await app_client.put(
+            f"/authors/{author_id}",
+            json={"name": f"QC2 {suffix}", "book_ids": [book["id"]]},
+        )
+    assert resp.status_code == 200, resp.text
+    assert len(stmts) == 3
+
+    # was 4: author + selectinload, update, refresh
+    with count_statements() as stmts:
+        resp = await app_client.patch(f"/authors/{author_id}", json={"name": "QC3"})
+    assert resp.status_code == 200 and resp.json()["name"] == "QC3"
+    assert len(stmts) == 2
+
+    # was 4: author + selectinload, unlink, delete
+    with count_statements() as stmts:
+        resp = await app_client.delete(f"/authors/{author_id}")
+    assert resp.status_code == 204
+    assert len(stmts) == 2
+
+    await app_client.delete(f"/books/{book['id']}")
+
+
+@pytest.mark.asyncio
+async def test_review_writes(app_client: httpx.AsyncClient, count_statements):
+    author = await _author(app_client)
+    book = await _book(app_client, [author["id"]])
+    url = f"/books/{book['id']}/reviews"
+
+    # was 4: book + 2 selectinloads, duplicate check, insert, refresh;
+    # now the insert plus one author-link lookup that is then cached
+    with count_statements() as stmts:
+        resp = await app_client.post(url, json={"reviewer_name": "qc-a", "rating": 4})
+    assert resp.status_code == 200, resp.text
+    assert len(stmts) == 2
+    review_id = resp.json()["id"]
+
+    with count_statements() as stmts:
+        resp = await app_client.post(url, json={"reviewer_name": "qc-b", "rating": 2})
+    assert resp.status_code == 200, resp.text
+    assert len(stmts) == 1
+
+    resp = await app_client.post(url, json={"reviewer_name": "qc-a", "rating": 1})
+    assert resp.status_code == 400
+    resp = await app_client.post(
+        "/books/2147483647/reviews", json={"reviewer_name": "qc-a", "rating": 1}
+    )
+    assert resp.status_code == 404
+
+    # was 3: review + selectinload(book), delete
+    with count_statements() as stmts:
+        resp = await app_client.delete(f"/reviews/{review_id}")
+    assert resp.status_code == 204
+    assert len(stmts) == 1
+
+    await app_client.delete(f"/books/{book['id']}")
+    await app_client.delete(f"/authors/{author['id']}")
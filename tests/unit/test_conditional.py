@@ -0,0 +1,47 @@
+from cache import _decode, _encode, entry_body
+from helpers.conditional import etag_matches
+from helpers.encoding import negotiate
+
+
+def test_entry_round_trip_carries_etag():
+    etag, raw = _encode({"id": 1})
+    assert _decode(raw.decode()) == ({"id": 1}, etag)
+    assert _encode({"id": 1})[0] == etag != _encode({"id": 2})[0]
+    # entries cached before ETags still read
+    assert _decode('{"id": 1}') == ({"id": 1}, None)
+
+
+def test_entry_body_is_the_rendered_bytes():
+    body = '{"title":"Café"}'.encode()
+    etag, raw = _encode(body)
+    assert entry_body(raw) == (etag, body)
+    # list entries: sliced back out only for the params they were cached with
+    etag, raw = _encode(body, '{"limit":1}')
+    assert _decode(raw.decode()) == (
+        {"_params": '{"limit":1}', "data": {"title": "Café"}},
+        etag,
+    )
+    assert entry_body(raw, '{"limit":1}') == (etag, body)
+    assert etag == _encode(body)[0]
+    assert entry_body(raw, '{"limit":2}') is None
+    assert entry_body(b'{"id": 1}') is None
+
+
+def test_if_none_match_comparison():
+    assert etag_matches('"abc"', "abc")
+    assert etag_matches('"x", W/"abc"', "abc")
+    assert etag_matches("*", "abc")
+    assert not etag_matches('"abcd"', "abc")
+    # any representation's tag matches the entry
+    assert etag_matches('"abc-gzip"', "abc")
+    assert etag_matches('"x", W/"abc-br"', "abc")
+    assert not etag_matches('"abc-deflate"', "abc")
+
+
+def test_negotiate_prefers_brotli_and_honours_q():
+    assert negotiate("gzip, deflate, br") == "br"
+    assert negotiate("br;q=0.5, gzip") == "gzip"
+    assert negotiate("br;q=0, gzip;q=0") is None
+    assert negotiate("*") == "br"
+    assert negotiate("identity") is None
+    assert negotiate(None) is None
@@ -0,0 +1,35 @@
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from helpers.eager import apply_response_shape
+from models import Author, Book, Review
+from schemas.author import AuthorRead
+from schemas.book import BookDetailRead, BookListRead
+from schemas.review import ReviewRead
+from schemas.shared import BookBase
+
+
+def _selected(stmt) -> set[str]:
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    select_list = sql[len("SELECT ") : sql.index("\nFROM")]
+    return {col.strip().split(".")[-1] for col in select_list.split(",")}
+
+
+@pytest.mark.parametrize(
+    "model, entity",
+    [
+        (BookListRead, Book),
+        (BookDetailRead, Book),
+        (BookBase, Book),
+        (AuthorRead, Author),
+        (ReviewRead, Review),
+    ],
+)
+def test_selects_only_serialized_columns(model, entity):
+    stmt = apply_response_shape(select(entity), model)
+    columns = _selected(stmt)
+    expected = {
+        name for name in model.model_fields if name in entity.__mapper__.column_attrs
+    }
+    assert columns == expected
@@ -0,0 +1,95 @@
+from search.inverted import MAX_SEGMENTS, InvertedIndex
+
+
+def _book(book_id, title, description=None, authors=(), year=None, genre=None):
+    return {
+        "id": book_id,
+        "title": title,
+        "year": year,
+        "book_isbn": None,
+        "genre_name": genre,
+        "description": description,
+        "authors": [{"id": i, "name": name, "email": None} for i, name in authors],
+    }
+
+
+def _index():
+    index = InvertedIndex()
+    index.upsert(
+        [
+            _book(
+                1, "Foundation", "galactic empire falls", [(1, "Isaac Asimov")], 1951
+            ),
+            _book(
+                2, "Dune", "desert planet and a galactic empire", [(2, "Frank Herbert")]
+            ),
+            _book(
+                3, "Empire of Silence", "a galactic saga", [(3, "Christopher Ruocchi")]
+            ),
+            _book(4, "Gardening", "tomatoes", year=2001),
+        ]
+    )
+    return index
+
+
+def test_title_matches_outrank_description_matches():
+    ids, scores = _index().search("empire")
+    assert ids.tolist()[0] == 3
+    assert set(ids.tolist()) == {1, 2, 3}
+    assert list(scores) == sorted(scores, reverse=True)
+
+
+def test_author_names_and_typos_match():
+    index = _index()
+    assert index.search("asimov")[0].tolist() == [1]
+    assert index.search("asimvo foundaton")[0].tolist() == [1]
+
+
+def test_filters_and_keyset_cursor():
+    index = _index()
+    assert index.search("galactic", before=1960)[0].tolist() == [1]
+    assert index.search("galactic", author_id=2)[0].tolist() == [2]
+
+    ids, scores = index.search("galactic")
+    seen, cursor = [], None
+    while True:
+        page_ids, page_scores = index.search("galactic", cursor=cursor)
+        if not len(page_ids):
+            break
+        seen.append(int(page_ids[0]))
+        cursor = (float(page_scores[0]), int(page_ids[0]))
+    assert seen == ids.tolist()
+
+
+def test_upsert_and_remove_replace_documents():
+    index = _index()
+    index.upsert([_book(4, "Galactic Gardening")])
+    index.remove([2])
+    ids = index.search("galactic")[0].tolist()
+    assert 4 in ids and 2 not in ids
+    assert index.get_items([4])[0]["title"] == "Galactic Gardening"
+
+
+def test_incremental_segments_are_merged():
+    index = _index()
+    for n in range(MAX_SEGMENTS + 2):
+        index.upsert([_book(100 + n, f"Nebula {n}")])
+    assert len(index.segments) <= MAX_SEGMENTS
+    assert sorted(index.search("nebula")[0].tolist()) == list(
+        range(100, 100 + MAX_SEGMENTS + 2)
+    )
+
+
+def test_document_frequencies_follow_edits_and_removals():
+    index = _index()
+    assert index.df["galactic"] == 3
+    for _ in range(3):
+        index.upsert([_book(1, "Foundation", "galactic empire falls")])
+    assert index.df["galactic"] == 3
+
+    index.remove([1, 2, 3])
+    assert "galactic" not in index.df
+    assert not any("galactic" in terms for terms in index.by_trigram.values())
+    # gone from the vocabulary, so typos no longer expand to it
+    assert index.search("galactik")[0].tolist() == []
+    assert index.df["tomatoes"] == 1
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from helpers.limiter import AIMDLimiter, Budget, classify
+
+
+def _budget(**overrides) -> Budget:
+    values = dict(
+        name="t", initial=2, min_limit=1, max_limit=4, target_ms=100, queue_ms=0
+    )
+    return Budget(**{**values, **overrides})
+
+
+@pytest.mark.asyncio
+async def test_sheds_over_the_limit_and_adapts():
+    limiter = AIMDLimiter(_budget())
+    assert await limiter.acquire() and await limiter.acquire()
+    assert not await limiter.acquire()  # no queueing: shed at once
+
+    limiter.release(0.01)  # fast, at the limit: grows
+    assert limiter.limit == 2.5
+    limiter.release(0.5)  # slow: backs off
+    assert limiter.limit == pytest.approx(2.25)
+    assert limiter.inflight == 0
+
+    # a burst of slow completions backs off once per observed latency
+    burst = AIMDLimiter(_budget())
+    assert await burst.acquire() and await burst.acquire()
+    burst.release(10.0)
+    burst.release(10.0)
+    assert burst.limit == pytest.approx(1.8)
+
+
+@pytest.mark.asyncio
+async def test_queued_request_gets_the_released_slot():
+    limiter = AIMDLimiter(_budget(initial=1, queue_ms=1000))
+    assert await limiter.acquire()
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    assert limiter.queued == 1
+    limiter.release(0.01, overloaded=False)
+    assert await waiter and limiter.inflight == 1
+
+    timed_out = AIMDLimiter(_budget(initial=1, queue_ms=10))
+    assert await timed_out.acquire()
+    assert not await timed_out.acquire()
+    assert timed_out.queued == 0 and timed_out.inflight == 1
+
+
+def test_budgets_by_route():
+    def scope(method, path):
+        return {"type": "http", "method": method, "path": path}
+
+    assert classify(scope("GET", "/books/")) == "search"
+    assert classify(scope("GET", "/books/export")) == "export"
+    assert classify(scope("GET", "/books/7")) == "read"
+    assert classify(scope("POST", "/books/")) == "write"
+    assert classify(scope("GET", "/metrics")) is None
@@ -0,0 +1,22 @@
+import metrics
+from database import pool_options
+
+
+def test_histogram_renders_cumulative_buckets():
+    h = metrics.Histogram("t_seconds", "test", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        h.observe(value, pool="async")
+    lines = h.collect()
+    assert 't_seconds_bucket{le="0.1",pool="async"} 1' in lines
+    assert 't_seconds_bucket{le="1.0",pool="async"} 3' in lines
+    assert 't_seconds_bucket{le="+Inf",pool="async"} 4' in lines
+    assert 't_seconds_count{pool="async"} 4' in lines
+
+
+def test_pool_options_prefer_engine_specific_env(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "7")
+    monkeypatch.setenv("ASYNC_DB_POOL_SIZE", "20")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "true")
+    assert pool_options("ASYNC")["pool_size"] == 20
+    assert pool_options("SYNC")["pool_size"] == 7
+    assert pool_options("SYNC")["pool_pre_ping"] is True
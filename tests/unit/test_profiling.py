@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+import pytest
+from starlette.routing import Route
+
+from helpers import profiling
+from helpers.profiling import ProfilingMiddleware, StackSampler, collapsed
+
+
+def burn_cpu(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+async def endpoint_app(scope, receive, send):
+    burn_cpu(0.05)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": scope["query_string"]})
+
+
+async def _call(app, headers=(), query_string=b"", path="/books/"):
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "headers": list(headers),
+        "query_string": query_string,
+    }
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, None, send)
+    return messages
+
+
+@pytest.mark.asyncio
+async def test_sampler_keeps_only_its_own_task():
+    async def profiled():
+        sampler = StackSampler(interval_ms=1)
+        sampler.start()
+        burn_cpu(0.05)
+        await asyncio.sleep(0.05)  # the other task runs meanwhile
+        return sampler.stop()
+
+    async def other():
+        await asyncio.sleep(0.01)
+        burn_cpu(0.03)
+
+    stacks, _ = await asyncio.gather(profiled(), other())
+    text = collapsed(stacks)
+    assert "burn_cpu" in text
+    assert "other" not in text
+    line = text.splitlines()[0]
+    assert line.rsplit(" ", 1)[1].isdigit() and ";" in line
+
+
+@pytest.mark.asyncio
+async def test_profiles_requests_that_carry_the_secret(tmp_path):
+    app = ProfilingMiddleware(endpoint_app, secret="s3", directory=str(tmp_path))
+
+    await _call(app, headers=[(b"x-profile", b"wrong")])
+    assert not list(tmp_path.iterdir())
+
+    messages = await _call(app, headers=[(b"x-profile", b"s3")])
+    (profile,) = tmp_path.iterdir()
+    assert profile.name.endswith("-GET-books.collapsed")
+    assert "burn_cpu" in profile.read_text()
+    assert (b"x-profile-id", profile.name.split("-GET")[0].encode()) in messages[0][
+        "headers"
+    ]
+
+    # the query flag works too and is not passed on
+    messages = await _call(app, query_string=b"_profile=s3&page=2")
+    assert messages[1]["body"] == b"page=2"
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+@pytest.mark.asyncio
+async def test_sampling_is_limited_to_the_listed_routes(tmp_path, monkeypatch):
+    app_routes = [
+        Route("/books/", endpoint_app, name="get_books_router"),
+        Route("/authors/", endpoint_app, name="get_authors_router"),
+    ]
+    app = ProfilingMiddleware(
+        endpoint_app,
+        secret="s3",
+        sample_rate=1.0,
+        routes=frozenset({"get_books_router"}),
+        directory=str(tmp_path),
+        app_routes=app_routes,
+    )
+    messages = await _call(app)
+    assert len(list(tmp_path.iterdir())) == 1
+    assert not any(name == b"x-profile-id" for name, _ in messages[0]["headers"])
+
+    # other routes are not sampled at all
+    def no_sampler(*args, **kwargs):
+        raise AssertionError("sampler started")
+
+    monkeypatch.setattr(profiling, "StackSampler", no_sampler)
+    await _call(app, path="/authors/")
+    assert len(list(tmp_path.iterdir())) == 1
@@ -0,0 +1,25 @@
+import pytest
+
+from search.rerank import SearchWeights, load_weights, rerank
+
+
+def test_rerank_orders_by_score_then_id():
+    ids, scores = rerank(
+        [3, 1, 2, 4],
+        [(1.0, 0.0, 0.0), (0.0, 1.0, 0.0), (1.0, 0.0, 0.0), (0.0, 0.0, 0.0)],
+        SearchWeights(0.6, 0.25, 0.15),
+    )
+    assert ids.tolist() == [2, 3, 1, 4]
+    assert scores.tolist() == pytest.approx([0.6, 0.6, 0.25, 0.0])
+
+
+def test_rerank_keyset_skips_seen_rows():
+    features = [(1.0, 0.0, 0.0), (1.0, 0.0, 0.0), (0.0, 1.0, 0.0)]
+    ids, _ = rerank([1, 2, 3], features, SearchWeights(0.6, 0.25, 0.15), after=(0.6, 1))
+    assert ids.tolist() == [2, 3]
+
+
+def test_load_weights_rejects_wrong_arity():
+    assert load_weights("1,0,0") == SearchWeights(1.0, 0.0, 0.0)
+    with pytest.raises(ValueError):
+        load_weights("0.5,0.5")
@@ -0,0 +1,33 @@
+from collections import Counter
+
+import numpy as np
+
+from search.similar import build_vectors, nearest
+
+
+def test_vectors_are_unit_rows():
+    docs = [Counter({"dune": 3.0, "desert": 1.0}), Counter(), Counter({"sea": 1.0})]
+    matrix = build_vectors(docs, dim=64)
+    assert matrix.dtype == np.float32
+    assert np.linalg.norm(matrix, axis=1).tolist() == [1.0, 0.0, 1.0]
+
+
+def test_nearest_ranks_shared_terms_first_and_skips_self():
+    docs = [
+        Counter({"dune": 3.0, "desert": 1.0, "spice": 1.0}),
+        Counter({"sea": 3.0, "whale": 1.0}),
+        Counter({"dune": 3.0, "spice": 1.0}),
+        Counter({"whale": 1.0, "ship": 1.0}),
+    ]
+    # a tiny block budget forces one row per block
+    idx, scores = nearest(build_vectors(docs, dim=1024), k=2, block_bytes=1)
+    assert idx.shape == (4, 2)
+    assert idx[0, 0] == 2 and idx[2, 0] == 0
+    assert idx[1, 0] == 3 and idx[3, 0] == 1
+    assert all(row not in idx[row] for row in range(4))
+    assert (np.diff(scores, axis=1) <= 0).all()
+
+
+def test_nearest_single_row():
+    idx, scores = nearest(build_vectors([Counter({"x": 1.0})], dim=8), k=5)
+    assert idx.shape == scores.shape == (1, 0)
@@ -0,0 +1,40 @@
+from helpers.slow_queries import _explainable, normalize, parameter_shapes
+
+
+def test_normalize_folds_literals_and_lists():
+    sql = """SELECT books.id FROM books
+        WHERE books.id IN ($1, $2, $3) AND books.year > 1990
+        AND books.title = 'it''s' LIMIT $4"""
+    assert normalize(sql) == (
+        "SELECT books.id FROM books WHERE books.id IN (?, ...) "
+        "AND books.year > ? AND books.title = ? LIMIT ?"
+    )
+    # one shape, however long the list
+    assert normalize("SELECT 1 WHERE x IN ($1, $2)") == normalize(
+        "SELECT 1 WHERE x IN ($1, $2, $3)"
+    )
+    assert normalize("SELECT t1.a FROM t1") == "SELECT t1.a FROM t1"
+
+
+def test_parameter_shapes_hide_values():
+    assert parameter_shapes(("tolkien", 20, None, [1, 2]), False) == [
+        "str[7]",
+        "int",
+        "NoneType",
+        "list[2]",
+    ]
+    assert parameter_shapes([("a", 1), ("b", 2)], True) == ["2 rows", "str[1]", "int"]
+
+
+def test_only_reads_are_explained():
+    assert _explainable("  SELECT books.id FROM books")
+    assert _explainable(
+        "WITH recent AS (SELECT id FROM books WHERE title = 'delete me') "
+        "SELECT * FROM recent"
+    )
+    assert not _explainable(
+        "WITH gone AS (DELETE FROM books WHERE id = $1 RETURNING id) "
+        "SELECT * FROM gone"
+    )
+    assert not _explainable("with t AS (SELECT 1) insert into books SELECT * FROM t")
+    assert not _explainable("UPDATE books SET title = $1")
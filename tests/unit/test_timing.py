@@ -0,0 +1,31 @@
+import asyncio
+
+import pytest
+
+from helpers.timing import _timings, header_value, record, timed
+
+
+@pytest.mark.asyncio
+async def test_timings_are_per_request():
+    async def request(name: str, n: int) -> dict:
+        timings: dict = {}
+        _timings.set(timings)  # each task runs in its own context copy
+        for _ in range(n):
+            with timed(name):
+                await asyncio.sleep(0)
+        return timings
+
+    a, b = await asyncio.gather(request("redis", 3), request("db", 2))
+    assert list(a) == ["redis"] and a["redis"][1] == 3
+    assert list(b) == ["db"] and b["db"][1] == 2
+
+    # outside a request nothing is recorded
+    record("redis", 1.0)
+    with timed("db"):
+        pass
+    assert _timings.get() is None
+
+
+def test_header_value():
+    value = header_value({"db": [0.0125, 2]}, 0.02)
+    assert value == 'db;dur=12.50;desc="2x", total;dur=20.00'